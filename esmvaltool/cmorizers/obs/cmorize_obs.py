@@ -8,6 +8,8 @@ specified in config-user.yml by the RAWOBS key, and an output dir
 created in the form of output_dir/CMOR_DATE_TIME/TierTIER/DATASET.
 The user can specify a list of DATASETS that the CMOR reformatting
 can by run on by using -o (--obs-list-cmorize) command line argument.
+Independent datasets can be CMORized concurrently in worker processes
+by using the -j (--jobs) command line argument.
 The CMOR reformatting scripts are to be found in:
 esmvalcore.cmor/cmorizers/obs
 """
@@ -17,13 +19,18 @@ import importlib
 import logging
 import os
 import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
 
+import yaml
+
 import esmvalcore
 from esmvalcore._config import configure_logging, read_config_user_file
 from esmvalcore._task import write_ncl_settings
 
-from .utilities import read_cmor_config
+from .utilities import (MANIFEST_FILE, Manifest, file_checksum,
+                        read_cmor_config)
 
 logger = logging.getLogger(__name__)
 
@@ -117,12 +124,17 @@ def _run_ncl_script(in_dir, out_dir, run_dir, dataset, reformat_script,
     process = subprocess.Popen(ncl_call,
                                stdout=subprocess.PIPE,
                                stderr=subprocess.STDOUT,
+                               cwd=out_dir,
                                env=env)
     output, err = process.communicate()
     for oline in str(output.decode('utf-8')).split('\n'):
         logger.info('[NCL] %s', oline)
     if err:
         logger.info('[NCL][subprocess.Popen ERROR] %s', err)
+    if process.returncode:
+        raise RuntimeError(
+            "NCL script {} failed with return code {}".format(
+                reformat_script, process.returncode))
 
 
 def _run_pyt_script(in_dir, out_dir, dataset, user_cfg):
@@ -152,6 +164,19 @@ def main():
                         default=os.path.join(os.path.dirname(__file__),
                                              'config-user.yml'),
                         help='Config file')
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of datasets to CMORize concurrently in \
+              separate worker processes.')
+    parser.add_argument('-u',
+                        '--update-dir',
+                        type=str,
+                        help='Existing cmorize_obs output directory to \
+              update: only data whose raw input files or \
+              configuration changed since the previous run are \
+              CMORized again.')
     args = parser.parse_args()
 
     # get and read config file
@@ -200,7 +225,12 @@ def main():
         obs_list = args.obs_list_cmorize
     else:
         obs_list = []
-    _cmor_reformat(config_user, obs_list)
+    update_dir = None
+    if args.update_dir:
+        update_dir = os.path.abspath(
+            os.path.expandvars(os.path.expanduser(args.update_dir)))
+        logger.info("Updating output in %s", update_dir)
+    _cmor_reformat(config_user, obs_list, args.jobs, update_dir)
 
     # End time timing
     timestamp2 = datetime.datetime.utcnow()
@@ -210,8 +240,194 @@ def main():
                 timestamp2 - timestamp1)
 
 
-def _cmor_reformat(config, obs_list):
-    """Run the cmorization routine."""
+def _get_dependencies(dataset):
+    """Get the datasets that need to be CMORized before `dataset`.
+
+    Dependencies are listed under the optional ``depends_on`` key of the
+    dataset-specific config file.
+    """
+    cfg_path = os.path.join(os.path.dirname(__file__), 'cmor_config',
+                            dataset + '.yml')
+    if not os.path.isfile(cfg_path):
+        return []
+    with open(cfg_path, 'r') as file:
+        cfg = yaml.safe_load(file)
+    return list(cfg.get('depends_on', []))
+
+
+def _get_ready_datasets(pending, dependencies, summary):
+    """Pop all pending datasets whose dependencies have been processed."""
+    ready = []
+    for dataset in list(pending):
+        failed = [
+            dep for dep in dependencies[dataset]
+            if dep in summary and summary[dep]['status'] != 'success'
+        ]
+        if failed:
+            logger.error("Skipping %s, dependencies %s failed", dataset,
+                         ', '.join(failed))
+            summary[dataset] = {
+                'tier': pending.pop(dataset),
+                'status': 'skipped',
+                'duration': 0.,
+                'message': 'failed dependencies: ' + ', '.join(failed),
+            }
+        elif all(dep in summary for dep in dependencies[dataset]):
+            ready.append((pending.pop(dataset), dataset))
+    return ready
+
+
+def _skip_unresolved(pending, summary):
+    """Mark datasets with unresolvable dependencies as skipped."""
+    for dataset in list(pending):
+        logger.error("Skipping %s, could not resolve its dependencies",
+                     dataset)
+        summary[dataset] = {
+            'tier': pending.pop(dataset),
+            'status': 'skipped',
+            'duration': 0.,
+            'message': 'unresolved (circular?) dependencies',
+        }
+
+
+def _add_dataset_log(run_dir, dataset, log_level):
+    """Add a log file handler for a single dataset."""
+    log_dir = os.path.join(run_dir, dataset)
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+    handler = logging.FileHandler(os.path.join(log_dir, 'cmorize_log.txt'),
+                                  mode='w')
+    handler.setLevel(log_level.upper())
+    handler.setFormatter(
+        logging.Formatter('%(asctime)s UTC [%(process)d] %(levelname)-7s '
+                          '%(name)s:%(lineno)s %(message)s'))
+    root_logger = logging.getLogger()
+    if not root_logger.handlers:
+        # Worker processes that were spawned rather than forked do not
+        # inherit the logging configuration of the main process.
+        root_logger.setLevel(logging.DEBUG)
+    root_logger.addHandler(handler)
+    return handler
+
+
+def _list_raw_files(in_dir):
+    """List all raw input files of a dataset."""
+    in_files = []
+    for root, _, files in os.walk(in_dir):
+        in_files.extend(os.path.join(root, name) for name in files)
+    return sorted(in_files)
+
+
+def _get_dataset_job_cfg(dataset, reformat_script):
+    """Get the checksums of the cmorizer and its config file."""
+    cfg_path = os.path.join(os.path.dirname(__file__), 'cmor_config',
+                            dataset + '.yml')
+    job_cfg = {'cmorizer': file_checksum(reformat_script)}
+    if os.path.isfile(cfg_path):
+        job_cfg['cmor_config'] = file_checksum(cfg_path)
+    return job_cfg
+
+
+def _cmorize_dataset(config, tier, dataset, out_root=None):
+    """CMORize a single dataset and report how it went.
+
+    This does not change the working directory, so it can safely be run
+    in a worker process concurrently with other datasets. If the manifest
+    in the output directory shows that neither the raw input files nor the
+    cmorizer and its config file changed since the previous run, nothing
+    is done.
+    """
+    raw_obs = config["rootpath"]["RAWOBS"][0]
+    reformat_scripts = os.path.dirname(os.path.abspath(__file__))
+    run_dir = os.path.join(config['output_dir'], 'run')
+    if out_root is None:
+        out_root = config['output_dir']
+    handler = _add_dataset_log(run_dir, dataset, config['log_level'])
+    result = {'tier': tier, 'status': 'success', 'message': ''}
+    start = time.time()
+    try:
+        reformat_script_root = os.path.join(
+            reformat_scripts,
+            'cmorize_obs_' + dataset.lower().replace('-', '_'),
+        )
+        # in-data dir; build out-dir tree
+        in_data_dir = os.path.join(raw_obs, tier, dataset)
+        logger.info("Input data from: %s", in_data_dir)
+        out_data_dir = os.path.join(out_root, tier, dataset)
+        logger.info("Output will be written to: %s", out_data_dir)
+        if not os.path.isdir(out_data_dir):
+            os.makedirs(out_data_dir)
+
+        # figure out what language the script is in
+        logger.info("Reformat script: %s", reformat_script_root)
+        if os.path.isfile(reformat_script_root + '.ncl'):
+            reformat_script = reformat_script_root + '.ncl'
+        elif os.path.isfile(reformat_script_root + '.py'):
+            reformat_script = reformat_script_root + '.py'
+        else:
+            raise FileNotFoundError(
+                'Could not find cmorizer for {}'.format(dataset))
+
+        in_files = _list_raw_files(in_data_dir)
+        job_cfg = _get_dataset_job_cfg(dataset, reformat_script)
+        manifest = Manifest(out_data_dir, checksum=False)
+        if manifest.is_up_to_date('dataset', in_files, job_cfg):
+            logger.info("Output of %s is up to date", dataset)
+            result['message'] = 'up to date'
+        else:
+            if reformat_script.endswith('.ncl'):
+                _run_ncl_script(
+                    in_data_dir,
+                    out_data_dir,
+                    run_dir,
+                    dataset,
+                    reformat_script,
+                    config['log_level'],
+                )
+            else:
+                _run_pyt_script(in_data_dir, out_data_dir, dataset, config)
+            # Reload, the cmorizer may have recorded its own jobs
+            manifest = Manifest(out_data_dir, checksum=False)
+            out_files = [
+                name for name in os.listdir(out_data_dir)
+                if name != MANIFEST_FILE
+            ]
+            manifest.record('dataset', in_files, job_cfg, out_files)
+            manifest.save()
+    except Exception as exc:  # noqa
+        logger.exception("Failed to CMORize %s", dataset)
+        result['status'] = 'failed'
+        result['message'] = str(exc)
+    finally:
+        result['duration'] = time.time() - start
+        logging.getLogger().removeHandler(handler)
+        handler.close()
+    return result
+
+
+def _log_summary(summary):
+    """Log the outcome of each dataset CMORization."""
+    logger.info(70 * "-")
+    logger.info("%-30s %-6s %-8s %10s", "Dataset", "Tier", "Status",
+                "Time [s]")
+    for dataset in sorted(summary):
+        result = summary[dataset]
+        logger.info("%-30s %-6s %-8s %10.1f %s", dataset, result['tier'],
+                    result['status'], result['duration'], result['message'])
+    logger.info(70 * "-")
+
+
+def _cmor_reformat(config, obs_list, n_jobs=1, update_dir=None):
+    """Run the cmorization routine.
+
+    Datasets are CMORized using at most `n_jobs` worker processes, while
+    making sure that datasets listed under ``depends_on`` in the
+    dataset-specific config file are processed first. A failing dataset
+    does not stop the others, a summary is logged at the end instead.
+    If `update_dir` is given, the CMORized data are written to this
+    existing output directory and only the parts whose raw data or
+    configuration changed are CMORized again.
+    """
     logger.info("Running the CMORization scripts.")
 
     # master directory
@@ -220,7 +436,6 @@ def _cmor_reformat(config, obs_list):
     # set the reformat scripts dir
     reformat_scripts = os.path.dirname(os.path.abspath(__file__))
     logger.info("Using cmorizer scripts repository: %s", reformat_scripts)
-    run_dir = os.path.join(config['output_dir'], 'run')
     # datsets dictionary of Tier keys
     datasets = _assemble_datasets(raw_obs, obs_list)
     if not datasets:
@@ -228,46 +443,62 @@ def _cmor_reformat(config, obs_list):
                        obs_list, raw_obs)
     logger.info("Processing datasets %s", datasets)
 
-    # loop through tier/datasets to be cmorized
-    failed_datasets = []
-    for tier in datasets:
-        for dataset in datasets[tier]:
-            reformat_script_root = os.path.join(
-                reformat_scripts,
-                'cmorize_obs_' + dataset.lower().replace('-', '_'),
-            )
-            # in-data dir; build out-dir tree
-            in_data_dir = os.path.join(raw_obs, tier, dataset)
-            logger.info("Input data from: %s", in_data_dir)
-            out_data_dir = os.path.join(config['output_dir'], tier, dataset)
-            logger.info("Output will be written to: %s", out_data_dir)
-            if not os.path.isdir(out_data_dir):
-                os.makedirs(out_data_dir)
-
-            # all operations are done in the working dir now
-            os.chdir(out_data_dir)
-
-            # figure out what language the script is in
-            logger.info("Reformat script: %s", reformat_script_root)
-            if os.path.isfile(reformat_script_root + '.ncl'):
-                reformat_script = reformat_script_root + '.ncl'
-                _run_ncl_script(
-                    in_data_dir,
-                    out_data_dir,
-                    run_dir,
-                    dataset,
-                    reformat_script,
-                    config['log_level'],
-                )
-            elif os.path.isfile(reformat_script_root + '.py'):
-                _run_pyt_script(in_data_dir, out_data_dir, dataset, config)
-            else:
-                logger.error('Could not find cmorizer for %s', dataset)
-                failed_datasets.append(dataset)
-                raise Exception(
-                    'Could not find cmorizers for %s datasets ' %
-                    ' '.join(failed_datasets)
-                )
+    pending = {
+        dataset: tier
+        for tier in datasets for dataset in datasets[tier]
+    }
+    dependencies = {
+        dataset: [dep for dep in _get_dependencies(dataset) if dep in pending]
+        for dataset in pending
+    }
+    summary = {}
+    if n_jobs == 1:
+        while pending:
+            ready = _get_ready_datasets(pending, dependencies, summary)
+            if not ready:
+                _skip_unresolved(pending, summary)
+            for tier, dataset in ready:
+                summary[dataset] = _cmorize_dataset(config, tier, dataset,
+                                                    update_dir)
+    else:
+        logger.info("Using at most %s worker processes", n_jobs)
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = {}
+            while pending or futures:
+                for tier, dataset in _get_ready_datasets(
+                        pending, dependencies, summary):
+                    logger.info("Submitting CMORization of %s", dataset)
+                    future = executor.submit(_cmorize_dataset, config, tier,
+                                             dataset, update_dir)
+                    futures[future] = (tier, dataset)
+                if not futures:
+                    _skip_unresolved(pending, summary)
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tier, dataset = futures.pop(future)
+                    try:
+                        summary[dataset] = future.result()
+                    except Exception as exc:  # noqa
+                        logger.error("Worker CMORizing %s crashed", dataset)
+                        summary[dataset] = {
+                            'tier': tier,
+                            'status': 'failed',
+                            'duration': 0.,
+                            'message': str(exc),
+                        }
+                    logger.info("Finished CMORizing %s: %s", dataset,
+                                summary[dataset]['status'])
+
+    _log_summary(summary)
+    failed_datasets = [
+        dataset for dataset in sorted(summary)
+        if summary[dataset]['status'] != 'success'
+    ]
+    if failed_datasets:
+        raise Exception('Could not CMORize %s datasets' %
+                        ' '.join(failed_datasets))
+    return summary
 
 
 if __name__ == '__main__':
@@ -92,12 +92,53 @@ def _cmorize_dataset(in_file, var, cfg, out_dir):
     utils.set_global_atts(cube, attributes)
 
     logger.info("Saving CMORized cube for variable %s", cube.var_name)
-    utils.save_variable(cube, cube.var_name, out_dir, attributes)
+    utils.save_variable(cube,
+                        cube.var_name,
+                        out_dir,
+                        attributes,
+                        save_options=cfg.get('save'))
 
     return in_file
 
 
-def _regrid_dataset(in_dir, var, cfg):
+def _regrid_file(infile, var, cfg):
+    """Regrid a single file and write it to the working directory."""
+    _, infile_tail = os.path.split(infile)
+    outfile = os.path.join(cfg['work_dir'], infile_tail)
+    targetgrid_ds = xr.DataArray.from_iris(
+        _stock_cube(cfg['custom']['regrid']))
+    input_ds = xr.open_dataset(infile)
+    # Do renaming for consistency of coordinate names
+    input_ds = input_ds.rename({'latitude': 'lat', 'longitude': 'lon'})
+    # Select uppermoist soil level (index 0)
+    input_da = input_ds[var['raw']].isel(soilLayer=0)
+    logger.info("Regridding... ")
+    # A workaround to avoid spreading of nan values,
+    # related to Github issue
+    constantval = 10
+    input_da = input_da + constantval
+    assert int((input_da == 0.).sum()) == 0  # Make sure that there
+    # are no zero's in the data,
+    # since they will be masked out
+    weights_file = os.path.join(
+        cfg['work_dir'], 'bilinear_{}_weights.nc'.format(
+            cfg['custom']['regrid']))
+    regridder = xe.Regridder(input_ds,
+                             targetgrid_ds,
+                             'bilinear',
+                             filename=weights_file,
+                             reuse_weights=True)
+    da_out = regridder(input_da)
+    da_out = da_out.where(da_out != 0.)
+    da_out = da_out - constantval
+
+    # Save it.
+    logger.info("Saving: %s", outfile)
+    da_out.to_netcdf(outfile)
+    return outfile
+
+
+def _regrid_dataset(in_dir, var, cfg, n_workers):
     """
     Regridding of original files.
 
@@ -106,36 +147,14 @@ def _regrid_dataset(in_dir, var, cfg):
     """
     # Match any year here
     filepattern = var['file'].format(year='????')
-    filelist = glob.glob(os.path.join(in_dir, filepattern))
-    for infile in filelist:
-        _, infile_tail = os.path.split(infile)
-        outfile = os.path.join(cfg['work_dir'], infile_tail)
-        targetgrid_ds = xr.DataArray.from_iris(
-            _stock_cube(cfg['custom']['regrid']))
-        input_ds = xr.open_dataset(infile)
-        # Do renaming for consistency of coordinate names
-        input_ds = input_ds.rename({'latitude': 'lat', 'longitude': 'lon'})
-        # Select uppermoist soil level (index 0)
-        input_da = input_ds[var['raw']].isel(soilLayer=0)
-        logger.info("Regridding... ")
-        # A workaround to avoid spreading of nan values,
-        # related to Github issue
-        constantval = 10
-        input_da = input_da + constantval
-        assert int((input_da == 0.).sum()) == 0  # Make sure that there
-        # are no zero's in the data,
-        # since they will be masked out
-        regridder = xe.Regridder(input_ds,
-                                 targetgrid_ds,
-                                 'bilinear',
-                                 reuse_weights=True)
-        da_out = regridder(input_da)
-        da_out = da_out.where(da_out != 0.)
-        da_out = da_out - constantval
-
-        # Save it.
-        logger.info("Saving: %s", outfile)
-        da_out.to_netcdf(outfile)
+    filelist = sorted(glob.glob(os.path.join(in_dir, filepattern)))
+    jobs = {os.path.basename(f): (f, var, cfg) for f in filelist}
+    if not jobs:
+        return
+    # The first job computes the regridding weights, the others reuse them
+    first = next(iter(jobs))
+    utils.run_jobs(_regrid_file, {first: jobs.pop(first)})
+    utils.run_jobs(_regrid_file, jobs, n_workers, cfg.get('memory_per_job'))
 
 
 def cmorization(in_dir, out_dir, cfg, cfg_user):
@@ -148,6 +167,7 @@ def cmorization(in_dir, out_dir, cfg, cfg_user):
         logger.info("Creating working directory for "
                     f"regridding: {cfg['work_dir']}")
         os.mkdir(cfg['work_dir'])
+    n_workers = utils.get_n_workers(cfg_user)
 
     for short_name, var in cfg['variables'].items():
         var['short_name'] = short_name
@@ -155,21 +175,20 @@ def cmorization(in_dir, out_dir, cfg, cfg_user):
 
         # Regridding
         logger.info("Start regridding to: %s", cfg['custom']['regrid'])
-        _regrid_dataset(in_dir, var, cfg)
+        _regrid_dataset(in_dir, var, cfg, n_workers)
         logger.info("Finished regridding")
 
         logger.info("Start CMORizing")
+        jobs = {}
         for year in range(1961, 2029):
             # File concatenation
             in_file = os.path.join(cfg['work_dir'],
                                    var['file'].format(year=year))
             if os.path.isfile(in_file):
                 # Read in the full dataset here from 'workdir'
-                logger.info(f"Start CMORization of file {in_file}")
-                _cmorize_dataset(in_file, var, cfg, out_dir)
-                logger.info(f"Finished processing year {year}")
+                jobs[f'{short_name}_{year}'] = (in_file, var, cfg, out_dir)
             else:
                 logger.info(f"No files found for year {year}")
-                continue
-
-            logger.info("Finished CMORIZATION")
+        utils.run_jobs(_cmorize_dataset, jobs, n_workers,
+                       cfg.get('memory_per_job'))
+        logger.info("Finished CMORIZATION")
@@ -179,14 +179,18 @@ def _extract_variable(short_name, var, cfg, input_files, out_dir):
                         short_name,
                         out_dir,
                         attrs,
+                        save_options=cfg.get('save'),
                         unlimited_dimensions=['time'])
 
 
-def cmorization(in_dir, out_dir, cfg, _):
+def cmorization(in_dir, out_dir, cfg, config_user):
     """Cmorization func call."""
     input_files = _get_input_files(in_dir, cfg)
 
     # Run the cmorization
-    for (short_name, var) in cfg['variables'].items():
-        logger.info("CMORizing variable '%s'", short_name)
-        _extract_variable(short_name, var, cfg, input_files, out_dir)
+    jobs = {
+        short_name: (short_name, var, cfg, input_files, out_dir)
+        for (short_name, var) in cfg['variables'].items()
+    }
+    utils.run_jobs(_extract_variable, jobs, utils.get_n_workers(config_user),
+                   cfg.get('memory_per_job'))
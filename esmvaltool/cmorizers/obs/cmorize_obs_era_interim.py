@@ -84,10 +84,8 @@ For further details on obtaining daily values from ERA-Interim,
 import logging
 import re
 from collections import defaultdict
-from concurrent.futures import ProcessPoolExecutor, as_completed
 from copy import deepcopy
 from datetime import datetime, timedelta
-from os import cpu_count
 from pathlib import Path
 from warnings import catch_warnings, filterwarnings
 
@@ -374,14 +372,16 @@ def _extract_variable(in_files, var, cfg, out_dir):
     logger.debug("Saving cube\n%s", cube)
     logger.debug("Expected output size is %.1fGB",
                  np.prod(cube.shape) * 4 / 2**30)
-    utils.save_variable(
+    out_file = utils.save_variable(
         cube,
         cube.var_name,
         out_dir,
         attributes,
+        save_options=cfg.get('save'),
         local_keys=['positive'],
     )
     logger.info("Finished CMORizing %s", ', '.join(in_files))
+    return out_file
 
 
 def _get_in_files_by_year(in_dir, var):
@@ -407,25 +407,15 @@ def _get_in_files_by_year(in_dir, var):
     return in_files.values()
 
 
-def _run(jobs, n_workers):
-    """Run CMORization jobs using n_workers."""
-    if n_workers == 1:
-        for job in jobs:
-            _extract_variable(*job)
-    else:
-        with ProcessPoolExecutor(max_workers=n_workers) as executor:
-            futures = {}
-            for job in jobs:
-                future = executor.submit(_extract_variable, *job)
-                futures[future] = job[0]
+def _get_job_cfg(var, cfg):
+    """Get the configuration that determines the output of a job."""
+    return {'attributes': cfg['attributes'], 'variable': var}
+
 
-            for future in as_completed(futures):
-                try:
-                    future.result()
-                except:  # noqa
-                    logger.error("Failed to CMORize %s",
-                                 ', '.join(futures[future]))
-                    raise
+def _job_key(var, in_files):
+    """Get the key of a job in the manifest."""
+    year = str(Path(in_files[0]).stem).split('_')[-1]
+    return '_'.join([var['mip'], var['short_name'], year])
 
 
 def cmorization(in_dir, out_dir, cfg, config_user):
@@ -434,16 +424,27 @@ def cmorization(in_dir, out_dir, cfg, config_user):
         year=datetime.now().year)
     cfg.pop('cmor_table')
 
-    n_workers = config_user.get('max_parallel_tasks')
-    if n_workers is None:
-        n_workers = int(cpu_count() / 1.5)
+    n_workers = utils.get_n_workers(config_user)
     logger.info("Using at most %s workers", n_workers)
 
-    jobs = []
+    manifest = utils.Manifest(out_dir)
+    jobs = {}
     for short_name, var in cfg['variables'].items():
         if 'short_name' not in var:
             var['short_name'] = short_name
         for in_files in _get_in_files_by_year(in_dir, var):
-            jobs.append([in_files, var, cfg, out_dir])
-
-    _run(jobs, n_workers)
+            key = _job_key(var, in_files)
+            if manifest.is_up_to_date(key, in_files, _get_job_cfg(var, cfg)):
+                logger.info("Skipping up to date input files %s",
+                            ', '.join(in_files))
+                continue
+            jobs[key] = (in_files, var, cfg, out_dir)
+
+    def _record_job(key, out_file):
+        """Add a finished job to the manifest."""
+        in_files, var = jobs[key][:2]
+        manifest.record(key, in_files, _get_job_cfg(var, cfg), [out_file])
+        manifest.save()
+
+    utils.run_jobs(_extract_variable, jobs, n_workers,
+                   cfg.get('memory_per_job'), _record_job)
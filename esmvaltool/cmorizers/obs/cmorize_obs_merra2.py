@@ -132,24 +132,41 @@ def _extract_variable(in_files, var, cfg, out_dir):
     cube = _fix_time_monthly(cube)
 
     logger.debug("Saving cube\n%s", cube)
-    utils.save_variable(
+    out_file = utils.save_variable(
         cube,
         cube.var_name,
         out_dir,
-        attributes
+        attributes,
+        save_options=cfg.get('save'),
     )
     logger.info("Finished CMORizing %s", ', '.join(in_files))
+    return out_file
 
 
-def cmorization(in_dir, out_dir, cfg, _):
+def cmorization(in_dir, out_dir, cfg, config_user):
     """Run CMORizer for MERRA2."""
     cfg.pop('cmor_table')
-
+    manifest = utils.Manifest(out_dir)
+    jobs = {}
+    job_cfgs = {}
     for year in range(1980, 2019):
         for short_name, var in cfg['variables'].items():
             if 'short_name' not in var:
                 var['short_name'] = short_name
             # Now get list of files
             filepattern = os.path.join(in_dir, var['file'].format(year=year))
-            in_files = glob.glob(filepattern)
-            _extract_variable(in_files, var, cfg, out_dir)
+            in_files = sorted(glob.glob(filepattern))
+            key = '_'.join([var['mip'], var['short_name'], str(year)])
+            job_cfgs[key] = {'attributes': cfg['attributes'], 'variable': var}
+            if manifest.is_up_to_date(key, in_files, job_cfgs[key]):
+                logger.info("Skipping up to date %s", key)
+                continue
+            jobs[key] = (in_files, var, cfg, out_dir)
+
+    def _record_job(key, out_file):
+        """Add a finished job to the manifest."""
+        manifest.record(key, jobs[key][0], job_cfgs[key], [out_file])
+        manifest.save()
+
+    utils.run_jobs(_extract_variable, jobs, utils.get_n_workers(config_user),
+                   cfg.get('memory_per_job'), _record_job)
@@ -21,6 +21,7 @@ import logging
 import glob
 import os
 import warnings
+from collections import defaultdict
 from pprint import pformat
 import iris.coord_categorisation
 
@@ -52,6 +53,15 @@ def _get_input_files(in_dir, cfg):
     return input_files
 
 
+def _get_input_files_by_year(in_dir, cfg):
+    """Get input files grouped by year (from the date in the file name)."""
+    input_files = defaultdict(list)
+    for input_file in sorted(_get_input_files(in_dir, cfg)):
+        year = os.path.basename(input_file).split('_')[2][:4]
+        input_files[year].append(input_file)
+    return input_files
+
+
 def _preprocess_cubes(cubes):
     """Remove attributes from cubes that prevent concatenation."""
     new_cubes = iris.cube.CubeList()
@@ -124,14 +134,19 @@ def _extract_variable(short_name, var, cfg, input_files, out_dir):
                             short_name,
                             out_dir,
                             attrs,
+                            save_options=cfg.get('save'),
                             unlimited_dimensions=['time'])
 
 
-def cmorization(in_dir, out_dir, cfg, _):
+def cmorization(in_dir, out_dir, cfg, config_user):
     """Cmorization func call."""
-    input_files = _get_input_files(in_dir, cfg)
+    input_files = _get_input_files_by_year(in_dir, cfg)
 
-    # Run the cmorization
+    # Run the cmorization, one job per variable and year
+    jobs = {}
     for (short_name, var) in cfg['variables'].items():
-        logger.info("CMORizing variable '%s'", short_name)
-        _extract_variable(short_name, var, cfg, input_files, out_dir)
+        for year in sorted(input_files):
+            jobs[f'{short_name}_{year}'] = (short_name, var, cfg,
+                                            input_files[year], out_dir)
+    utils.run_jobs(_extract_variable, jobs, utils.get_n_workers(config_user),
+                   cfg.get('memory_per_job'))
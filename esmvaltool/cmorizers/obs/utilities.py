@@ -1,13 +1,17 @@
 """Utils module for Python cmorizers."""
 from pathlib import Path
 import datetime
+import hashlib
+import json
 import logging
 import os
 import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from contextlib import contextmanager
 
 import iris
 import numpy as np
+import psutil
 import yaml
 from cf_units import Unit
 from dask import array as da
@@ -19,6 +23,8 @@ logger = logging.getLogger(__name__)
 
 REFERENCES_PATH = Path(esmvaltool_file).absolute().parent / 'references'
 
+MANIFEST_FILE = 'cmorization_manifest.yml'
+
 
 def add_height2m(cube):
     """Add scalar coordinate 'height' with value of 2m."""
@@ -146,8 +152,146 @@ def read_cmor_config(dataset):
     return cfg
 
 
-def save_variable(cube, var, outdir, attrs, **kwargs):
-    """Saver function."""
+def get_n_workers(config_user):
+    """Get the maximum number of worker processes for CMORization jobs."""
+    n_workers = config_user.get('max_parallel_tasks')
+    if n_workers is None:
+        n_workers = max(1, int(os.cpu_count() / 1.5))
+    return n_workers
+
+
+def _memory_available(memory_per_job):
+    """Check if there is enough memory available to start a new job."""
+    if memory_per_job is None:
+        return True
+    available = psutil.virtual_memory().available / 2**30
+    if available < memory_per_job:
+        logger.debug(
+            "Waiting to start new job, %.1f GiB memory available, %.1f GiB "
+            "needed", available, memory_per_job)
+        return False
+    return True
+
+
+def run_jobs(function, jobs, n_workers=1, memory_per_job=None,
+             on_success=None):
+    """Run CMORization jobs using at most `n_workers` worker processes.
+
+    A failing job does not stop the other jobs, all failures are reported
+    at the end.
+
+    Parameters
+    ----------
+    function : callable
+        Function that runs a single job. It needs to be defined at module
+        level, so it can be sent to the worker processes.
+    jobs : dict
+        Tuples of arguments for `function`, keyed by a descriptive name of
+        the job (e.g. containing variable and year).
+    n_workers : int, optional (default: 1)
+        Maximum number of worker processes. If 1, all jobs are run in the
+        current process.
+    memory_per_job : float, optional
+        Expected peak memory usage of a single job in GiB. If given, no new
+        job is started while less memory is available, unless no other job
+        is running.
+    on_success : callable, optional
+        Called as ``on_success(name, result)`` in the current process after
+        each successful job, e.g. to record it in a :class:`Manifest`.
+
+    Returns
+    -------
+    dict
+        Return values of `function`, keyed by job name.
+
+    Raises
+    ------
+    RuntimeError
+        At least one of the jobs failed.
+
+    """
+    results = {}
+    failed = []
+
+    def _finish(name, result):
+        results[name] = result
+        if on_success is not None:
+            on_success(name, result)
+
+    if n_workers == 1:
+        for name, args in jobs.items():
+            logger.info("Running CMORization job %s", name)
+            try:
+                result = function(*args)
+            except Exception:  # noqa
+                logger.exception("Failed to CMORize %s", name)
+                failed.append(name)
+            else:
+                _finish(name, result)
+    else:
+        logger.info("Running %s CMORization jobs using at most %s workers",
+                    len(jobs), n_workers)
+        pending = list(jobs)
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {}
+            while pending or futures:
+                while (pending and len(futures) < n_workers
+                       and (not futures
+                            or _memory_available(memory_per_job))):
+                    name = pending.pop(0)
+                    logger.info("Submitting CMORization job %s", name)
+                    futures[executor.submit(function, *jobs[name])] = name
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception:  # noqa
+                        logger.exception("Failed to CMORize %s", name)
+                        failed.append(name)
+                    else:
+                        logger.info("Finished CMORization job %s", name)
+                        _finish(name, result)
+
+    if failed:
+        raise RuntimeError("Failed to CMORize {} of {} jobs: {}".format(
+            len(failed), len(jobs), ', '.join(failed)))
+    return results
+
+
+def save_variable(cube, var, outdir, attrs, save_options=None, **kwargs):
+    """Saver function.
+
+    Lazy data is not realized, but written to disk chunk by chunk.
+
+    Parameters
+    ----------
+    cube : iris.cube.Cube
+        Data to save.
+    var : str
+        Short name of the variable.
+    outdir : str
+        Output directory.
+    attrs : dict
+        Global attributes, used to create the file name.
+    save_options : dict, optional
+        The ``save`` section of the dataset-specific config file, which can
+        contain the netCDF options ``zlib``, ``complevel``, ``shuffle`` and
+        ``contiguous``, ``chunksizes`` given as mapping from coordinate
+        names to chunk sizes (dimensions that are not listed are not split,
+        coordinates that the cube does not have are ignored)
+        and ``time_slab``, the number of time steps that are written at once
+        (defaults to the time chunk size).
+    **kwargs
+        Additional keyword arguments for :func:`iris.save`, these take
+        precedence over `save_options`.
+
+    Returns
+    -------
+    str
+        Path to the saved file.
+
+    """
     _fix_dtype(cube)
     # CMOR standard
     try:
@@ -177,10 +321,139 @@ def save_variable(cube, var, outdir, attrs, **kwargs):
         name_elements.append(time_suffix)
     file_name = '_'.join(name_elements) + '.nc'
     file_path = os.path.join(outdir, file_name)
+    if save_options:
+        kwargs = dict(_get_save_kwargs(cube, save_options), **kwargs)
     logger.info('Saving: %s', file_path)
     status = 'lazy' if cube.has_lazy_data() else 'realized'
     logger.info('Cube has %s data [lazy is preferred]', status)
+    start = datetime.datetime.utcnow()
     iris.save(cube, file_path, fill_value=1e20, **kwargs)
+    duration = (datetime.datetime.utcnow() - start).total_seconds()
+    data_size = cube.core_data().nbytes / 2**20
+    logger.info(
+        "Wrote %.1f MB of data (%.1f MB on disk) in %.1f s (%.1f MB/s)",
+        data_size,
+        os.path.getsize(file_path) / 2**20,
+        duration,
+        data_size / max(duration, 1e-6),
+    )
+    return file_path
+
+
+def file_checksum(path, block_size=2**20):
+    """Compute the SHA-256 checksum of a file."""
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+def config_checksum(cfg):
+    """Compute the SHA-256 checksum of a (configuration) dictionary."""
+    text = json.dumps(cfg, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class Manifest:
+    """Inputs and outputs of the CMORization jobs of a dataset.
+
+    The manifest is stored as YAML file in the output directory of a
+    dataset. For every job (e.g. a single variable and year) it records the
+    paths, sizes, modification times and checksums of the input files, a
+    checksum of the job configuration and the output files. This allows
+    skipping jobs whose inputs and configuration did not change since the
+    previous run.
+
+    Parameters
+    ----------
+    out_dir : str
+        Output directory of the dataset.
+    checksum : bool, optional (default: True)
+        Compute checksums of the input files. If `False`, input files
+        are only compared by size and modification time.
+
+    """
+
+    def __init__(self, out_dir, checksum=True):
+        self.out_dir = str(out_dir)
+        self.path = os.path.join(self.out_dir, MANIFEST_FILE)
+        self.checksum = checksum
+        self.jobs = {}
+        if os.path.isfile(self.path):
+            with open(self.path, 'r') as file:
+                self.jobs = yaml.safe_load(file).get('jobs', {})
+
+    def is_up_to_date(self, key, in_files, job_cfg):
+        """Check if a job can be skipped."""
+        entry = self.jobs.get(key)
+        if entry is None:
+            return False
+        if entry['config'] != config_checksum(job_cfg):
+            logger.debug("Configuration of %s changed", key)
+            return False
+        in_files = sorted(str(f) for f in in_files)
+        if in_files != sorted(entry['inputs']):
+            logger.debug("Input files of %s changed", key)
+            return False
+        for out_file in entry['outputs']:
+            if not os.path.isfile(os.path.join(self.out_dir, out_file)):
+                logger.debug("Output file %s of %s is missing", out_file, key)
+                return False
+        for in_file in in_files:
+            if not self._is_unchanged(in_file, entry['inputs'][in_file]):
+                logger.debug("Input file %s of %s changed", in_file, key)
+                return False
+        return True
+
+    def _is_unchanged(self, path, fingerprint):
+        """Compare an input file to its recorded fingerprint."""
+        if not os.path.isfile(path):
+            return False
+        stat = os.stat(path)
+        if stat.st_size != fingerprint['size']:
+            return False
+        if stat.st_mtime == fingerprint['mtime']:
+            return True
+        if not self.checksum or 'sha256' not in fingerprint:
+            return False
+        if file_checksum(path) != fingerprint['sha256']:
+            return False
+        # Only touched, avoid computing the checksum again next time
+        fingerprint['mtime'] = stat.st_mtime
+        return True
+
+    def _fingerprint(self, path, previous=None):
+        """Get size, modification time and checksum of an input file."""
+        stat = os.stat(path)
+        fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime}
+        if self.checksum:
+            if (previous and 'sha256' in previous
+                    and previous['size'] == stat.st_size
+                    and previous['mtime'] == stat.st_mtime):
+                fingerprint['sha256'] = previous['sha256']
+            else:
+                fingerprint['sha256'] = file_checksum(path)
+        return fingerprint
+
+    def record(self, key, in_files, job_cfg, out_files):
+        """Record a successfully finished job."""
+        previous = self.jobs.get(key, {}).get('inputs', {})
+        self.jobs[key] = {
+            'config': config_checksum(job_cfg),
+            'inputs': {
+                str(f): self._fingerprint(str(f), previous.get(str(f)))
+                for f in in_files
+            },
+            'outputs': sorted(os.path.basename(str(f)) for f in out_files),
+        }
+
+    def save(self):
+        """Write the manifest to disk."""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            yaml.safe_dump({'jobs': self.jobs}, file)
+        os.replace(tmp_path, self.path)
 
 
 def extract_doi_value(tag):
@@ -264,6 +537,35 @@ def _fix_bounds(cube, dim_coord):
     return cube
 
 
+def _get_save_kwargs(cube, save_options):
+    """Get keyword arguments for :func:`iris.save` from `save_options`."""
+    kwargs = {
+        key: save_options[key]
+        for key in ('zlib', 'complevel', 'shuffle', 'contiguous')
+        if key in save_options
+    }
+    chunksizes = list(cube.shape)
+    for coord_name, size in save_options.get('chunksizes', {}).items():
+        if not cube.coords(coord_name):
+            continue
+        for dim in cube.coord_dims(coord_name):
+            chunksizes[dim] = min(size, cube.shape[dim])
+    if 'chunksizes' in save_options:
+        kwargs['chunksizes'] = tuple(chunksizes)
+
+    time_dims = cube.coord_dims('time') if cube.coords('time') else ()
+    time_slab = save_options.get('time_slab')
+    if time_dims and time_slab is None and 'chunksizes' in save_options:
+        time_slab = chunksizes[time_dims[0]]
+    if time_dims and time_slab and cube.has_lazy_data():
+        # Write whole slabs of time steps that match the netCDF chunks
+        slabs = [-1] * cube.ndim
+        slabs[time_dims[0]] = time_slab
+        logger.debug("Writing data in slabs of %s time steps", time_slab)
+        cube.data = cube.lazy_data().rechunk(slabs)
+    return kwargs
+
+
 def _fix_dim_coordnames(cube):
     """Perform a check on dim coordinate names."""
     # first check for CMOR standard coord;
@@ -40,6 +40,7 @@ from esmvaltool.diag_scripts.arctic_ocean.getdata import (aw_core, hofm_data,
 from esmvaltool.diag_scripts.arctic_ocean.plotting import (
     hofm_plot, plot2d_bias, plot2d_original_grid, plot_aw_core_stat,
     plot_profile, transect_map, transect_plot, tsplot_plot)
+from esmvaltool.diag_scripts.arctic_ocean.store import log_store_provenance
 from esmvaltool.diag_scripts.arctic_ocean.utils import (
     find_observations_name, get_clim_model_filenames, get_cmap,
     get_fx_filenames, timmean)
@@ -74,11 +75,12 @@ def run_hofm_data(cfg):
         model_filenames = get_clim_model_filenames(cfg, hofm_var)
         model_filenames = OrderedDict(
             sorted(model_filenames.items(), key=lambda t: t[0]))
-        # loop over regions and models
-        for mmodel, region in itertools.product(model_filenames,
-                                                cfg['hofm_regions']):
-            # actual extraction of the data for specific model and region
-            hofm_data(cfg, model_filenames, mmodel, hofm_var, region)
+        # loop over models
+        for mmodel in model_filenames:
+            # actual extraction of the data for specific model,
+            # all regions are extracted from the same read of the data
+            hofm_data(cfg, model_filenames, mmodel, hofm_var,
+                      cfg['hofm_regions'])
 
 
 def hofm_plot_params(cfg, hofm_var, var_number, observations):
@@ -518,6 +520,9 @@ def main(cfg):
     # # Plot TS diagrams
     run_tsdiag(cfg, observations)
 
+    # Record the provenance of the intermediate data
+    log_store_provenance(cfg)
+
 
 if __name__ == '__main__':
 
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Part of the ESMValTool Arctic Ocean diagnostics.
+
+This module contains a cache for ESMF regridding weights.
+
+The weights from a source grid to a destination grid or location stream
+only depend on the two grids, their masks and the regridding method.
+They are computed once with ESMF, kept in memory as a sparse matrix and,
+if a directory is given, saved to disk to be reused by later runs.
+Applying them to any number of levels is a single sparse matrix product.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+import ESMF
+import numpy as np
+from netCDF4 import Dataset
+from scipy.sparse import csr_matrix
+
+logger = logging.getLogger(os.path.basename(__file__))
+
+_WEIGHTS = {}
+
+
+def weights_key(method, *arrays):
+    """Compute the key identifying a set of regridding weights.
+
+    Parameters
+    ----------
+    method: str
+        name of the regridding method.
+    arrays: numpy arrays
+        coordinates and masks of the source and destination grids.
+
+    Returns
+    -------
+    str
+        hexadecimal hash of the method and of the arrays.
+    """
+    sha = hashlib.sha1(str(method).encode())
+    for array in arrays:
+        array = np.ascontiguousarray(np.ma.getdata(array))
+        sha.update(str((array.shape, array.dtype.str)).encode())
+        sha.update(array.tobytes())
+    return sha.hexdigest()
+
+
+def read_weights(filename, shape):
+    """Read ESMF regridding weights from a netCDF file.
+
+    Parameters
+    ----------
+    filename: str
+        path to the weights file, as written by ESMF.Regrid.
+    shape: tuple
+        number of destination and source points.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        the weights, as a (destination, source) matrix.
+    """
+    with Dataset(filename) as weights_file:
+        # ESMF indexes are one based
+        row = weights_file.variables['row'][:] - 1
+        col = weights_file.variables['col'][:] - 1
+        factors = weights_file.variables['S'][:]
+    return csr_matrix((factors, (row, col)), shape=shape)
+
+
+def get_weights(sourcefield, dstfield, key, weights_dir=None, **kwargs):
+    """Get the regridding weights between two ESMF fields.
+
+    The weights are looked up in memory, then in `weights_dir` and
+    only computed with ESMF if they were not found.
+
+    Parameters
+    ----------
+    sourcefield: ESMF.Field
+        field on the source grid.
+    dstfield: ESMF.Field
+        field on the destination grid or location stream.
+    key: str
+        key identifying the weights, see `weights_key`.
+    weights_dir: str
+        directory to store the weights between runs, optional.
+    kwargs:
+        keyword arguments for ESMF.Regrid (regrid_method, masks, ...).
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        the weights, as a (destination, source) matrix.
+    """
+    if key in _WEIGHTS:
+        return _WEIGHTS[key]
+
+    if weights_dir:
+        weights_dir = os.path.expanduser(weights_dir)
+    shape = (dstfield.data.size, sourcefield.data.size)
+    filename = os.path.join(weights_dir or '', key + '.nc')
+    if weights_dir and os.path.isfile(filename):
+        logger.info("Reading regridding weights from %s", filename)
+        weights = read_weights(filename, shape)
+    else:
+        if weights_dir:
+            os.makedirs(weights_dir, exist_ok=True)
+        tmpdir = tempfile.mkdtemp(dir=weights_dir or None)
+        try:
+            tmpfile = os.path.join(tmpdir, key + '.nc')
+            ESMF.Regrid(sourcefield, dstfield, filename=tmpfile, **kwargs)
+            weights = read_weights(tmpfile, shape)
+            if weights_dir:
+                logger.info("Saving regridding weights to %s", filename)
+                os.replace(tmpfile, filename)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    _WEIGHTS[key] = weights
+    return weights
+
+
+def apply_weights(weights, data, ndim=2):
+    """Regrid data with precomputed weights.
+
+    Parameters
+    ----------
+    weights: scipy.sparse.csr_matrix
+        the weights, as returned by `get_weights`.
+    data: numpy array
+        data with the `ndim` horizontal dimensions of the source grid
+        last. Any leading dimensions (e.g. levels) are regridded at once.
+    ndim: int
+        number of horizontal dimensions of the source grid.
+
+    Returns
+    -------
+    numpy array
+        regridded data, with the leading dimensions of `data` and the
+        destination points flattened into the last dimension.
+    """
+    data = np.asarray(data)
+    lead_shape = data.shape[:data.ndim - ndim]
+    data = data.reshape((-1, weights.shape[1]))
+    regridded = weights.dot(data.T).T
+    return regridded.reshape(lead_shape + (weights.shape[0], ))
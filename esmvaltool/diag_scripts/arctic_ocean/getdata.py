@@ -6,18 +6,21 @@ from netCDF files and prepearing them for plotting.
 """
 import logging
 import os
+from collections import OrderedDict
+
 import ESMF
 import numpy as np
 from netCDF4 import Dataset, num2date
 
+from esmvaltool.diag_scripts.arctic_ocean.esmf_weights import (
+    apply_weights, get_weights, weights_key)
 from esmvaltool.diag_scripts.arctic_ocean.regions import (hofm_regions,
                                                           transect_points)
+from esmvaltool.diag_scripts.arctic_ocean.store import load_data, save_data
 from esmvaltool.diag_scripts.arctic_ocean.utils import (genfilename,
                                                         point_distance,
                                                         get_fx_filenames,
-                                                        get_series_lenght,
-                                                        get_provenance_record)
-from esmvaltool.diag_scripts.shared import ProvenanceLogger
+                                                        get_series_lenght)
 
 logger = logging.getLogger(os.path.basename(__file__))
 
@@ -78,58 +81,100 @@ def load_meta(datapath, fxpath=None):
     return metadata
 
 
-def hofm_extract_region(metadata, cmor_var, indexes, level, time=0):
-    """Calculates mean over the region."""
-    # fix for climatology
-    if metadata['datafile'].variables[cmor_var].ndim < 4:
-        level_pp = metadata['datafile'].variables[cmor_var][level, :, :]
-    else:
-        level_pp = metadata['datafile'].variables[cmor_var][time, level, :, :]
-    if not isinstance(level_pp, np.ma.MaskedArray):
-        level_pp = np.ma.masked_equal(level_pp, 0)
-    data_mask = level_pp[indexes[0], indexes[1]].mask
-    area_masked = np.ma.masked_where(
-        data_mask, metadata['areacello'][indexes[0], indexes[1]])
-    result = (area_masked *
-              level_pp[indexes[0], indexes[1]]).sum() / area_masked.sum()
-    return result
+def hofm_extract_regions(metadata, cmor_var, regions, lev_limit,
+                         chunk_size=12):
+    """Calculates means over the regions for all levels and time steps.
 
+    The data are read in blocks of `chunk_size` time steps and `lev_limit`
+    levels, limited to the bounding box of all regions, and the area
+    weighted means over all regions are computed from the same block.
 
-def hofm_save_data(cfg, data_info, oce_hofm):
-    """Save data for Hovmoeller diagrams."""
+    Parameters
+    ----------
+    metadata: dict
+        metadata of the file, as returned by `load_meta`.
+    cmor_var: str
+        name of the CMOR variable
+    regions: dict
+        region names as keys and the indexes of the region points,
+        as returned by `hofm_regions`, as values.
+    lev_limit: int
+        number of levels to extract.
+    chunk_size: int
+        number of time steps to read at once.
 
-    ofiles = {}
-    ofiles['ofilename'] = genfilename(**data_info, data_type='hofm')
-    ofiles['ofilename_levels'] = genfilename(**data_info, data_type='levels')
-    ofiles['ofilename_time'] = genfilename(**data_info, data_type='time')
+    Returns
+    -------
+    dict
+        region names as keys and arrays (levels x time) with
+        the mean over the region as values, NaN where the region is
+        fully masked.
+    """
+    variable = metadata['datafile'].variables[cmor_var]
+    series_lenght = get_series_lenght(metadata['datafile'], cmor_var)
+    nlev = metadata['lev'][0:lev_limit].shape[0]
+
+    # bounding box of all regions
+    allind = [np.hstack([indexes[dim] for indexes in regions.values()])
+              for dim in range(2)]
+    if allind[0].size:
+        box = tuple(
+            slice(allind[dim].min(), allind[dim].max() + 1)
+            for dim in range(2))
+    else:
+        box = (slice(0, 0), slice(0, 0))
+    offset = [box[dim].start for dim in range(2)]
+    areacello = metadata['areacello'][box]
+
+    oce_hofm = {}
+    weights = {}
+    for region, indexes in regions.items():
+        oce_hofm[region] = np.zeros((nlev, series_lenght))
+        points = (indexes[0] - offset[0], indexes[1] - offset[1])
+        area = areacello[points]
+        weights[region] = (points,
+                           np.where(np.ma.getmaskarray(area), 0.,
+                                    np.ma.getdata(area)))
+
+    for start in range(0, series_lenght, chunk_size):
+        stop = min(start + chunk_size, series_lenght)
+        # fix for climatology
+        if variable.ndim < 4:
+            block = variable[0:nlev, box[0], box[1]][np.newaxis]
+        else:
+            block = variable[start:stop, 0:nlev, box[0], box[1]]
+        if not isinstance(block, np.ma.MaskedArray):
+            block = np.ma.masked_equal(block, 0)
+        for region, (points, area) in weights.items():
+            data = block[:, :, points[0], points[1]]
+            area = np.where(np.ma.getmaskarray(data), 0., area)
+            total = area.sum(axis=-1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result = (area * data.filled(0)).sum(axis=-1) / total
+            # levels where the region is fully masked are left empty
+            oce_hofm[region][:, start:stop] = np.where(total > 0, result,
+                                                       np.nan).T
+    return oce_hofm
 
-    np.save(ofiles['ofilename'], oce_hofm)
-    provenance_record = get_provenance_record(data_info, 'hofm', 'npy')
-    with ProvenanceLogger(cfg) as provenance_logger:
-        provenance_logger.log(ofiles['ofilename'] + '.npy', provenance_record)
 
-    if isinstance(data_info['levels'], np.ma.core.MaskedArray):
-        np.save(ofiles['ofilename_levels'],
-                data_info['levels'][0:data_info['lev_limit']].filled())
-    else:
-        np.save(ofiles['ofilename_levels'],
-                data_info['levels'][0:data_info['lev_limit']])
-    provenance_record = get_provenance_record(data_info, 'lev', 'npy')
-    with ProvenanceLogger(cfg) as provenance_logger:
-        provenance_logger.log(ofiles['ofilename_levels'] + '.npy',
-                              provenance_record)
+def hofm_save_data(cfg, data_info, oce_hofm):
+    """Save data for Hovmoeller diagrams."""
 
-    np.save(ofiles['ofilename_time'], data_info['time'])
-    provenance_record = get_provenance_record(data_info, 'time', 'npy')
-    with ProvenanceLogger(cfg) as provenance_logger:
-        provenance_logger.log(ofiles['ofilename_time'] + '.npy',
-                              provenance_record)
+    save_data(data_info['basedir'],
+              ('hofm', data_info['mmodel'], data_info['variable'],
+               data_info['region']), {
+                   'hofm': oce_hofm,
+                   'levels': np.ma.filled(
+                       data_info['levels'][0:data_info['lev_limit']]),
+                   'time': data_info['time'],
+               }, [data_info['ori_file'], data_info['areacello']])
 
 
-def hofm_data(cfg, model_filenames, mmodel, cmor_var, region):
+def hofm_data(cfg, model_filenames, mmodel, cmor_var, regions):
     """Extract data for Hovmoeller diagrams from monthly values.
 
-    Saves the data to files in `diagworkdir`.
+    Saves the data to files in `diagworkdir`. The data are read only
+    once for all regions.
 
     Parameters
     ----------
@@ -143,8 +188,8 @@ def hofm_data(cfg, model_filenames, mmodel, cmor_var, region):
         dictionary with model names as keys and paths to fx files as values.
     max_level: float
         maximum depth level the Hovmoeller diagrams should go to.
-    region: str
-        name of the region predefined in `hofm_regions` function.
+    regions: list
+        names of the regions predefined in `hofm_regions` function.
     diagworkdir: str
         path to work directory.
 
@@ -152,7 +197,8 @@ def hofm_data(cfg, model_filenames, mmodel, cmor_var, region):
     -------
     None
     """
-    logger.info("Extract  %s data for %s, region %s", cmor_var, mmodel, region)
+    logger.info("Extract  %s data for %s, regions %s", cmor_var, mmodel,
+                regions)
     areacello_fx = get_fx_filenames(cfg, 'areacello')
     metadata = load_meta(datapath=model_filenames[mmodel],
                          fxpath=areacello_fx[mmodel])
@@ -160,107 +206,83 @@ def hofm_data(cfg, model_filenames, mmodel, cmor_var, region):
     lev_limit = metadata['lev'][
         metadata['lev'] <= cfg['hofm_depth']].shape[0] + 1
 
-    indexes = hofm_regions(region, metadata['lon2d'], metadata['lat2d'])
-
-    series_lenght = get_series_lenght(metadata['datafile'], cmor_var)
-
-    oce_hofm = np.zeros((metadata['lev'][0:lev_limit].shape[0], series_lenght))
-    for mon in range(series_lenght):
-        for ind, _ in enumerate(metadata['lev'][0:lev_limit]):
-            oce_hofm[ind, mon] = hofm_extract_region(metadata, cmor_var,
-                                                     indexes, ind, mon)
-    data_info = {}
-    data_info['basedir'] = cfg['work_dir']
-    data_info['variable'] = cmor_var
-    data_info['mmodel'] = mmodel
-    data_info['region'] = region
-    data_info['time'] = metadata['time']
-    data_info['levels'] = metadata['lev']
-    data_info['lev_limit'] = lev_limit
-    data_info['ori_file'] = model_filenames[mmodel]
-    data_info['areacello'] = areacello_fx[mmodel]
-
-    hofm_save_data(cfg, data_info, oce_hofm)
+    indexes = OrderedDict(
+        (region, hofm_regions(region, metadata['lon2d'], metadata['lat2d']))
+        for region in regions)
+
+    oce_hofm = hofm_extract_regions(metadata,
+                                    cmor_var,
+                                    indexes,
+                                    lev_limit,
+                                    chunk_size=cfg.get('hofm_chunk_size', 12))
+    for region in regions:
+        data_info = {}
+        data_info['basedir'] = cfg['work_dir']
+        data_info['variable'] = cmor_var
+        data_info['mmodel'] = mmodel
+        data_info['region'] = region
+        data_info['time'] = metadata['time']
+        data_info['levels'] = metadata['lev']
+        data_info['lev_limit'] = lev_limit
+        data_info['ori_file'] = model_filenames[mmodel]
+        data_info['areacello'] = areacello_fx[mmodel]
+
+        hofm_save_data(cfg, data_info, oce_hofm[region])
 
     metadata['datafile'].close()
 
 
-def transect_level(datafile, cmor_var, level, grid, locstream):
-    """Interpolation for one level of transect."""
+def transect_levels(datafile, cmor_var, grid, locstream, weights_dir=None):
+    """Interpolation for all levels of transect at once."""
 
     sourcefield = ESMF.Field(
         grid,
         staggerloc=ESMF.StaggerLoc.CENTER,
         name='MPI',
     )
-    # load model data
-    model_data = datafile.variables[cmor_var][0, level, :, :]
-
-    # ESMF do not understand masked arrays, so fill them
-    if isinstance(model_data, np.ma.core.MaskedArray):
-        sourcefield.data[...] = model_data.filled(0).T
-    else:
-        sourcefield.data[...] = model_data.T
-
     # create a field we giong to intorpolate TO
     dstfield = ESMF.Field(locstream, name='dstfield')
     dstfield.data[:] = 0.0
 
-    # create an object to regrid data
+    # get the weights to regrid data
     # from the source to the destination field
     dst_mask_values = None
     # if domask:
     dst_mask_values = np.array([0])
-
-    regrid = ESMF.Regrid(
+    key = weights_key('NEAREST_STOD', datafile.variables['lon'][:],
+                      datafile.variables['lat'][:], locstream["ESMF:Lon"],
+                      locstream["ESMF:Lat"], locstream["ESMF:Mask"])
+    weights = get_weights(
         sourcefield,
         dstfield,
+        key,
+        weights_dir=weights_dir,
         regrid_method=ESMF.RegridMethod.NEAREST_STOD,
         # regrid_method=ESMF.RegridMethod.BILINEAR,
         unmapped_action=ESMF.UnmappedAction.IGNORE,
         dst_mask_values=dst_mask_values)
 
-    # do the regridding from source to destination field
-    dstfield = regrid(sourcefield, dstfield)
-    return dstfield
+    # load model data
+    model_data = datafile.variables[cmor_var][0, :, :, :]
+
+    # the weights do not know about masked arrays, so fill them
+    if isinstance(model_data, np.ma.core.MaskedArray):
+        model_data = model_data.filled(0)
+
+    # do the regridding of all levels from source to destination points
+    return apply_weights(weights, model_data).T
 
 
 def transect_save_data(cfg, data_info, secfield, lon_s4new, lat_s4new):
     """Save data for transects."""
 
-    ofiles = {}
-    ofiles['ofilename'] = genfilename(**data_info, data_type='transect')
-    ofiles['ofilename_depth'] = genfilename(
-        data_info['basedir'], 'depth', data_info['mmodel'],
-        data_info['region'], 'transect_' + data_info['variable'])
-    ofiles['ofilename_dist'] = genfilename(data_info['basedir'], 'distance',
-                                           data_info['mmodel'],
-                                           data_info['region'],
-                                           'transect_' + data_info['variable'])
-
-    np.save(ofiles['ofilename'], secfield)
-    print(ofiles['ofilename'])
-    provenance_record = get_provenance_record(data_info, 'transect', 'npy')
-    with ProvenanceLogger(cfg) as provenance_logger:
-        provenance_logger.log(ofiles['ofilename'] + '.npy', provenance_record)
-    # we have to fill masked arrays before saving
-
-    if isinstance(data_info['levels'], np.ma.core.MaskedArray):
-        np.save(ofiles['ofilename_depth'], data_info['levels'].filled())
-    else:
-        np.save(ofiles['ofilename_depth'], data_info['levels'])
-    print(ofiles['ofilename_depth'])
-    provenance_record = get_provenance_record(data_info, 'levels', 'npy')
-    with ProvenanceLogger(cfg) as provenance_logger:
-        provenance_logger.log(ofiles['ofilename_depth'] + '.npy',
-                              provenance_record)
-
-    np.save(ofiles['ofilename_dist'], point_distance(lon_s4new, lat_s4new))
-    provenance_record = get_provenance_record(data_info, 'distance', 'npy')
-    with ProvenanceLogger(cfg) as provenance_logger:
-        provenance_logger.log(ofiles['ofilename_dist'] + '.npy',
-                              provenance_record)
-    print(ofiles['ofilename_dist'])
+    save_data(data_info['basedir'],
+              ('transect', data_info['mmodel'], data_info['variable'],
+               data_info['region']), {
+                   'transect': secfield,
+                   'levels': np.ma.filled(data_info['levels']),
+                   'distance': point_distance(lon_s4new, lat_s4new),
+               }, [data_info['ori_file'], data_info['areacello']])
 
 
 def transect_data(cfg, mmodel, cmor_var, region, mult=2):
@@ -315,14 +337,12 @@ def transect_data(cfg, mmodel, cmor_var, region, mult=2):
     # if domask:
     locstream["ESMF:Mask"] = np.array(np.ones(lon_s4new.shape[0]),
                                       dtype=np.int32)
-    # initialise array for the section
-    secfield = np.zeros(
-        (lon_s4new.shape[0], datafile.variables[cmor_var].shape[1]))
-
-    # loop over depth levels
-    for level in range(0, datafile.variables[cmor_var].shape[1]):
-        secfield[:, level] = transect_level(datafile, cmor_var, level, grid,
-                                            locstream).data
+    # interpolate all depth levels
+    secfield = transect_levels(datafile,
+                               cmor_var,
+                               grid,
+                               locstream,
+                               weights_dir=cfg.get('weights_dir'))
     data_info = {}
     data_info['basedir'] = cfg['work_dir']
     data_info['variable'] = cmor_var
@@ -357,30 +377,12 @@ def tsplot_extract_data(mmodel, observations, metadata_t, metadata_s, ind):
 def tsplot_save_data(cfg, data_info, temp, salt, depth_model):
     """Save data for TS plots."""
 
-    ofiles = {}
-    data_info['variable'] = 'thetao'
-    ofiles['ofilename_t'] = genfilename(**data_info, data_type='tsplot')
-    np.save(ofiles['ofilename_t'], temp)
-    provenance_record = get_provenance_record(data_info, 'tsplot', 'npy')
-    with ProvenanceLogger(cfg) as provenance_logger:
-        provenance_logger.log(ofiles['ofilename_t'] + '.npy',
-                              provenance_record)
-
-    data_info['variable'] = 'so'
-    ofiles['ofilename_s'] = genfilename(**data_info, data_type='tsplot')
-    np.save(ofiles['ofilename_s'], salt)
-    provenance_record = get_provenance_record(data_info, 'tsplot', 'npy')
-    with ProvenanceLogger(cfg) as provenance_logger:
-        provenance_logger.log(ofiles['ofilename_s'] + '.npy',
-                              provenance_record)
-
-    data_info['variable'] = 'depth'
-    ofiles['ofilename_depth'] = genfilename(**data_info, data_type='tsplot')
-    np.save(ofiles['ofilename_depth'], depth_model)
-    provenance_record = get_provenance_record(data_info, 'tsplot', 'npy')
-    with ProvenanceLogger(cfg) as provenance_logger:
-        provenance_logger.log(ofiles['ofilename_depth'] + '.npy',
-                              provenance_record)
+    save_data(data_info['basedir'],
+              ('tsplot', data_info['mmodel'], None, data_info['region']), {
+                  'thetao': temp,
+                  'so': salt,
+                  'depth': depth_model,
+              }, data_info['ori_file'] + [data_info['areacello']])
 
 
 def tsplot_data(cfg, mmodel, region, observations='PHC'):
@@ -492,13 +494,9 @@ def aw_core(model_filenames, diagworkdir, region, cmor_var):
         aw_core_parameters[mmodel] = {}
         logger.info("Plot profile %s data for %s, region %s", cmor_var, mmodel,
                     region)
-        ifilename = genfilename(diagworkdir, cmor_var, mmodel, region, 'hofm',
-                                '.npy')
-        ifilename_levels = genfilename(diagworkdir, cmor_var, mmodel, region,
-                                       'levels', '.npy')
-
-        hofdata = np.load(ifilename, allow_pickle=True)
-        lev = np.load(ifilename_levels, allow_pickle=True)
+        hofdata, lev = load_data(diagworkdir,
+                                 ('hofm', mmodel, cmor_var, region), 'hofm',
+                                 'levels')
 
         profile = (hofdata)[:, :].mean(axis=1)
         maxvalue = np.max(profile[(lev >= 200) & (lev <= 1000)])
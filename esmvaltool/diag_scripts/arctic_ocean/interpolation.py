@@ -11,6 +11,8 @@ import numpy as np
 from cartopy.util import add_cyclic_point
 # from netCDF4 import Dataset
 
+from esmvaltool.diag_scripts.arctic_ocean.esmf_weights import (
+    apply_weights, get_weights, weights_key)
 from esmvaltool.diag_scripts.arctic_ocean.getdata import load_meta
 
 logger = logging.getLogger(os.path.basename(__file__))
@@ -89,28 +91,39 @@ def add_esmf_cyclic(metadata_obs, data_onlevel, interpolated):
     return lonc, latc, data_onlevel_cyc, interpolated_cyc
 
 
-def esmf_regriding(sourcefield, distfield, metadata_obs, data_onlev_obs):
-    """Use ESMF fields to do the regriding."""
-    # define the regrider
-    regrid = ESMF.Regrid(
+def esmf_regriding(sourcefield,
+                   distfield,
+                   metadata_obs,
+                   data_onlev_obs,
+                   key,
+                   weights_dir=None):
+    """Use ESMF fields to do the regriding.
+
+    The regridding weights are identified by `key` and computed only
+    once, see `esmf_weights.get_weights`.
+    """
+    # get the regridding weights
+    weights = get_weights(
         sourcefield,
         distfield,
+        key,
+        weights_dir=weights_dir,
         regrid_method=ESMF.RegridMethod.NEAREST_STOD,
         # regrid_method=ESMF.RegridMethod.BILINEAR,
         unmapped_action=ESMF.UnmappedAction.IGNORE,
         dst_mask_values=np.array([1]),
         src_mask_values=np.array([1]))
     # actual regriding
-    distfield = regrid(sourcefield, distfield)
+    data_interpolated = apply_weights(weights, sourcefield.data[...].T)
     # reshape the data and convert to masked array
-    data_interpolated = distfield.data[:].T
+    data_interpolated = data_interpolated.reshape(distfield.data.T.shape)
     data_interpolated = np.ma.masked_equal(data_interpolated, 0)
     lonc, latc, data_onlevel_cyc, interpolated_cyc = add_esmf_cyclic(
         metadata_obs, data_onlev_obs, data_interpolated)
     return lonc, latc, data_onlevel_cyc, interpolated_cyc
 
 
-def interpolate_esmf(obs_file, mod_file, depth, cmor_var):
+def interpolate_esmf(obs_file, mod_file, depth, cmor_var, weights_dir=None):
     """The 2d interpolation with ESMF.
 
     Parameters
@@ -123,6 +136,10 @@ def interpolate_esmf(obs_file, mod_file, depth, cmor_var):
     depth: int
         depth to interpolate to. First the closest depth from the
         observations will be selected and then.
+    cmor_var: str
+        name of the CMOR variable.
+    weights_dir: str
+        directory to store the regridding weights between runs, optional.
     """
     metadata_obs = load_meta(obs_file, fxpath=None)
     metadata_mod = load_meta(mod_file, fxpath=None)
@@ -145,7 +162,17 @@ def interpolate_esmf(obs_file, mod_file, depth, cmor_var):
     sourcefield = define_esmf_field(mod_file, data_onlev_mod, 'Model')
     sourcefield.data[...] = data_onlev_mod.T
 
+    key = weights_key('NEAREST_STOD', metadata_mod['lon2d'],
+                      metadata_mod['lat2d'],
+                      np.ma.getmaskarray(data_onlev_mod),
+                      metadata_obs['lon2d'], metadata_obs['lat2d'],
+                      np.ma.getmaskarray(data_onlev_obs))
     lonc, latc, data_onlev_obs_cyc, data_interpolated_cyc = esmf_regriding(
-        sourcefield, distfield, metadata_obs, data_onlev_obs)
+        sourcefield,
+        distfield,
+        metadata_obs,
+        data_onlev_obs,
+        key,
+        weights_dir=weights_dir)
 
     return lonc, latc, target_depth, data_onlev_obs_cyc, data_interpolated_cyc
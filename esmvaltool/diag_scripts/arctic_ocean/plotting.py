@@ -19,6 +19,7 @@ from esmvaltool.diag_scripts.arctic_ocean.getdata import (load_meta,
                                                           transect_points)
 from esmvaltool.diag_scripts.arctic_ocean.interpolation import (
     closest_depth, interpolate_esmf)
+from esmvaltool.diag_scripts.arctic_ocean.store import load_data, store_path
 from esmvaltool.diag_scripts.arctic_ocean.utils import (dens_back, genfilename,
                                                         point_distance,
                                                         get_provenance_record)
@@ -166,18 +167,11 @@ def hofm_plot(cfg, plot_params):
         # generate input filenames that
         # the data prepared by `hofm_data` function
 
-        ifilename = genfilename(cfg['work_dir'], plot_params['variable'],
-                                mmodel, plot_params['region'], 'hofm', '.npy')
-        ifilename_levels = genfilename(cfg['work_dir'],
-                                       plot_params['variable'], mmodel,
-                                       plot_params['region'], 'levels', '.npy')
-        ifilename_time = genfilename(cfg['work_dir'], plot_params['variable'],
-                                     mmodel, plot_params['region'], 'time',
-                                     '.npy')
         # load the data
-        hofdata = np.load(ifilename, allow_pickle=True)
-        lev = np.load(ifilename_levels, allow_pickle=True)
-        time = np.load(ifilename_time, allow_pickle=True)
+        hofdata, lev, time = load_data(
+            cfg['work_dir'],
+            ('hofm', mmodel, plot_params['variable'], plot_params['region']),
+            'hofm', 'levels', 'time')
 
         # convert data if needed and get labeles for colorbars
         cb_label, hofdata = label_and_conversion(plot_params['variable'],
@@ -223,7 +217,7 @@ def hofm_plot(cfg, plot_params):
     plt.tight_layout()
     # generate the path to the output file
     plot_params['basedir'] = cfg['plot_dir']
-    plot_params['ori_file'] = [ifilename]
+    plot_params['ori_file'] = [store_path(cfg['work_dir'])]
     plot_params['areacello'] = None
     plot_params['mmodel'] = None
 
@@ -276,16 +270,9 @@ def tsplot_plot(cfg, plot_params):
         logger.info("Plot  tsplot data for %s, region %s", mmodel,
                     plot_params['region'])
         # load mean data created by `tsplot_data`
-        ifilename_t = genfilename(cfg['work_dir'], 'thetao', mmodel,
-                                  plot_params['region'], 'tsplot', '.npy')
-        ifilename_s = genfilename(cfg['work_dir'], 'so', mmodel,
-                                  plot_params['region'], 'tsplot', '.npy')
-        ifilename_depth = genfilename(cfg['work_dir'], 'depth', mmodel,
-                                      plot_params['region'], 'tsplot', '.npy')
-
-        temp = np.load(ifilename_t, allow_pickle=True)
-        salt = np.load(ifilename_s, allow_pickle=True)
-        depth = np.load(ifilename_depth, allow_pickle=True)
+        temp, salt, depth = load_data(
+            cfg['work_dir'], ('tsplot', mmodel, None, plot_params['region']),
+            'thetao', 'so', 'depth')
         # Still old fashioned way to setup a plot, works best for now.
         plt.subplot(nrows, ncols, nplot)
         # calculate background with density isolines
@@ -336,7 +323,7 @@ def tsplot_plot(cfg, plot_params):
                              data_type='tsplot')
     plt.savefig(pltoutname, dpi=100)
     plot_params['basedir'] = cfg['plot_dir']
-    plot_params['ori_file'] = [ifilename_t]
+    plot_params['ori_file'] = [store_path(cfg['work_dir'])]
     plot_params['areacello'] = None
     plot_params['mmodel'] = None
 
@@ -389,15 +376,11 @@ def plot_profile(cfg, plot_params):
     for mmodel in plot_params['model_filenames']:
         logger.info("Plot profile %s data for %s, region %s",
                     plot_params['variable'], mmodel, plot_params['region'])
-        # construct input filenames
-        ifilename = genfilename(cfg['work_dir'], plot_params['variable'],
-                                mmodel, plot_params['region'], 'hofm', '.npy')
-        ifilename_levels = genfilename(cfg['work_dir'],
-                                       plot_params['variable'], mmodel,
-                                       plot_params['region'], 'levels', '.npy')
         # load data
-        hofdata = np.load(ifilename, allow_pickle=True)
-        lev = np.load(ifilename_levels, allow_pickle=True)
+        hofdata, lev = load_data(
+            cfg['work_dir'],
+            ('hofm', mmodel, plot_params['variable'], plot_params['region']),
+            'hofm', 'levels')
 
         # convert data if needed and set labeles
         cb_label, hofdata = label_and_conversion(plot_params['variable'],
@@ -451,7 +434,7 @@ def plot_profile(cfg, plot_params):
     plt.gca().invert_yaxis()
 
     plot_params['basedir'] = cfg['plot_dir']
-    plot_params['ori_file'] = [ifilename]
+    plot_params['ori_file'] = [store_path(cfg['work_dir'])]
     plot_params['areacello'] = None
     plot_params['mmodel'] = None
 
@@ -671,8 +654,11 @@ def plot2d_bias(cfg, plot_params):
         # do the interpolation to the observation grid
         # the output is
         lonc, latc, target_depth, data_obs, interpolated = interpolate_esmf(
-            ifilename_obs, ifilename, plot_params['depth'],
-            plot_params['variable'])
+            ifilename_obs,
+            ifilename,
+            plot_params['depth'],
+            plot_params['variable'],
+            weights_dir=cfg.get('weights_dir'))
         # get the label and convert data if needed
         cb_label, data_obs = label_and_conversion(plot_params['variable'],
                                                   data_obs)
@@ -913,23 +899,13 @@ def transect_plot(cfg, plot_params):
     for index, mmodel in enumerate(plot_params['model_filenames']):
         logger.info("Plot  %s data for %s, region %s", plot_params['variable'],
                     mmodel, plot_params['region'])
-        # construct file names and get the data
-        ifilename = genfilename(cfg['work_dir'], plot_params['variable'],
-                                mmodel, plot_params['region'], 'transect',
-                                '.npy')
-        ifilename_depth = genfilename(cfg['work_dir'], 'depth', mmodel,
-                                      plot_params['region'],
-                                      'transect_' + plot_params['variable'],
-                                      '.npy')
-        ifilename_dist = genfilename(cfg['work_dir'], 'distance', mmodel,
-                                     plot_params['region'],
-                                     'transect_' + plot_params['variable'],
-                                     '.npy')
-
-        data = np.load(ifilename, allow_pickle=True)
+        # get the data
+        data, lev, dist = load_data(cfg['work_dir'],
+                                    ('transect', mmodel,
+                                     plot_params['variable'],
+                                     plot_params['region']), 'transect',
+                                    'levels', 'distance')
         data = np.ma.masked_equal(data.T, 0)
-        lev = np.load(ifilename_depth, allow_pickle=True)
-        dist = np.load(ifilename_dist, allow_pickle=True)
         # get labeles and convert the data
         cb_label, data = label_and_conversion(plot_params['variable'], data)
         # index of the maximum depth
@@ -966,7 +942,7 @@ def transect_plot(cfg, plot_params):
 
     plt.savefig(pltoutname, dpi=100)
     plot_params['basedir'] = cfg['plot_dir']
-    plot_params['ori_file'] = ifilename
+    plot_params['ori_file'] = store_path(cfg['work_dir'])
     plot_params['areacello'] = None
     plot_params['mmodel'] = None
 
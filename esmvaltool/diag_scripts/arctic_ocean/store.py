@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Part of the ESMValTool Arctic Ocean diagnostics.
+
+This module contains functions for the store of intermediate data.
+
+The data prepared for plotting (Hovmoeller diagrams, transects,
+TS diagrams) are saved as named arrays in a single netCDF4 file
+in the work directory, with one group per data type, model,
+variable and region. Each array is compressed and chunked, so
+the plotting functions read only the arrays they need.
+"""
+import logging
+import os
+
+import numpy as np
+from netCDF4 import Dataset, date2num, num2date
+
+from esmvaltool.diag_scripts.shared import ProvenanceLogger
+
+logger = logging.getLogger(os.path.basename(__file__))
+
+STORE_NAME = 'arctic_ocean_store.nc'
+
+TIME_UNITS = 'days since 1850-01-01 00:00:00'
+
+
+def store_path(basedir):
+    """Get the path to the store of intermediate data.
+
+    Parameters
+    ----------
+    basedir: str
+        path to the work directory.
+
+    Returns
+    -------
+    str
+        path to the store file.
+    """
+    return os.path.join(basedir, STORE_NAME)
+
+
+def _group_path(key):
+    """Get the group of the store for a (data_type, mmodel, ...) key."""
+    return '/'.join(str(part) for part in key if part)
+
+
+def save_data(basedir, key, arrays, ancestors):
+    """Save named arrays to the store of intermediate data.
+
+    Parameters
+    ----------
+    basedir: str
+        path to the work directory.
+    key: tuple
+        data type, model, variable and region, None if not relevant.
+    arrays: dict
+        names of the arrays as keys and arrays as values. Arrays of
+        dates are saved as numbers with units and calendar.
+    ancestors: list
+        files the data are computed from, None entries are ignored.
+    """
+    filename = store_path(basedir)
+    mode = 'a' if os.path.isfile(filename) else 'w'
+    with Dataset(filename, mode) as store:
+        group = store.createGroup(_group_path(key))
+        for name, array in arrays.items():
+            attributes = {}
+            if np.asarray(array).dtype == object:
+                attributes['units'] = TIME_UNITS
+                attributes['calendar'] = getattr(
+                    np.ravel(array)[0], 'calendar', None) or 'standard'
+                array = date2num(array, **attributes)
+            array = np.ma.asanyarray(array)
+            dims = []
+            for index, size in enumerate(array.shape):
+                dims.append('{}_{}'.format(name, index))
+                group.createDimension(dims[-1], size)
+            fill_value = np.ma.default_fill_value(array.dtype)
+            variable = group.createVariable(name,
+                                            array.dtype,
+                                            dims,
+                                            zlib=True,
+                                            fill_value=fill_value)
+            variable.setncatts(attributes)
+            variable[...] = array
+        ancestors = [str(ancestor) for ancestor in ancestors if ancestor]
+        if ancestors:
+            group.setncattr('ancestors', ancestors)
+    logger.debug("Saved %s of %s to %s", list(arrays), key, filename)
+
+
+def load_data(basedir, key, *names):
+    """Load named arrays from the store of intermediate data.
+
+    Parameters
+    ----------
+    basedir: str
+        path to the work directory.
+    key: tuple
+        data type, model, variable and region, None if not relevant.
+    names: str
+        names of the arrays to load.
+
+    Returns
+    -------
+    numpy array or tuple of numpy arrays
+        the arrays, masked only if they contain missing values.
+    """
+    arrays = []
+    with Dataset(store_path(basedir)) as store:
+        group = store[_group_path(key)]
+        for name in names:
+            variable = group.variables[name]
+            array = variable[...]
+            if 'calendar' in variable.ncattrs():
+                array = num2date(array, variable.units, variable.calendar)
+            elif not np.ma.is_masked(array):
+                array = np.ma.getdata(array)
+            arrays.append(array)
+    if len(arrays) == 1:
+        return arrays[0]
+    return tuple(arrays)
+
+
+def _ancestors(group):
+    """Collect the ancestors of all groups of the store."""
+    ancestors = set()
+    if 'ancestors' in group.ncattrs():
+        ancestors.update(np.atleast_1d(group.getncattr('ancestors')))
+    for subgroup in group.groups.values():
+        ancestors.update(_ancestors(subgroup))
+    return ancestors
+
+
+def log_store_provenance(cfg):
+    """Record the provenance of the store of intermediate data once.
+
+    Parameters
+    ----------
+    cfg: dict
+        configuration dictionary ESMValTool format.
+    """
+    filename = store_path(cfg['work_dir'])
+    if not os.path.isfile(filename):
+        return
+    with Dataset(filename) as store:
+        ancestors = sorted(_ancestors(store))
+    record = {
+        'caption': ("Data for Hovmoeller diagrams, transects "
+                    "and TS diagrams."),
+        'authors': ['koldunov_nikolay'],
+        'references': [
+            'contact_authors',
+        ],
+        'ancestors': ancestors,
+    }
+    with ProvenanceLogger(cfg) as provenance_logger:
+        provenance_logger.log(filename, record)
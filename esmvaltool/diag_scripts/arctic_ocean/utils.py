@@ -275,18 +275,9 @@ def get_series_lenght(datafile, cmor_var):
 
 def get_provenance_record(attributes, data_type, file_type):
     """Create a provenance record describing the diagnostic data and plot."""
-    if data_type == 'hofm' and file_type == 'npy':
-        caption = ("Data for Hovmoeller diagram. "
-                   "Region: {region}. Model: {mmodel} ".format(**attributes))
-    elif data_type == 'hofm' and file_type == 'png':
+    if data_type == 'hofm' and file_type == 'png':
         caption = ("Hovmoeller diagram. "
                    "Region: {region}. Model: {mmodel} ".format(**attributes))
-    elif data_type == 'transect' and file_type == 'npy':
-        caption = ("Data for Transect. "
-                   "Region: {region}. Model: {mmodel} ".format(**attributes))
-    elif data_type == 'tsplot' and file_type == 'npy':
-        caption = ("Data for TS diagram. "
-                   "Region: {region}. Model: {mmodel} ".format(**attributes))
     elif data_type == 'timmean' and file_type == 'nc':
         caption = ("Global time mean. "
                    "Region: {region}. Model: {mmodel} ".format(**attributes))
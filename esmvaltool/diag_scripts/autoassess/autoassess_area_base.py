@@ -27,7 +27,11 @@ import logging
 import importlib
 import csv
 import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 import iris
+from esmvaltool.diag_scripts.autoassess.loaddata import (fix_cube,
+                                                         write_catalogue)
 from esmvaltool.diag_scripts.shared import run_diagnostic
 
 logger = logging.getLogger(__name__)
@@ -51,16 +55,8 @@ def _import_package(area):
 
 def _fix_cube(cube_list):
     """Apply some ad hoc fixes to cubes."""
-    # force add a long_name; supermeans uses extract_strict
-    # and for derived vars there is only
-    # invalid_standard_name which is an attribute
     for cube in cube_list:
-        if 'invalid_standard_name' in cube.attributes:
-            cube.long_name = cube.attributes['invalid_standard_name']
-        coord_names = [coord.standard_name for coord in cube.coords()]
-        if 'time' in coord_names:
-            if not cube.coord('time').has_bounds():
-                cube.coord('time').guess_bounds()
+        fix_cube(cube)
     return cube_list
 
 
@@ -176,20 +172,34 @@ def _process_obs(cfg, obs_list, obs_loc):
         iris.save(cubes_list_obs, os.path.join(obs_loc, obs_file_name))
 
 
+def _link(source, link_name):
+    """Create or replace a relative symbolic link to a file."""
+    if os.path.lexists(link_name):
+        os.remove(link_name)
+    os.symlink(os.path.relpath(source, os.path.dirname(link_name)), link_name)
+
+
 def _process_metrics_data(all_files, suites, smeans):
-    """Create and save concatenated cubes for ctrl and exp."""
+    """Create and save concatenated cubes for ctrl and exp.
+
+    The concatenated cubes are saved once, for the supermeans, and linked
+    to from the suite directory. The suite directory also gets a
+    catalogue of the input files, so that `loaddata.load_run_ss` only
+    loads the requested cube.
+    """
     cubes_lists_paths = []
     for key in all_files.keys():
         filelist = all_files[key]
         if filelist:
             cubelist = iris.load(filelist)
 
-            # save to congragated files; save twice for supermeans as well
+            # save to congragated file once and link to it
             cubes_list_path = os.path.join(suites[key], 'cubeList.nc')
             cubes_list_smean_path = os.path.join(smeans[key], 'cubeList.nc')
             cubelist = _fix_cube(cubelist)
-            iris.save(cubelist, cubes_list_path)
             iris.save(cubelist, cubes_list_smean_path)
+            _link(cubes_list_smean_path, cubes_list_path)
+            write_catalogue(filelist, suites[key])
             cubes_lists_paths.append(cubes_list_path)
 
     return cubes_lists_paths
@@ -346,6 +356,48 @@ def _create_run_dict(cfg):
     return run
 
 
+def _run_metric(run_obj, area_out_dir, index):
+    """
+    Run a single metric function of an area for a single suite.
+
+    The metric function is looked up by its `index` in the metrics
+    functions of the area package, so that this can be run in a worker
+    process. The areas write all output to the cwd, which is set here,
+    in the process running the metric function.
+
+    Returns
+    -------
+    The metrics and the wall time spent computing them, in seconds.
+
+    """
+    area_package = _import_package(run_obj['_area'])
+    metric_function = area_package.metrics_functions[index]
+    logger.info('# Call: %s for %s', metric_function, run_obj['runid'])
+    os.chdir(area_out_dir)
+    start = time.time()
+    metrics = metric_function(run_obj)
+    return metrics, time.time() - start
+
+
+def _write_metrics(run_obj, suite_metrics):
+    """Merge the metrics of a suite and write them to metrics.csv."""
+    all_metrics = {}
+    for metrics in suite_metrics:
+        # check duplication
+        duplicate_metrics = list(set(all_metrics.keys()) & set(metrics.keys()))
+        if duplicate_metrics:
+            raise AssertionError('Duplicate Metrics ' +
+                                 str(duplicate_metrics))
+        all_metrics.update(metrics)
+
+    # write metrics to file
+    with open(os.path.join(run_obj['dump_output'], 'metrics.csv'),
+              'w') as file_handle:
+        writer = csv.writer(file_handle)
+        for metric in all_metrics.items():
+            writer.writerow(metric)
+
+
 def run_area(cfg):
     """
     Kick start the area diagnostic.
@@ -358,6 +410,9 @@ def run_area(cfg):
     are set in _create_run_dict; that function is the main gateway for
     this function.
 
+    The metric functions are run for each suite, using at most
+    `n_workers` (optional, default 1) worker processes.
+
     Available assessment areas: stratosphere.
 
     Parameters
@@ -383,38 +438,45 @@ def run_area(cfg):
         if run_obj['additional_metrics']:
             suite_ids.extend(run_obj['additional_metrics'])
 
-    # run the metrics generation
+    # setup for file dumping
+    suite_runs = []
     for suite_id in suite_ids:
-        logger.info('Calculating metrics for %s', suite_id)
-        # setup for file dumping
-        run_obj['runid'] = suite_id
-        run_obj['dump_output'] = os.path.join(area_out_dir, suite_id)
-        if not os.path.exists(run_obj['dump_output']):
-            os.makedirs(run_obj['dump_output'])
-        all_metrics = {}
-
-        # run each metric function
-        for metric_function in area_package.metrics_functions:
-            logger.info('# Call: %s', metric_function)
-
-            # run the metric
-            metrics = metric_function(run_obj)
-            # check duplication
-            duplicate_metrics = list(
-                set(all_metrics.keys()) & set(metrics.keys()))
-            if duplicate_metrics:
-                raise AssertionError('Duplicate Metrics ' +
-                                     str(duplicate_metrics))
-            all_metrics.update(metrics)
-
-        # write metrics to file
-        with open(os.path.join(run_obj['dump_output'], 'metrics.csv'),
-                  'w') as file_handle:
-            writer = csv.writer(file_handle)
-            for metric in all_metrics.items():
-                writer.writerow(metric)
+        suite_run = dict(run_obj)
+        suite_run['runid'] = suite_id
+        suite_run['dump_output'] = os.path.join(area_out_dir, suite_id)
+        if not os.path.exists(suite_run['dump_output']):
+            os.makedirs(suite_run['dump_output'])
+        suite_runs.append(suite_run)
+    tasks = [(suite_run, area_out_dir, index) for suite_run in suite_runs
+             for index in range(len(area_package.metrics_functions))]
+
+    # run the metrics generation
+    n_workers = cfg.get('n_workers', 1)
+    if n_workers == 1:
+        results = [_run_metric(*task) for task in tasks]
+    else:
+        logger.info('Calculating metrics using %s worker processes',
+                    n_workers)
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(_run_metric, *zip(*tasks)))
+    os.chdir(area_out_dir)
+
+    # merge the metrics, in the order of the metric functions
+    for suite_run in suite_runs:
+        suite_results = [
+            result for task, result in zip(tasks, results)
+            if task[0] is suite_run
+        ]
+        for index, (_, duration) in enumerate(suite_results):
+            logger.info('Metrics %s for %s computed in %.1f s',
+                        area_package.metrics_functions[index].__name__,
+                        suite_run['runid'], duration)
+        _write_metrics(suite_run,
+                       [metrics for metrics, _ in suite_results])
 
     # multimodel functions
+    run_obj['runid'] = suite_runs[-1]['runid']
+    run_obj['dump_output'] = suite_runs[-1]['dump_output']
     if hasattr(area_package, 'multi_functions'):
         for multi_function in area_package.multi_functions:
             multi_function(run_obj)
@@ -20,6 +20,11 @@ from datetime import datetime as dd
 import cf_units
 import iris
 import iris.coord_categorisation as coord_cat
+import yaml
+
+CATALOGUE_FILE = 'catalogue.yml'
+
+_CATALOGUES = {}
 
 
 def is_daily(cube):
@@ -90,6 +95,83 @@ def is_maximum_in_period(cube):
             return True
 
 
+def fix_cube(cube):
+    """Apply some ad hoc fixes to a cube."""
+    # force add a long_name; supermeans uses extract_strict
+    # and for derived vars there is only
+    # invalid_standard_name which is an attribute
+    if 'invalid_standard_name' in cube.attributes:
+        cube.long_name = cube.attributes['invalid_standard_name']
+    coord_names = [coord.standard_name for coord in cube.coords()]
+    if 'time' in coord_names:
+        if not cube.coord('time').has_bounds():
+            cube.coord('time').guess_bounds()
+    return cube
+
+
+def write_catalogue(filenames, data_dir):
+    """
+    Write a catalogue of the cubes in a set of files.
+
+    The catalogue maps the names (CF-name and STASH code) and the
+    averaging period of each cube to the file it is stored in, so that
+    `load_run_ss` only needs to load the files holding the requested cube.
+
+    :param list filenames: Files to catalogue.
+    :param str data_dir: Directory to write the catalogue to.
+    :returns: Path to the catalogue.
+    :rtype: str
+    """
+    catalogue = []
+    for filename in filenames:
+        for cube in iris.load(filename):
+            cube = fix_cube(cube)
+            names = [cube.name()]
+            if 'STASH' in cube.attributes:
+                names.append(str(cube.attributes['STASH']))
+            entry = {'filename': filename, 'names': names}
+            if cube.coords('time') and cube.coord('time').has_bounds():
+                entry['daily'] = is_daily(cube)
+                entry['monthly'] = is_monthly(cube)
+            catalogue.append(entry)
+    catalogue_path = os.path.join(data_dir, CATALOGUE_FILE)
+    with open(catalogue_path, 'w') as file:
+        yaml.safe_dump(catalogue, file)
+    _CATALOGUES.pop(catalogue_path, None)
+    return catalogue_path
+
+
+def load_from_catalogue(catalogue_path, variable_name, averaging_period):
+    """
+    Lazily load the cubes of a catalogue that may match a request.
+
+    The catalogue is only read once. Only the files holding cubes with a
+    matching name and, for daily and monthly data, averaging period are
+    loaded.
+
+    :param str catalogue_path: Path to the catalogue.
+    :param str variable_name: CF-name or model-section-item STASH code.
+    :param str averaging period: Averaging period, see `load_run_ss`.
+    :returns: CubeList with the candidate Cubes.
+    :rtype: CubeList
+    """
+    if catalogue_path not in _CATALOGUES:
+        with open(catalogue_path, 'r') as file:
+            _CATALOGUES[catalogue_path] = yaml.safe_load(file)
+    filenames = []
+    for entry in _CATALOGUES[catalogue_path]:
+        if variable_name not in entry['names']:
+            continue
+        if not entry.get(averaging_period, True):
+            continue
+        if entry['filename'] not in filenames:
+            filenames.append(entry['filename'])
+    if not filenames:
+        return iris.cube.CubeList()
+    return iris.cube.CubeList(
+        fix_cube(cube) for cube in iris.load(filenames))
+
+
 def select_by_variable_name(cubes, variable_name):
     """
     Select subset from CubeList matching a CF-name or STASH code.
@@ -381,6 +463,10 @@ def load_run_ss(run_object,
     DEPRECATED: Do not use for new Assessment Areas. Instead, read the
     CubeList `cubeList.nc` in the directory with the retrieved data.
 
+    If the directory with the retrieved data has a catalogue (see
+    `write_catalogue`), only the files that may hold the requested
+    cube are loaded, lazily, instead of the whole `cubeList.nc`.
+
     Select a single Cube from the data that was retrieved for a single
     Assessment Area.
 
@@ -414,11 +500,14 @@ def load_run_ss(run_object,
     :rtype: Iris cube
     :raises: `AssertionError` if not exactly one cube is selected.
     """
-    cubelist_file = 'cubeList.nc'
-    cubelist_path = os.path.join(run_object['data_root'], run_object['runid'],
-                                 run_object['_area'], cubelist_file)
-
-    cubes = iris.load(cubelist_path)
+    data_dir = os.path.join(run_object['data_root'], run_object['runid'],
+                            run_object['_area'])
+    catalogue_path = os.path.join(data_dir, CATALOGUE_FILE)
+    if os.path.isfile(catalogue_path):
+        cubes = load_from_catalogue(catalogue_path, variable_name,
+                                    averaging_period)
+    else:
+        cubes = iris.load(os.path.join(data_dir, 'cubeList.nc'))
     cubes.sort(key=lambda c: c.standard_name)
 
     return _load_run_ss(
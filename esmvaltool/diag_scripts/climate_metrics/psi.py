@@ -31,7 +31,6 @@ import cf_units
 import iris
 import iris.coord_categorisation
 import numpy as np
-from scipy import stats
 
 from esmvaltool.diag_scripts.shared import (
     ProvenanceLogger, get_diagnostic_filename, group_metadata, io,
@@ -40,30 +39,85 @@ from esmvaltool.diag_scripts.shared import (
 logger = logging.getLogger(os.path.basename(__file__))
 
 
-def calculate_psi(cube, cfg):
-    """Calculate temperature variability metric psi for a given cube."""
-    window_length = cfg.get('window_length', 55)
-    lag = cfg.get('lag', 1)
-    psi_years = []
-    psis = []
-
-    # Moving average
-    for yr_idx in range(cube.shape[0] - window_length):
-        slc = slice(yr_idx, yr_idx + window_length)
-        years = cube.coord('year').points[slc]
-        tas = np.copy(cube.data[slc])
+def _windows(array, window_length, n_windows):
+    """Get a read-only view of `n_windows` moving windows along axis 0."""
+    return np.lib.stride_tricks.as_strided(
+        array,
+        shape=(n_windows, window_length) + array.shape[1:],
+        strides=(array.strides[0], ) + array.strides,
+        writeable=False)
+
+
+def psi_moving_windows(years, data, window_length=55, lag=1,
+                       max_elements=2**24):
+    """Calculate psi for all moving windows at once.
+
+    Parameters
+    ----------
+    years : numpy.ndarray
+        1D array of years.
+    data : numpy.ndarray
+        Data with years along the first axis. Further axes (e.g. grid cells
+        or stacked datasets) are processed independently of each other.
+    window_length : int, optional (default: 55)
+        Number of years of each moving window.
+    lag : int, optional (default: 1)
+        Lag (in years) for the autocorrelation function.
+    max_elements : int, optional (default: 2**24)
+        Maximum number of elements of the temporary arrays, windows are
+        processed in blocks small enough to respect this.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Last year of each window and psi for each window, with the
+        windows along the first axis of the latter.
+
+    """
+    year_points = np.asarray(years)
+    data = np.asarray(data, dtype=float)
+    n_windows = max(data.shape[0] - window_length, 0)
+    all_x = _windows(year_points.astype(float), window_length, n_windows)
+    all_y = _windows(data, window_length, n_windows)
+    extra_dims = (np.newaxis, ) * (data.ndim - 1)
+    psis = np.empty((n_windows, ) + data.shape[1:])
+    window_size = window_length * int(np.prod(data.shape[1:]))
+    block = max(max_elements // max(window_size, 1), 1)
+    for start in range(0, n_windows, block):
+        x_win = all_x[start:start + block][(Ellipsis, ) + extra_dims]
+        y_win = all_y[start:start + block]
 
         # De-trend data
-        reg = stats.linregress(years, tas)
-        tas -= reg.slope * years + reg.intercept
+        x_anom = x_win - x_win.mean(axis=1, keepdims=True)
+        y_mean = y_win.mean(axis=1, keepdims=True)
+        slope = (np.sum(x_anom * (y_win - y_mean), axis=1, keepdims=True) /
+                 np.sum(x_anom**2, axis=1, keepdims=True))
+        intercept = y_mean - slope * x_win.mean(axis=1, keepdims=True)
+        tas = y_win - (slope * x_win + intercept)
 
         # Autocorrelation
-        norm = np.sum(np.square(tas))
-        [autocorr] = np.correlate(tas[:-lag], tas[lag:], mode='valid') / norm
+        norm = np.sum(np.square(tas), axis=1)
+        autocorr = np.sum(tas[:, :-lag] * tas[:, lag:], axis=1) / norm
 
         # Psi
-        psi_years.append(years[-1])
-        psis.append(np.std(tas) / np.sqrt(-np.log(autocorr)))
+        psis[start:start + block] = (np.std(tas, axis=1) /
+                                     np.sqrt(-np.log(autocorr)))
+    return (year_points[window_length - 1:window_length - 1 + n_windows],
+            psis)
+
+
+def calculate_psi(cube, cfg):
+    """Calculate temperature variability metric psi for a given cube.
+
+    The cube has years along the first dimension. Any further dimensions
+    (e.g. latitude and longitude for psi maps) are kept.
+
+    """
+    window_length = cfg.get('window_length', 55)
+    lag = cfg.get('lag', 1)
+    psi_years, psis = psi_moving_windows(
+        cube.coord('year').points, np.ma.filled(cube.data, np.nan),
+        window_length, lag)
 
     # Return new cube
     year_coord = iris.coords.DimCoord(
@@ -71,9 +125,14 @@ def calculate_psi(cube, cfg):
         var_name='year',
         long_name='year',
         units=cf_units.Unit('year'))
+    dim_coords_and_dims = [(year_coord, 0)]
+    for coord in cube.dim_coords:
+        if cube.coord_dims(coord) != (0, ):
+            dim_coords_and_dims.append((coord.copy(),
+                                        cube.coord_dims(coord)))
     psi_cube = iris.cube.Cube(
-        np.array(psis),
-        dim_coords_and_dims=[(year_coord, 0)],
+        np.ma.masked_invalid(psis) if psis.ndim > 1 else psis,
+        dim_coords_and_dims=dim_coords_and_dims,
         attributes={
             'window_length': window_length,
             'lag': lag
@@ -14,7 +14,9 @@ Cloud Regime Error Metrics (CREM).
     none
 
   Optional diag_script_info attributes (diagnostic specific)
-    none
+    chunk_size: number of time steps read and assigned to regimes at once
+                (default: all time steps)
+    n_workers: number of datasets processed in parallel (default: 1)
 
   Required variable_info attributes (variable specific)
     none
@@ -46,6 +48,7 @@ Cloud Regime Error Metrics (CREM).
 import logging
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pprint import pformat
 
 import matplotlib.pyplot as plt
@@ -111,6 +114,7 @@ def main(cfg):
 
     i = 0
     missing_vars = []
+    all_pointers = []
 
     for dataset in grouped_input_data:
         models.append(dataset)
@@ -172,9 +176,21 @@ def main(cfg):
                          "available: %s", printlist)
             raise Exception('Variables missing (see log file for details).')
 
-        # calculate CREM
+        all_pointers.append(pointers)
+
+    # calculate CREM
+
+    chunk_size = cfg.get('chunk_size')
+    n_workers = cfg.get('n_workers', 1)
+    if n_workers == 1:
+        results = [crem_calc(pointers, chunk_size)
+                   for pointers in all_pointers]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(crem_calc, all_pointers,
+                                        [chunk_size] * nummod))
 
-        (crem_pd, r_crem_pd) = crem_calc(pointers)
+    for (crem_pd, r_crem_pd) in results:
 
         crems[i] = crem_pd
 
@@ -284,7 +300,8 @@ def main(cfg):
         provenance_logger.log(oname, provenance_record)
 
 
-def read_and_check(srcfilename, varname, lons2, lats2, time2):
+def read_and_check(srcfilename, varname, lons2, lats2, time2,
+                   time_slice=slice(None)):
     """
     Function for reading and checking for correct regridding of input data.
 
@@ -300,6 +317,8 @@ def read_and_check(srcfilename, varname, lons2, lats2, time2):
         latitudes of target grid (ISCCP)
     time2: integer
         number of time steps
+    time_slice: slice
+        time steps to read (default: all)
     """
     nlon = len(lons2)
     nlat = len(lats2)
@@ -351,20 +370,22 @@ def read_and_check(srcfilename, varname, lons2, lats2, time2):
                         '(see log file for details).')
 
     # read data
-    src_data = src_dataset.variables[varname]
+    src_var = src_dataset.variables[varname]
+    src_data = src_var[time_slice]
 
     # create mask (missing values)
     try:
-        data = np.ma.masked_equal(src_data, getattr(src_data, "_FillValue"))
+        data = np.ma.masked_equal(src_data, getattr(src_var, "_FillValue"))
         rgmasked = np.ma.masked_invalid(data)
     except AttributeError:
         rgmasked = np.ma.masked_invalid(src_data)
     np.ma.set_fill_value(rgmasked, 0.0)
+    src_dataset.close()
 
     return np.ma.filled(rgmasked)
 
 
-def crem_calc(pointers):
+def crem_calc(pointers, chunk_size=None):
     """
     Main program for calculating Cloud Regime Error Metric.
 
@@ -375,6 +396,11 @@ def crem_calc(pointers):
     pointers : dict
         Keys in dictionary are: albisccp_nc, pctisccp_nc, cltisccp_nc,
         rsut_nc, rsutcs_nc, rlut_nc, rlutcs_nc, snc_nc, sic_nc
+    chunk_size : int
+        Number of time steps read and assigned to regimes at once. The
+        regime frequencies and cloud forcings are accumulated over the
+        blocks, so memory use is bounded by the chunk size (default: all
+        time steps at once).
 
     For CMIP5, snc is in the CMIP5 table 'day'. All other variables
     are in the CMIP5 table 'cfday'. A minimum of 2 years, and ideally 5
@@ -447,47 +473,6 @@ def crem_calc(pointers):
     lons2 = np.array([z_x + d_x * (i + 1.0) for i in range(npts)])
     lats2 = np.array([z_y + d_y * (j + 1.0) for j in range(nrows)])
 
-    # Read input data
-    # ---------------
-    # pointers['xxx_nc'] = file name of input file
-    # pointers['xxx'] = actual variable name in input file
-
-    logger.debug('Reading albisccp')
-    ntime2 = len(Dataset(pointers['albisccp_nc'], 'r').variables['time'][:])
-    albisccp_data = read_and_check(pointers['albisccp_nc'],
-                                   pointers['albisccp'], lons2, lats2, ntime2)
-    logger.debug('Reading pctisccp')
-    pctisccp_data = read_and_check(pointers['pctisccp_nc'],
-                                   pointers['pctisccp'], lons2, lats2, ntime2)
-    logger.debug('Reading cltisccp')
-    cltisccp_data = read_and_check(pointers['cltisccp_nc'],
-                                   pointers['cltisccp'], lons2, lats2, ntime2)
-    logger.debug('Reading rsut')
-    rsut_data = read_and_check(pointers['rsut_nc'],
-                               pointers['rsut'], lons2, lats2, ntime2)
-    logger.debug('Reading rsutcs')
-    rsutcs_data = read_and_check(pointers['rsutcs_nc'],
-                                 pointers['rsutcs'], lons2, lats2, ntime2)
-    logger.debug('Reading rlut')
-    rlut_data = read_and_check(pointers['rlut_nc'],
-                               pointers['rlut'], lons2, lats2, ntime2)
-    logger.debug('Reading rlutcs')
-    rlutcs_data = read_and_check(pointers['rlutcs_nc'],
-                                 pointers['rlutcs'], lons2, lats2, ntime2)
-    logger.debug('Reading sic')
-    sic_data = read_and_check(pointers['sic_nc'],
-                              pointers['sic'], lons2, lats2, ntime2)
-    if not pointers['snc_nc']:
-        logger.debug('Reading snw')
-        snc_data = read_and_check(pointers['snw_nc'],
-                                  pointers['snw'], lons2, lats2, ntime2)
-    else:
-        logger.debug('Reading snc')
-        snc_data = read_and_check(pointers['snc_nc'],
-                                  pointers['snc'], lons2, lats2, ntime2)
-
-    # -----------------------------------------------------------
-
     # Set up storage arrays
     numreg = len(nregimes)            # = 3
     numrgm = nregimes[max(nregimes)]  # = 7
@@ -499,62 +484,40 @@ def crem_calc(pointers):
     model_ncf[:] = 999.9
     r_crem_pd[:] = 999.9
 
-    # Normalize data used for assignment to regimes to be in the range 0-1
-    pctisccp_data = pctisccp_data / 100000.0
-    cltisccp_data = cltisccp_data / 100.0
+    # Running totals over the time blocks of the number of valid data points
+    # in each region, of the number of points assigned to each regime and
+    # of their summed cloud forcings
+    npoints = np.zeros(numreg, dtype=int)
+    counts = np.zeros((numreg, numrgm), dtype=int)
+    swcf_sums = np.zeros((numreg, numrgm))
+    lwcf_sums = np.zeros((numreg, numrgm))
 
-    # Calculate cloud forcing
-    swcf_data = rsutcs_data - rsut_data
-    lwcf_data = rlutcs_data - rlut_data
+    ntime2 = len(Dataset(pointers['albisccp_nc'], 'r').variables['time'][:])
+    chunk_size = chunk_size or max(ntime2, 1)
+    for start in range(0, ntime2, chunk_size):
+        time_slice = slice(start, start + chunk_size)
+        logger.debug('Processing time steps %i to %i', start,
+                     min(start + chunk_size, ntime2) - 1)
+        _crem_block(pointers, (lons2, lats2, ntime2, time_slice),
+                    (nregimes, obs_alb, obs_pct, obs_clt), {
+            'npoints': npoints,
+            'counts': counts,
+            'swcf_sums': swcf_sums,
+            'lwcf_sums': lwcf_sums,
+        })
 
-    # loop over 3 regions
-    # (0 = tropics, 1 = ice-free extra-tropics, 2 = snow/ice covered)
     for idx_region, (region, regime) in enumerate(nregimes.items()):
-
-        # Set up validity mask for region
-
-        mask = pctisccp_data.copy()
-        if region == 'tropics':
-            mask[:, (lats2 < -20) | (lats2 > 20), :] = np.NAN
-        elif region == 'extra-tropics':
-            mask[:, (lats2 >= -20) & (lats2 <= 20), :] = np.NAN
-            mask[(snc_data >= 0.1) | (sic_data >= 0.1)] = np.NAN
-        elif region == 'snow-ice':
-            mask[:, (lats2 >= -20) & (lats2 <= 20), :] = np.NAN
-            mask[(snc_data < 0.1) & (sic_data < 0.1)] = np.NAN
-
-        mask[cltisccp_data == 0.0] = np.NAN
-
-        points = np.isfinite(mask)
-        npoints = len(mask[points])  # Number of valid data points in region
-
-        group = np.zeros(npoints)
-        e_d = np.zeros((npoints, regime))
-
-        swcf_data_pts = swcf_data[points]
-        lwcf_data_pts = lwcf_data[points]
-
-        # Assign model data to observed regimes
-
-        for i in range(regime):
-            e_d[:, i] = \
-                ((albisccp_data[points] - obs_alb[idx_region, i]) ** 2) + \
-                ((pctisccp_data[points] - obs_pct[idx_region, i]) ** 2) + \
-                ((cltisccp_data[points] - obs_clt[idx_region, i]) ** 2)
-
-        group[:] = np.argmin(e_d, axis=1)
-
         for i in range(regime):
-            mem = (group == i)
-
-            count = len(group[mem])
+            count = counts[idx_region, i]
 
             if count > 0:
 
-                model_rfo[idx_region, i] = float(count) / float(npoints)
-                model_ncf[idx_region, i] = np.average(swcf_data_pts[mem]) \
-                    * solar_weights[idx_region] +                         \
-                    np.average(lwcf_data_pts[mem])
+                model_rfo[idx_region, i] = (float(count) /
+                                            float(npoints[idx_region]))
+                model_ncf[idx_region, i] = \
+                    swcf_sums[idx_region, i] / count \
+                    * solar_weights[idx_region] +    \
+                    lwcf_sums[idx_region, i] / count
             else:
                 logger.info("Model does not reproduce all observed cloud "
                             "regimes.")
@@ -589,6 +552,99 @@ def crem_calc(pointers):
     return crem_pd, r_crem_pd
 
 
+def _crem_block(pointers, block, regimes, totals):
+    """
+    Assign a block of time steps of model data to the observed regimes.
+
+    Parameters
+    ----------
+    pointers : dict
+        Input files and variable names, see `crem_calc`.
+    block : tuple
+        longitudes and latitudes of target grid (ISCCP), total number of
+        time steps and slice of the time steps of the block
+    regimes : tuple
+        number of regimes in each region and observed regime centroids
+        (albedo, cloud top pressure and cloud cover), see `crem_calc`
+    totals : dict
+        Running totals (numpy arrays) of the number of valid data points
+        per region ('npoints'), the number of points per regime ('counts')
+        and the summed SW and LW cloud forcing per regime ('swcf_sums',
+        'lwcf_sums'), updated in place.
+    """
+    (lons2, lats2, ntime2, time_slice) = block
+    (nregimes, obs_alb, obs_pct, obs_clt) = regimes
+
+    # Read input data
+    # ---------------
+    # pointers['xxx_nc'] = file name of input file
+    # pointers['xxx'] = actual variable name in input file
+
+    data = {}
+    for var in ('albisccp', 'pctisccp', 'cltisccp', 'rsut', 'rsutcs', 'rlut',
+                'rlutcs', 'sic'):
+        logger.debug('Reading %s', var)
+        data[var] = read_and_check(pointers[var + '_nc'], pointers[var],
+                                   lons2, lats2, ntime2, time_slice)
+    snow_var = 'snw' if not pointers['snc_nc'] else 'snc'
+    logger.debug('Reading %s', snow_var)
+    data['snc'] = read_and_check(pointers[snow_var + '_nc'],
+                                 pointers[snow_var], lons2, lats2, ntime2,
+                                 time_slice)
+
+    # Normalize data used for assignment to regimes to be in the range 0-1
+    albisccp_data = data['albisccp']
+    pctisccp_data = data['pctisccp'] / 100000.0
+    cltisccp_data = data['cltisccp'] / 100.0
+    snc_data = data['snc']
+    sic_data = data['sic']
+
+    # Calculate cloud forcing
+    swcf_data = data['rsutcs'] - data['rsut']
+    lwcf_data = data['rlutcs'] - data['rlut']
+
+    # loop over 3 regions
+    # (0 = tropics, 1 = ice-free extra-tropics, 2 = snow/ice covered)
+    for idx_region, (region, regime) in enumerate(nregimes.items()):
+
+        # Set up validity mask for region
+
+        mask = pctisccp_data.copy()
+        if region == 'tropics':
+            mask[:, (lats2 < -20) | (lats2 > 20), :] = np.NAN
+        elif region == 'extra-tropics':
+            mask[:, (lats2 >= -20) & (lats2 <= 20), :] = np.NAN
+            mask[(snc_data >= 0.1) | (sic_data >= 0.1)] = np.NAN
+        elif region == 'snow-ice':
+            mask[:, (lats2 >= -20) & (lats2 <= 20), :] = np.NAN
+            mask[(snc_data < 0.1) & (sic_data < 0.1)] = np.NAN
+
+        mask[cltisccp_data == 0.0] = np.NAN
+
+        points = np.isfinite(mask)
+        npoints = len(mask[points])  # Number of valid data points in region
+
+        e_d = np.zeros((npoints, regime))
+
+        # Assign model data to observed regimes
+
+        for i in range(regime):
+            e_d[:, i] = \
+                ((albisccp_data[points] - obs_alb[idx_region, i]) ** 2) + \
+                ((pctisccp_data[points] - obs_pct[idx_region, i]) ** 2) + \
+                ((cltisccp_data[points] - obs_clt[idx_region, i]) ** 2)
+
+        group = np.argmin(e_d, axis=1)
+
+        totals['npoints'][idx_region] += npoints
+        totals['counts'][idx_region, :regime] += np.bincount(
+            group, minlength=regime)
+        totals['swcf_sums'][idx_region, :regime] += np.bincount(
+            group, weights=swcf_data[points], minlength=regime)
+        totals['lwcf_sums'][idx_region, :regime] += np.bincount(
+            group, weights=lwcf_data[points], minlength=regime)
+
+
 if __name__ == '__main__':
 
     with run_diagnostic() as config:
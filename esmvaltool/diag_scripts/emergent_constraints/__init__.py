@@ -2,10 +2,13 @@
 import logging
 
 import numpy as np
-from scipy import integrate, stats
+from scipy import stats
 
 logger = logging.getLogger(__name__)
 
+# Finest spacing of the grid of standardized observations in gaussian_pdf
+MIN_Z_STEP = 1.0 / 400.0
+
 
 def _check_input_arrays(*arrays):
     """Check the shapes of multiple arrays."""
@@ -87,64 +90,144 @@ def regression_line(x_data, y_data, n_points=100):
     return out
 
 
-def gaussian_pdf(x_data, y_data, obs_mean, obs_std, n_points=100):
+def _regression(x_data, y_data):
+    """Compute the linear regression along the last axis of the arrays."""
+    n_data = x_data.shape[-1]
+    x_mean = np.mean(x_data, axis=-1, keepdims=True)
+    y_mean = np.mean(y_data, axis=-1, keepdims=True)
+    ssx = np.sum(np.square(x_data - x_mean), axis=-1, keepdims=True)
+    slope = np.sum((x_data - x_mean) * (y_data - y_mean), axis=-1,
+                   keepdims=True) / ssx
+    intercept = y_mean - slope * x_mean
+    y_estim = slope * x_data + intercept
+    see = np.sqrt(
+        np.sum(np.square(y_data - y_estim), axis=-1, keepdims=True) /
+        (n_data - 2))
+    return {
+        'n_data': n_data,
+        'x_mean': x_mean,
+        'ssx': ssx,
+        'slope': slope,
+        'intercept': intercept,
+        'see': see,
+    }
+
+
+def gaussian_pdf(x_data, y_data, obs_mean, obs_std, n_points=100,
+                 max_elements=2**24):
     """Calculate Gaussian probability densitiy function for target variable.
 
+    The combined PDF P(y,x) is integrated over x with the trapezoidal rule
+    on a grid of standardized observations, which is fine enough to
+    resolve both the observational and the conditional PDF. The grid is
+    chosen for each block of configurations and its spacing is at least
+    `MIN_Z_STEP`. Where the conditional PDF is narrower than that (nearly
+    perfect fits), its limit for a vanishing width is used, i.e. a Gaussian
+    with mean `slope * obs_mean + intercept` and variance
+    `(slope * obs_std)**2 + spe(obs_mean)**2`. For perfect fits (zero
+    standard error of the estimate) the PDF is zero, as before. All
+    configurations given along the leading axes of the arrays (e.g.
+    bootstrap resamples) are processed at once.
+
     Parameters
     ----------
     x_data : numpy.array
-        x coordinates of the points.
+        x coordinates of the points (along the last axis).
     y_data : numpy.array
-        y coordinates of the points.
-    obs_mean : float
+        y coordinates of the points (along the last axis).
+    obs_mean : float or numpy.array
         Mean of observational data.
-    obs_std : float
+    obs_std : float or numpy.array
         Standard deviation of observational data.
     n_points : int, optional (default: 100)
         Number of points for the regression lines.
+    max_elements : int, optional (default: 2**24)
+        Maximum number of elements of the temporary arrays, configurations
+        are processed in blocks small enough to respect this.
 
     Returns
     -------
     tuple of numpy.array
-        x and y values for the PDF.
+        x and y values for the PDF (along the last axis).
 
     """
+    x_data = np.asarray(x_data, dtype=float)
+    y_data = np.asarray(y_data, dtype=float)
     _check_input_arrays(x_data, y_data)
-    spe = standard_prediction_error(x_data, y_data)
-    reg = stats.linregress(x_data, y_data)
+    reg = _regression(x_data, y_data)
+    shape = x_data.shape[:-1]
+    obs_mean = np.broadcast_to(obs_mean, shape)[..., np.newaxis]
+    obs_std = np.broadcast_to(obs_std, shape)[..., np.newaxis]
 
-    def obs_pdf(x_new):
-        """Return PDF of observations P(x)."""
-        norm = np.sqrt(2.0 * np.pi * obs_std**2)
-        return np.exp(-(x_new - obs_mean)**2 / 2.0 / obs_std**2) / norm
-
-    def cond_pdf(x_new, y_new):
-        """Return conditional PDF P(y|x)."""
-        y_estim = reg.slope * x_new + reg.intercept
-        norm = np.sqrt(2.0 * np.pi * spe(x_new)**2)
-        return np.exp(-(y_new - y_estim)**2 / 2.0 / spe(x_new)**2) / norm
-
-    def comb_pdf(x_new, y_new):
-        """Return combined PDF P(y,x)."""
-        return obs_pdf(x_new) * cond_pdf(x_new, y_new)
+    # Width of the conditional PDF P(y|x) as a function of standardized
+    # observations z, with x = obs_mean + obs_std * z
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cond_width = (reg['see'] * np.sqrt(1.0 + 1.0 / reg['n_data']) /
+                      np.abs(reg['slope'] * obs_std))
 
     # PDF of target variable P(y)
-    y_range = max(y_data) - min(y_data)
-    y_lin = np.linspace(min(y_data) - y_range, max(y_data) + y_range, n_points)
-    y_pdf = [
-        integrate.quad(comb_pdf, -np.inf, +np.inf, args=(y, ))[0]
-        for y in y_lin
+    y_min = np.min(y_data, axis=-1, keepdims=True)
+    y_max = np.max(y_data, axis=-1, keepdims=True)
+    y_range = y_max - y_min
+    y_lin = np.linspace(y_min - y_range, y_max + y_range, n_points, axis=-1)
+    y_lin = y_lin.reshape(shape + (n_points, ))
+    y_pdf = np.zeros(shape + (n_points, ))
+    flat = [
+        array.reshape((-1, ) + array.shape[len(shape):])
+        for array in (y_lin, y_pdf, obs_mean, obs_std, reg['x_mean'],
+                      reg['ssx'], reg['slope'], reg['intercept'], reg['see'],
+                      cond_width)
     ]
-    return (y_lin, np.array(y_pdf))
+    (y_flat, pdf_flat, mean_flat, std_flat, x_mean, ssx, slope, intercept,
+     see, cond_width) = flat
+    n_z_max = int(np.ceil(20.0 / MIN_Z_STEP)) + 1
+    block = max(max_elements // (n_points * n_z_max), 1)
+    for start in range(0, y_flat.shape[0], block):
+        idx = np.arange(start, min(start + block, y_flat.shape[0]))
+        idx = idx[see[idx, 0] > 0.0]
+        resolved = cond_width[idx, 0] >= 4.0 * MIN_Z_STEP
+
+        # Integration on a grid resolving the narrowest conditional PDF
+        res = idx[resolved]
+        if res.size:
+            z_step = min(np.min(cond_width[res]), 1.0) / 4.0
+            z_lin = np.linspace(-10.0, 10.0, int(np.ceil(20.0 / z_step)) + 1)
+            x_new = mean_flat[res] + std_flat[res] * z_lin
+            spe = see[res] * np.sqrt(1.0 + 1.0 / reg['n_data'] +
+                                     (x_new - x_mean[res])**2 / ssx[res])
+            y_estim = slope[res] * x_new + intercept[res]
+            cond_pdf = stats.norm.pdf(y_flat[res][..., np.newaxis],
+                                      y_estim[:, np.newaxis, :],
+                                      spe[:, np.newaxis, :])
+            pdf_flat[res] = np.trapz(stats.norm.pdf(z_lin) * cond_pdf,
+                                     z_lin,
+                                     axis=-1)
+
+        # Limit of narrow conditional PDFs
+        nar = idx[~resolved]
+        if nar.size:
+            spe = see[nar] * np.sqrt(1.0 + 1.0 / reg['n_data'] +
+                                     (mean_flat[nar] - x_mean[nar])**2 /
+                                     ssx[nar])
+            pdf_flat[nar] = stats.norm.pdf(
+                y_flat[nar], slope[nar] * mean_flat[nar] + intercept[nar],
+                np.sqrt((slope[nar] * std_flat[nar])**2 + spe**2))
+    return (y_lin, y_pdf)
 
 
 def cdf(data, pdf):
     """Calculate cumulative distribution function for a PDF.
 
+    The CDF is the cumulative integral with Simpson's rule, i.e. the
+    integral of each pair of intervals over the quadratic through its
+    three points. At points with an odd number of intervals the last
+    interval is integrated over the quadratic through the last three
+    points.
+
     Parameters
     ----------
     data : numpy.array
-        Data points (x axis).
+        Data points (x axis, along the last axis).
     pdf : numpy.array
         Corresponding probability density function (PDF).
 
@@ -154,6 +237,31 @@ def cdf(data, pdf):
         Corresponding cumulative distribution function (CDF).
 
     """
-    idx_range = range(1, len(data) + 1)
-    cum_dens = [integrate.simps(pdf[:idx], data[:idx]) for idx in idx_range]
-    return np.array(cum_dens)
+    data = np.asarray(data, dtype=float)
+    pdf = np.asarray(pdf, dtype=float)
+    data, pdf = np.broadcast_arrays(data, pdf)
+    cum_dens = np.zeros(pdf.shape)
+    if pdf.shape[-1] < 2:
+        return cum_dens
+    cum_dens[..., 1] = (0.5 * (data[..., 1] - data[..., 0]) *
+                        (pdf[..., 0] + pdf[..., 1]))
+    if pdf.shape[-1] < 3:
+        return cum_dens
+
+    # Three consecutive points for each interval but the first one
+    (x_0, x_1, x_2) = (data[..., :-2], data[..., 1:-1], data[..., 2:])
+    (f_0, f_1, f_2) = (pdf[..., :-2], pdf[..., 1:-1], pdf[..., 2:])
+    (h_0, h_1) = (x_1 - x_0, x_2 - x_1)
+    h_sum = h_0 + h_1
+
+    # Integrals over both intervals, summed over every second pair
+    pairs = h_sum / 6.0 * ((2.0 - h_1 / h_0) * f_0 + h_sum**2 /
+                           (h_0 * h_1) * f_1 + (2.0 - h_0 / h_1) * f_2)
+    cum_dens[..., 2::2] = np.cumsum(pairs[..., ::2], axis=-1)
+
+    # Integrals over the last interval only
+    last = ((2.0 * h_1**2 + 3.0 * h_0 * h_1) / (6.0 * h_sum) * f_2 +
+            (h_1**2 + 3.0 * h_0 * h_1) / (6.0 * h_0) * f_1 -
+            h_1**3 / (6.0 * h_0 * h_sum) * f_0)
+    cum_dens[..., 3::2] = cum_dens[..., 2:-1:2] + last[..., 1::2]
+    return cum_dens
@@ -74,17 +74,8 @@ def ens_anom(filenames, dir_output, name_outputs, varname, numens, season,
 
     elif extreme == 'trend':
         # Compute the linear trend over the period, for each ensemble member
-        trendmap = np.empty((var_ens[0].shape[1], var_ens[0].shape[2]))
-        trendmap_ens = []
-        for i in range(numens):
-            for jla in range(var_ens[0].shape[1]):
-                for jlo in range(var_ens[0].shape[2]):
-                    slope, _, _, _, _ = \
-                        stats.linregress(range(var_ens[0].shape[0]),
-                                         var_ens[i][:, jla, jlo])
-                    trendmap[jla, jlo] = slope
-            trendmap_ens.append(trendmap.copy())
-        varextreme_ens = trendmap_ens
+        varextreme_ens = [linear_trend(var_ens[i], axis=0)
+                          for i in range(numens)]
 
     varextreme_ens_np = np.array(varextreme_ens)
     print('Anomalies are computed with respect to the {0}'.format(extreme))
@@ -117,3 +108,39 @@ def ens_anom(filenames, dir_output, name_outputs, varname, numens, season,
     outfiles.append(ofile)
 
     return outfiles
+
+
+def linear_trend(var, axis=0, full=False):
+    """Least-squares linear trend along an axis, for all other points at once.
+
+    The trend is computed with respect to the index along the axis, as
+    scipy.stats.linregress(range(n), y) would do for each point, ignoring
+    NaN values. Points with less than two valid values have a NaN trend.
+    If full is True, also the standard error of the trend and the two-sided
+    p-value of the null hypothesis of no trend are returned.
+    """
+    var = np.moveaxis(np.asarray(var, dtype=float), axis, 0)
+    shape = (-1, ) + (1, ) * (var.ndim - 1)
+    valid = np.isfinite(var)
+    nval = valid.sum(axis=0)
+    xval = np.where(valid, np.arange(var.shape[0]).reshape(shape), 0.)
+    yval = np.where(valid, var, 0.)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xmean = xval.sum(axis=0) / nval
+        ymean = yval.sum(axis=0) / nval
+        xdev = np.where(valid, xval - xmean, 0.)
+        ydev = np.where(valid, yval - ymean, 0.)
+        sxx = np.sum(xdev * xdev, axis=0)
+        sxy = np.sum(xdev * ydev, axis=0)
+        slope = np.where(nval > 1, sxy / sxx, np.nan)
+        if not full:
+            return slope
+        syy = np.sum(ydev * ydev, axis=0)
+        dof = nval - 2
+        resid = np.maximum(syy - slope * sxy, 0.)
+        stderr = np.where(dof > 0, np.sqrt(resid / dof / sxx), np.nan)
+        tval = slope / stderr
+        pvalue = np.where(dof > 0,
+                          2 * stats.t.sf(np.abs(tval), np.maximum(dof, 1)),
+                          np.nan)
+    return slope, stderr, pvalue
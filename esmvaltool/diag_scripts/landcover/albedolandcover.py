@@ -24,14 +24,13 @@ import glob
 import itertools as it
 import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 from cartopy import crs  # This line causes a segmentation fault in prospector
 import cartopy.feature as cfeature
 import iris
 import matplotlib.pyplot as plt
 import numpy as np
-# specific imports for this diagnostic
-from sklearn import linear_model
 
 from esmvaltool.diag_scripts.shared import (group_metadata,
                                             run_diagnostic,
@@ -106,91 +105,180 @@ def _add_masks_albedolandcover(model_data, this_models_xxfracs, cfg):
     return model_data
 
 
-def _reconstruct_albedo_pixel(x_0, y_0, lc_logical):
-    # Check that the system is not over_parameterised
-    alb_lc_pixel = np.zeros((3, ))
-    alb_lc_pixel[...] = np.nan
-
-    if len(y_0) > np.sum(lc_logical.astype(int)) + 1 and\
-            np.sum(lc_logical.astype(int)) > 0:
-        # Do multiple linear regression
-        linreg = linear_model.LinearRegression().fit(x_0, y_0)
-        intercept = linreg.intercept_
-        coefficients = linreg.coef_
-
-        # Now loop again and reconstruct albedo's
-        lc_reg = 0
-        for i_0 in range(3):
-            if lc_logical[i_0]:
-                alb_lc_pixel[i_0] = intercept\
-                    + coefficients[lc_reg] * 100.
-                lc_reg = lc_reg + 1
-    return alb_lc_pixel
-
-
-def _prepare_data_for_linreg(model_data, islice, jslice):
-    lc_logical = np.full((3, ), True)
-    lc_classes = [config['params']['lc1_class'],
-                  config['params']['lc2_class'],
-                  config['params']['lc3_class']]
-    lc_data = []
-    # Loop over lc_classes
-    for i_0 in range(3):
-        current_class = lc_classes[i_0]
-        # First flatten the array
-        lc_flattened = {}
-        for varkey in current_class:
-            lc_flattened[varkey] = model_data[varkey].data[
-                islice, jslice].compressed()
-        lc_sum = sum([lc_flattened[varkey]
+def _prepare_data_for_linreg(model_data, cfg):
+    """Get the predictors, the albedo and the mask on the whole grid."""
+    lc_classes = [cfg['params']['lc1_class'],
+                  cfg['params']['lc2_class'],
+                  cfg['params']['lc3_class']]
+    mask = np.ma.getmaskarray(model_data['alb'].data)
+    # All variables have the same mask, masked grid cells are set to zero
+    predictors = np.zeros((3, ) + mask.shape)
+    for i_0, current_class in enumerate(lc_classes):
+        lc_sum = sum([np.ma.getdata(model_data[varkey].data)
                       for varkey in current_class])
-        # Now check thresholds
-        if (np.var(lc_sum) > 0. and
-                len(lc_sum) >= config['params']['mingc']):
-            lc_data.append(lc_sum)
-            lc_logical[i_0] = True
-        else:
-            logger.info("Variance zero or not enough\
-                   valid data for this landcover class")
-            lc_logical[i_0] = False
-    # Now the multiple lin reg part
-    x_0 = np.stack(lc_data)
-    x_0 = x_0.swapaxes(0, 1)
-    # Same mask, so shape is fine
-    y_0 = model_data['alb'].data[islice, jslice].compressed()
-
-    return x_0, y_0, lc_logical
+        predictors[i_0] = np.where(mask, 0., lc_sum)
+    albedo = np.where(mask, 0., np.ma.getdata(model_data['alb'].data))
+    return predictors, albedo, mask
 
 
-def _get_reconstructed_albedos(model_data, cfg):
-    alb_lc = np.zeros((3, ) + model_data['alb'].shape)
-    alb_lc[...] = np.nan
-
-    # Now loop over these arrays and do the math
-    for (indices, maskbool) in np.ndenumerate(model_data['alb'].data.mask):
-        if not maskbool:  # Only if not masked we need to check neighbourhood
-            i, j = indices
-            # Create the neighbourhood as bbox
-            islice = slice(int(i - (cfg['params']['lonsize_BB'] - 1) / 2),
-                           int(i + (cfg['params']['lonsize_BB'] - 1) / 2 + 1))
-            jslice = slice(int(j - (cfg['params']['latsize_BB'] - 1) / 2),
-                           int(j + (cfg['params']['latsize_BB'] - 1) / 2 + 1))
-            bbox_mask = model_data['alb'].data.mask[islice, jslice]
-
-            # Check if there are enough valid data points
-            # in the neighbourhood bbox
-            if (np.sum((~bbox_mask).astype(int)) >
-                    cfg['params']['minnum_gc_bb']):
-                x_0, y_0, lc_logical = _prepare_data_for_linreg(model_data,
-                                                                islice,
-                                                                jslice)
-
-                alb_lc[:, i, j] = _reconstruct_albedo_pixel(x_0, y_0,
-                                                            lc_logical)
+def _window_bounds(size, length):
+    """Get the first and last + 1 index of the big box around each index.
 
+    The big box of index i is the slice of the original implementation,
+    slice(int(i - (size - 1) / 2), int(i + (size - 1) / 2 + 1)), which is
+    empty where its start is negative.
+    """
+    bounds = np.array([
+        slice(int(i - (size - 1) / 2),
+              int(i + (size - 1) / 2 + 1)).indices(length)[:2]
+        for i in range(length)
+    ])
+    bounds[:, 1] = np.maximum(bounds[:, 0], bounds[:, 1])
+    return bounds
+
+
+def _window_offsets(bounds):
+    """Get the range of offsets from an index to the indices of its box."""
+    index = np.arange(len(bounds))
+    nonempty = bounds[:, 1] > bounds[:, 0]
+    if not nonempty.any():
+        return range(0)
+    return range(np.min(bounds[nonempty, 0] - index[nonempty]),
+                 np.max(bounds[nonempty, 1] - index[nonempty]))
+
+
+def _window_sums(predictors, albedo, mask, bounds, rows):
+    """Sum the terms of the normal equations over the big boxes.
+
+    The sums are accumulated for all grid cells of the given rows at once,
+    one offset within the big box at a time.
+
+    Returns
+    -------
+    dict
+        number of valid grid cells ('n'), sums of the predictors ('x'),
+        of their products ('xx'), of their products with the albedo ('xy'),
+        of the albedo ('y') and extreme values of the predictors ('max',
+        'min') in the big box around each grid cell.
+    """
+    row_bounds, col_bounds = bounds
+    irows = np.arange(mask.shape[0])[rows]
+    icols = np.arange(mask.shape[1])
+    shape = (len(irows), len(icols))
+    sums = {
+        'n': np.zeros(shape),
+        'x': np.zeros((3, ) + shape),
+        'xx': np.zeros((3, 3) + shape),
+        'xy': np.zeros((3, ) + shape),
+        'y': np.zeros(shape),
+        'max': np.full((3, ) + shape, -np.inf),
+        'min': np.full((3, ) + shape, np.inf),
+    }
+    for d_i in _window_offsets(row_bounds):
+        src_i = irows + d_i
+        in_i = ((src_i >= row_bounds[irows, 0]) &
+                (src_i < row_bounds[irows, 1]))
+        if not in_i.any():
+            continue
+        for d_j in _window_offsets(col_bounds):
+            src_j = icols + d_j
+            in_j = ((src_j >= col_bounds[icols, 0]) &
+                    (src_j < col_bounds[icols, 1]))
+            if not in_j.any():
+                continue
+            src = np.ix_(np.clip(src_i, 0, mask.shape[0] - 1),
+                         np.clip(src_j, 0, mask.shape[1] - 1))
+            weight = in_i[:, np.newaxis] & in_j & ~mask[src]
+            x_0 = predictors[(slice(None), ) + src] * weight
+            y_0 = albedo[src] * weight
+            sums['n'] += weight
+            sums['x'] += x_0
+            sums['xx'] += x_0[:, np.newaxis] * x_0
+            sums['xy'] += x_0 * y_0
+            sums['y'] += y_0
+            sums['max'] = np.maximum(sums['max'],
+                                     np.where(weight, x_0, -np.inf))
+            sums['min'] = np.minimum(sums['min'],
+                                     np.where(weight, x_0, np.inf))
+    return sums
+
+
+def _regress_rows(rows, predictors, albedo, mask, bounds, params):
+    """Reconstruct the albedos of the land cover classes for some rows.
+
+    For each grid cell, a multiple linear regression of the albedo on the
+    area fractions of the land cover classes is done in the big box
+    around it. The land cover classes with zero variance or fewer than
+    `mingc` valid grid cells in the big box are left out of the regression.
+
+    Returns
+    -------
+    numpy.array
+        albedo of each land cover class, nan where it could not be
+        reconstructed.
+    """
+    sums = _window_sums(predictors, albedo, mask, bounds, rows)
+    n_valid = sums['n']
+    active = (sums['max'] > sums['min']) & (n_valid >= params['mingc'])
+    n_active = np.sum(active, axis=0)
+    fit = (~mask[rows] & (n_valid > params['minnum_gc_bb']) &
+           (n_active > 0) & (n_valid > n_active + 1))
+
+    # Centre the normal equations, as done for the intercept of a
+    # least squares fit
+    n_valid = np.where(fit, n_valid, 1.)
+    mean_x = sums['x'] / n_valid
+    mean_y = sums['y'] / n_valid
+    cov_xx = sums['xx'] - n_valid * mean_x[:, np.newaxis] * mean_x
+    cov_xy = sums['xy'] - n_valid * mean_x * mean_y
+
+    alb_lc = np.full((3, ) + n_valid.shape, np.nan)
+    # Solve the regressions for each combination of land cover classes
+    for pattern in it.product([False, True], repeat=3):
+        classes = np.flatnonzero(pattern)
+        if not classes.size:
+            continue
+        pixels = fit & np.all(
+            active == np.array(pattern)[:, np.newaxis, np.newaxis], axis=0)
+        if not pixels.any():
+            continue
+        lhs = np.moveaxis(cov_xx[np.ix_(classes, classes)][..., pixels], -1,
+                          0)
+        rhs = cov_xy[classes][:, pixels].T
+        coefficients = np.einsum('pij,pj->pi',
+                                 np.linalg.pinv(lhs, rcond=1e-10), rhs)
+        intercept = mean_y[pixels] - np.einsum(
+            'ip,pi->p', mean_x[classes][:, pixels], coefficients)
+        for lc_reg, i_0 in enumerate(classes):
+            alb_lc[i_0][pixels] = intercept + coefficients[:, lc_reg] * 100.
     return alb_lc
 
 
+def _get_reconstructed_albedos(model_data, cfg):
+    predictors, albedo, mask = _prepare_data_for_linreg(model_data, cfg)
+    # Create the neighbourhoods as bboxes
+    bounds = (_window_bounds(cfg['params']['lonsize_BB'], mask.shape[0]),
+              _window_bounds(cfg['params']['latsize_BB'], mask.shape[1]))
+
+    # Distribute chunks of rows of the grid over the workers
+    n_workers = cfg.get('n_workers', 1)
+    chunks = [
+        slice(chunk[0], chunk[-1] + 1)
+        for chunk in np.array_split(np.arange(mask.shape[0]), n_workers)
+        if chunk.size
+    ]
+    args = (predictors, albedo, mask, bounds, cfg['params'])
+    if n_workers == 1:
+        results = [_regress_rows(rows, *args) for rows in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(
+                executor.map(_regress_rows, chunks,
+                             *[[arg] * len(chunks) for arg in args]))
+
+    return np.concatenate(results, axis=1)
+
+
 def _write_albedochanges_to_disk(alb_lc, template_cube,
                                  datadict, cfg):
     transition_cube = template_cube
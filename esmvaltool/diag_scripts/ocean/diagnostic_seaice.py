@@ -67,6 +67,7 @@ import sys
 from itertools import product
 
 import cartopy
+import dask.array as da
 import iris
 import iris.coord_categorisation
 import iris.quickplot as qplt
@@ -111,57 +112,93 @@ def create_ice_cmap(threshold=0.15):
     return matplotlib.colors.LinearSegmentedColormap('ice_cmap', ice_cmap_dict)
 
 
-def calculate_area_time_series(cube, plot_type, threshold):
+def get_area_weights(cube, cache=None):
     """
-    Calculate the area of unmasked cube cells.
+    Calculate the area of the cells of the horizontal grid of a cube.
+
+    The area is computed for a single time slice, as it is the same for all
+    time steps.
+
+    Parameters
+    ----------
+    cube: iris.cube.Cube
+        Data Cube, with time as first dimension.
+    cache: dict
+        Optional dictionary of previously computed cell areas, keyed on the
+        latitude and longitude coordinates of the grid. If given, the cell
+        areas are looked up in and stored to it.
+
+    Returns
+    -------
+    numpy.array:
+        The area of the grid cells in m^2.
+
+    """
+    key = None
+    if cache is not None:
+        key = tuple(
+            (coord.shape, coord.points.tobytes(),
+             None if coord.bounds is None else coord.bounds.tobytes())
+            for coord in (cube.coord('latitude'), cube.coord('longitude')))
+        if key in cache:
+            return cache[key]
+    area = iris.analysis.cartography.area_weights(cube[0])
+    if cache is not None:
+        cache[key] = area
+    return area
+
+
+def calculate_area_time_series(cube, threshold, area_cache=None):
+    """
+    Calculate the ice extent and ice area time series.
 
     Requires a cube with two spacial dimensions. (no depth coordinate).
+    Both time series are computed for all time steps at once, in a single
+    pass over the data.
 
     Parameters
     ----------
     cube: iris.cube.Cube
         Data Cube
-    plot_type: str
-        The type of plot: ice extent or ice area
     threshold: float
         The threshold for ice fraction (typically 15%)
+    area_cache: dict
+        Optional cache for the grid cell areas, see get_area_weights.
 
     Returns
     -------
     numpy array:
         An numpy array containing the time points.
-    numpy.array:
-        An numpy array containing the total ice extent or total ice area.
+    dict:
+        A dictionary with the total ice extent and the total ice area as
+        numpy arrays, under the keys 'Ice Extent' and 'Ice Area'.
 
     """
-    data = []
     times = diagtools.cube_time_to_float(cube)
-    for time_itr, time in enumerate(times):
-        icedata = cube[time_itr].data
+    area = get_area_weights(cube, cache=area_cache)
 
-        area = iris.analysis.cartography.area_weights(cube[time_itr])
-        if plot_type.lower() == 'ice extent':
-            # Ice extend is the area with more than 15% ice cover.
-            icedata = np.ma.masked_where(icedata < threshold, icedata)
-            total_area = np.ma.masked_where(icedata.mask, area.data).sum()
-        if plot_type.lower() == 'ice area':
-            # Ice area is cover * cell area
-            total_area = np.sum(icedata * area)
+    icedata = da.ma.masked_invalid(cube.lazy_data())
+    mask = da.ma.getmaskarray(icedata)
+    icedata = da.ma.filled(icedata, 0.)
+    axes = tuple(range(1, cube.ndim))
 
-        logger.debug('Calculating time series area: %s, %s, %s,', time_itr,
-                     time, total_area)
-        data.append(total_area)
+    # Ice extend is the area with more than 15% ice cover.
+    extent = da.sum(
+        da.where(mask | (icedata < threshold), 0., area), axis=axes)
+    # Ice area is cover * cell area
+    total_area = da.sum(icedata * area, axis=axes)
 
-    ######
-    # Create a small dummy output array
-    data = np.array(data)
-    return times, data
+    extent, total_area = da.compute(extent, total_area)
+    logger.debug('Calculated time series of ice extent: %s and area: %s',
+                 extent, total_area)
+    return times, {'Ice Extent': extent, 'Ice Area': total_area}
 
 
 def make_ts_plots(
         cfg,
         metadata,
         filename,
+        area_cache=None,
 ):
     """
     Make a ice extent and ice area time series plot for an individual model.
@@ -174,6 +211,8 @@ def make_ts_plots(
         The metadata dictionairy for a specific model.
     filename: str
         The preprocessed model file.
+    area_cache: dict
+        Optional cache for the grid cell areas, see get_area_weights.
 
     """
     # Load cube and set up units
@@ -197,14 +236,14 @@ def make_ts_plots(
     season = get_season(cube)
 
     # Making plots for each layer
-    for plot_type in ['Ice Extent', 'Ice Area']:
-        for layer_index, (layer, cube_layer) in enumerate(cubes.items()):
-            layer = str(layer)
+    for layer_index, (layer, cube_layer) in enumerate(cubes.items()):
+        layer = str(layer)
 
-            times, data = calculate_area_time_series(cube_layer, plot_type,
-                                                     threshold)
+        times, time_series = calculate_area_time_series(
+            cube_layer, threshold, area_cache=area_cache)
 
-            plt.plot(times, data)
+        for plot_type in ['Ice Extent', 'Ice Area']:
+            plt.plot(times, time_series[plot_type])
 
             # Add title to plot
             title = ' '.join(
@@ -671,6 +710,9 @@ def main(cfg):
     """
     cartopy.config['data_dir'] = cfg['auxiliary_data_dir']
 
+    # The grid cell areas are shared by the datasets on the same grid
+    area_cache = {}
+
     for index, metadata_filename in enumerate(cfg['input_files']):
         logger.info(
             'metadata filename:\t%s',
@@ -695,7 +737,10 @@ def main(cfg):
 
             ######
             # time series plots o
-            make_ts_plots(cfg, metadatas[filename], filename)
+            make_ts_plots(cfg,
+                          metadatas[filename],
+                          filename,
+                          area_cache=area_cache)
 
     logger.info('Success')
 
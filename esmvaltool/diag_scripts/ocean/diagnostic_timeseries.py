@@ -50,7 +50,9 @@ Author: Lee de Mora (PML)
 
 import logging
 import os
+from datetime import timedelta
 
+import dask.array as da
 import iris
 import matplotlib.pyplot as plt
 import numpy as np
@@ -111,6 +113,12 @@ def moving_average(cube, window):
     in the moving average of a ``10 year`` window will only include the average
     of the five subsequent years.
 
+    The window edges are computed with the calendar of the cube, so windows
+    in months or years may cross month and year boundaries. The average is
+    computed along the time dimension only, so cubes with other dimensions
+    than time get a moving average per grid cell. Masked values are ignored
+    and the data are kept lazy if the cube has lazy data.
+
     Parameters
     ----------
     cube: iris.cube.Cube
@@ -135,42 +143,86 @@ def moving_average(cube, window):
         raise ValueError("Moving average window units not recognised: " +
                          "{}".format(win_units))
 
-    times = cube.coord('time').units.num2date(cube.coord('time').points)
+    time_coord = cube.coord('time')
+    times = time_coord.points
+    dates = time_coord.units.num2date(times)
 
-    datetime = diagtools.guess_calendar_datetime(cube)
+    if win_units in ['days', 'day', 'dy']:
+        tmin = time_coord.units.date2num(
+            dates - timedelta(days=window_len))
+        tmax = time_coord.units.date2num(
+            dates + timedelta(days=window_len))
+    else:
+        if win_units in ['years', 'yrs', 'year', 'yr']:
+            window_len *= 12.
+        datetime = diagtools.guess_calendar_datetime(cube)
+        tmin = _shift_months(time_coord, dates, datetime, -window_len)
+        tmax = _shift_months(time_coord, dates, datetime, window_len)
+
+    # Index of the first and one past the last time point of each window
+    first = np.searchsorted(times, tmin, side='left')
+    last = np.searchsorted(times, tmax, side='right')
+
+    # Sums over the windows are differences of cumulative sums
+    time_dim = cube.coord_dims(time_coord)[0]
+    data = cube.core_data()
+    array = da if isinstance(data, da.Array) else np
+    mask = array.ma.getmaskarray(data)
+    values = array.where(mask, 0., array.ma.getdata(data)).astype(np.float64)
+    counts = (~mask).astype(np.int64)
+    sums = []
+    for cumulative in [values, counts]:
+        cumulative = array.cumsum(cumulative, axis=time_dim)
+        zeros = array.zeros_like(array.take(cumulative, [0], axis=time_dim))
+        cumulative = array.concatenate([zeros, cumulative], axis=time_dim)
+        sums.append(
+            array.take(cumulative, last, axis=time_dim) -
+            array.take(cumulative, first, axis=time_dim))
+    total, count = sums
+    mean = total / array.where(count > 0, count, 1)
+    mean = array.ma.masked_where(count == 0, mean)
+    if np.issubdtype(cube.dtype, np.floating):
+        mean = mean.astype(cube.dtype)
+    return cube.copy(data=mean)
+
+
+def _shift_months(time_coord, dates, datetime, months):
+    """
+    Shift dates by a (possibly fractional) number of months.
 
-    output = []
+    The day of month is kept where possible, and clipped to the length of
+    the target month otherwise. Fractional shifts are interpolated linearly
+    in time between the two nearest whole month shifts.
+
+    Parameters
+    ----------
+    time_coord: iris.coords.Coord
+        The time coordinate of the dates.
+    dates: numpy.array
+        The dates to shift.
+    datetime: cftime.datetime
+        A datetime creator function, as returned by guess_calendar_datetime.
+    months: float
+        The number of months to shift the dates by.
 
-    times = np.array([
-        datetime(time_itr.year, time_itr.month, time_itr.day, time_itr.hour,
-                 time_itr.minute) for time_itr in times
-    ])
+    Returns
+    ----------
+    numpy.array:
+        The shifted dates, as time coordinate points.
 
-    for time_itr in times:
-        if win_units in ['years', 'yrs', 'year', 'yr']:
-            tmin = datetime(time_itr.year - window_len, time_itr.month,
-                            time_itr.day, time_itr.hour, time_itr.minute)
-            tmax = datetime(time_itr.year + window_len, time_itr.month,
-                            time_itr.day, time_itr.hour, time_itr.minute)
-
-        if win_units in ['months', 'month', 'mn']:
-            tmin = datetime(time_itr.year, time_itr.month - window_len,
-                            time_itr.day, time_itr.hour, time_itr.minute)
-            tmax = datetime(time_itr.year, time_itr.month + window_len,
-                            time_itr.day, time_itr.hour, time_itr.minute)
-
-        if win_units in ['days', 'day', 'dy']:
-            tmin = datetime(time_itr.year, time_itr.month,
-                            time_itr.day - window_len, time_itr.hour,
-                            time_itr.minute)
-            tmax = datetime(time_itr.year, time_itr.month,
-                            time_itr.day + window_len, time_itr.hour,
-                            time_itr.minute)
-
-        arr = np.ma.masked_where((times < tmin) + (times > tmax), cube.data)
-        output.append(arr.mean())
-    cube.data = np.array(output)
-    return cube
+    """
+    shifted = []
+    for whole_months in sorted({np.floor(months), np.ceil(months)}):
+        points = []
+        for date in dates:
+            month = date.month - 1 + int(whole_months)
+            year = date.year + month // 12
+            month = month % 12 + 1
+            day = min(date.day, datetime(year, month, 1).daysinmonth)
+            points.append(date.replace(year=year, month=month, day=day))
+        shifted.append(time_coord.units.date2num(points))
+    fraction = months - np.floor(months)
+    return shifted[0] + fraction * (shifted[-1] - shifted[0])
 
 
 def make_time_series_plots(
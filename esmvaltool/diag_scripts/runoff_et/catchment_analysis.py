@@ -28,13 +28,16 @@ Description
 
 """
 import calendar
+import hashlib
 import logging
 import os
 from itertools import cycle
 
+import dask.array as da
 import iris
 import iris.coord_categorisation
 import numpy as np
+from scipy.sparse import csr_matrix, load_npz, save_npz
 
 import esmvaltool.diag_scripts.shared as diag
 
@@ -487,12 +490,62 @@ def get_catchment_data(cfg):
         catchments['cube'].coord('latitude').guess_bounds()
     if catchments['cube'].coord('longitude').bounds is None:
         catchments['cube'].coord('longitude').guess_bounds()
-    catchments['area'] = iris.analysis.cartography.area_weights(
-        catchments['cube'])
+    catchments['operator'] = get_catchment_operator(
+        catchments, catchment_filepath, cfg.get('weights_dir'))
 
     return catchments
 
 
+def get_catchment_operator(catchments, catchment_filepath, weights_dir=None):
+    """Get the sparse operator computing catchment averages.
+
+    The operator is a (catchment, grid cell) matrix of area weights,
+    normalised by the area of each catchment. It is computed once from
+    the catchment mask and, if `weights_dir` is given, stored there to
+    be reused by later runs with the same mask file.
+
+    Parameters
+    ----------
+    catchments : dict
+        Dictionary containing infomation about catchment mask
+    catchment_filepath : str
+        Path to the catchment mask file
+    weights_dir : str
+        Directory to store the operator between runs, optional
+    """
+    rids = np.array(list(catchments['catchments'].values()), dtype=int)
+    sha = hashlib.sha1(rids.tobytes())
+    with open(catchment_filepath, 'rb') as catchment_file:
+        for block in iter(lambda: catchment_file.read(2**20), b''):
+            sha.update(block)
+    filepath = None
+    if weights_dir:
+        weights_dir = os.path.expanduser(weights_dir)
+        filepath = os.path.join(
+            weights_dir, 'catchment_operator_{}.npz'.format(sha.hexdigest()))
+        if os.path.isfile(filepath):
+            logger.info("Reading catchment operator from %s", filepath)
+            return load_npz(filepath)
+
+    labels = catchments['cube'].data.astype(int)
+    labels = np.ma.filled(labels, rids.min() - 1).ravel()
+    area = iris.analysis.cartography.area_weights(
+        catchments['cube']).ravel()
+    sorter = np.argsort(rids)
+    pos = np.searchsorted(rids, labels, sorter=sorter).clip(0, len(rids) - 1)
+    cells = np.nonzero(rids[sorter[pos]] == labels)[0]
+    rows = sorter[pos[cells]]
+    catch_area = np.bincount(rows, weights=area[cells], minlength=len(rids))
+    operator = csr_matrix((area[cells] / catch_area[rows], (rows, cells)),
+                          shape=(len(rids), labels.size))
+
+    if filepath:
+        os.makedirs(weights_dir, exist_ok=True)
+        logger.info("Saving catchment operator to %s", filepath)
+        save_npz(filepath, operator)
+    return operator
+
+
 def get_sim_data(cfg, datapath, catchment_cube):
     """Read and postprocess netcdf data from experiments.
 
@@ -519,12 +572,14 @@ def get_sim_data(cfg, datapath, catchment_cube):
                          new_cube.long_name.lower(), ' flux')
     # Convert to unit mm per month
     timelist = new_cube.coord('time')
-    daypermonth = []
-    for mydate in timelist.units.num2date(timelist.points):
-        daypermonth.append(calendar.monthrange(mydate.year, mydate.month)[1])
-    new_cube.data *= 86400.0
-    for i, days in enumerate(daypermonth):
-        new_cube.data[i] *= days
+    daypermonth = np.array([
+        calendar.monthrange(mydate.year, mydate.month)[1]
+        for mydate in timelist.units.num2date(timelist.points)
+    ])
+    factor = (86400.0 * daypermonth).astype(new_cube.dtype)
+    new_cube = new_cube.copy(
+        data=new_cube.core_data() *
+        factor.reshape((-1, ) + (1, ) * (new_cube.ndim - 1)))
     # Aggregate over year --> unit mm per year
     iris.coord_categorisation.add_year(new_cube, 'time')
     year_cube = new_cube.aggregated_by('year', iris.analysis.SUM)
@@ -542,26 +597,37 @@ def get_sim_data(cfg, datapath, catchment_cube):
     return datainfo['short_name'], identifier, mean_cube_regrid
 
 
-def get_catch_avg(catchments, sim_cube):
+def get_catch_avg(catchments, sim_cubes):
     """Compute area weighted averages for river catchments.
 
+    The averages of all simulations are computed at once, with a single
+    product of the catchment operator and the (lazy) data.
+
     Parameters
     ----------
     catchments : dict
         Dictionary containing infomation about catchment mask,
         grid cell size, and reference values
-    sim_cube : obj
-        iris cube object containing the simulation data
+    sim_cubes : list
+        iris cube objects containing the simulation data
+
+    Returns
+    -------
+    list
+        Dictionary of catchment averages per river for each cube
     """
-    avg = {}
-    for river, rid in catchments['catchments'].items():
-        data_catch = np.ma.masked_where(
-            catchments['cube'].data.astype(np.int) != rid, sim_cube.data)
-        area_catch = np.ma.masked_where(
-            catchments['cube'].data.astype(np.int) != rid,
-            catchments['area'].data)
-        avg[river] = (data_catch * (area_catch / area_catch.sum())).sum()
-    return avg
+    data = da.stack([da.asarray(cube.core_data()) for cube in sim_cubes])
+    data = data.reshape((len(sim_cubes), -1))
+    values, valid = da.compute(da.ma.filled(data, 0.),
+                               ~da.ma.getmaskarray(data))
+    operator = catchments['operator']
+    avg = operator.dot(values.T).T
+    valid = (operator > 0.).dot(valid.T.astype(float)).T
+    rivers = list(catchments['catchments'])
+    return [{
+        river: avg[i, j] if valid[i, j] else np.ma.masked
+        for j, river in enumerate(rivers)
+    } for i in range(len(sim_cubes))]
 
 
 def update_reference(catchments, model, rivervalues, var):
@@ -633,13 +699,17 @@ def main(cfg):
     # to check: How to regrid onto catchment_cube grid
     #           with preproc recipe statements
     #           instead of using regrid here?
+    simdata = [
+        get_sim_data(cfg, datapath, my_catch['cube'])
+        for datapath in diag.Datasets(cfg)
+    ]
+    # Get river catchment averages of all datasets at once
+    allvalues = get_catch_avg(my_catch, [cube for _, _, cube in simdata])
+
     allcubes = {}
     plotdata = {}
-    for datapath in diag.Datasets(cfg):
-        # Get simulation data
-        var, identifier, cube = get_sim_data(cfg, datapath, my_catch['cube'])
-        # Get river catchment averages
-        rivervalues = get_catch_avg(my_catch, cube)
+    for datapath, (var, identifier, cube), rivervalues in zip(
+            diag.Datasets(cfg), simdata, allvalues):
         # Sort into data dictionaries
         datainfo = diag.Datasets(cfg).get_dataset_info(path=datapath)
         model = datainfo['dataset']
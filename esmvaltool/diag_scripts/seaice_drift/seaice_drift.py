@@ -8,6 +8,7 @@ import warnings
 import numpy as np
 from scipy import stats
 from matplotlib import pyplot as plt
+from matplotlib.path import Path
 
 import iris
 import iris.cube
@@ -17,7 +18,6 @@ import iris.coords
 from iris.util import broadcast_to_shape
 from iris.aux_factory import AuxCoordFactory
 from pyproj import Transformer
-from shapely.geometry import Polygon, Point
 
 
 import esmvaltool.diag_scripts.shared
@@ -154,20 +154,7 @@ class SeaIceDrift():
             mask = data.coord('latitude').points > lat_threshold
             mask = mask.astype(np.int8)
         else:
-            polygon = self.cfg['polygon']
-            factory = InsidePolygonFactory(
-                polygon,
-                data.coord('latitude'),
-                data.coord('longitude'),
-            )
-            data.add_aux_factory(factory)
-            mask = data.coord('Inside polygon').points
-            mask = mask.astype(np.int8)
-            coord = data.coord('Inside polygon')
-            dim_coords = data.coord_dims(coord)
-            data.remove_aux_factory(factory)
-            data.add_aux_coord(coord, dim_coords)
-            data.remove_coord('Inside polygon')
+            mask = self._get_region_mask(data)
 
         dataset_info = self.datasets.get_dataset_info(filename)
         var_info = esmvaltool.diag_scripts.shared.group_metadata(
@@ -183,6 +170,24 @@ class SeaIceDrift():
 
         return area_cello.data * mask
 
+    def _get_region_mask(self, data):
+        """Get the polygon mask, computed only once for each grid."""
+        grid_key = tuple(
+            (coord.shape, coord.points.tobytes())
+            for coord in (data.coord('latitude'), data.coord('longitude')))
+        if grid_key not in self.region_mask:
+            factory = InsidePolygonFactory(
+                self.cfg['polygon'],
+                data.coord('latitude'),
+                data.coord('longitude'),
+            )
+            data.add_aux_factory(factory)
+            mask = data.coord('Inside polygon').points
+            mask = mask.astype(np.int8)
+            data.remove_aux_factory(factory)
+            self.region_mask[grid_key] = mask
+        return self.region_mask[grid_key]
+
     def _compute_metrics(self):
         for dataset in self.siconc:
             logger.info('Compute diagnostics for %s', dataset)
@@ -581,16 +586,15 @@ class InsidePolygonFactory(AuxCoordFactory):
         self.units = '1.0'
         self.attributes = {}
 
-        polygon.append(polygon[0])
         self.transformer = Transformer.from_crs(
             "WGS84",
-            "North_Pole_Stereographic"
+            "North_Pole_Stereographic",
+            always_xy=True,
         )
 
-        transformed = []
-        for lon_val, lat_val in polygon:
-            transformed.append(self.transformer.transform(lon_val, lat_val))
-        self.polygon = Polygon(transformed)
+        lon_val, lat_val = np.array(polygon, dtype=float).T
+        transformed = self.transformer.transform(lon_val, lat_val)
+        self.polygon = Path(np.column_stack(transformed), closed=False)
 
     @property
     def dependencies(self):
@@ -600,16 +604,12 @@ class InsidePolygonFactory(AuxCoordFactory):
         return {'lat': self.lat, 'lon': self.lon}
 
     def _derive(self, lat, lon):
-        def in_polygon(lat, lon):
-            """Check if point is inside polygon"""
-            if lon > 180:
-                lon -= 360
-            point = self.transformer.transform(lon, lat)
-            if self.polygon.contains(Point(point[0], point[1])):
-                return 1.
-            return np.nan
-        vectorized = np.vectorize(in_polygon)
-        return vectorized(lat, lon)
+        """Check which points are inside the polygon, all at once."""
+        lat, lon = np.broadcast_arrays(lat, lon)
+        lon = np.where(lon > 180, lon - 360, lon)
+        points = self.transformer.transform(lon.ravel(), lat.ravel())
+        inside = self.polygon.contains_points(np.column_stack(points))
+        return np.where(inside.reshape(lat.shape), 1., np.nan)
 
     def make_coord(self, coord_dims_func):
         """
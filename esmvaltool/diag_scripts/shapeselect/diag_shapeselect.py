@@ -1,15 +1,16 @@
 """Diagnostic to select grid points within a shapefile."""
 import logging
 import os
-from copy import deepcopy
 
 import fiona
 import iris
 import numpy as np
 import xlsxwriter
 from netCDF4 import Dataset, num2date
-from shapely.geometry import MultiPoint, shape
-from shapely.ops import nearest_points
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
+from shapely.geometry import shape
+from shapely.vectorized import contains
 
 from esmvaltool.diag_scripts.shared import (run_diagnostic, ProvenanceLogger,
                                             get_diagnostic_filename)
@@ -36,13 +37,14 @@ def main(cfg):
     """Select grid points within shapefiles."""
     if 'evalplot' not in cfg:
         cfg['evalplot'] = False
+    weights_cache = {}
     for filename, attributes in cfg['input_data'].items():
         logger.info("Processing variable %s from dataset %s",
                     attributes['standard_name'], attributes['dataset'])
         logger.debug("Loading %s", filename)
         cube = iris.load_cube(filename)
 
-        ncts, nclon, nclat = shapeselect(cfg, cube)
+        ncts, nclon, nclat = shapeselect(cfg, cube, weights_cache)
         name = os.path.splitext(os.path.basename(filename))[0] + '_polygon'
         if cfg['write_xlsx']:
             xname = name + '_table'
@@ -121,100 +123,122 @@ def writexls(cfg, filename, ncts, nclon1, nclat1):
     workbook.close()
 
 
-def shapeselect(cfg, cube):
-    """Select data inside a shapefile."""
+def get_grid_points(cube):
+    """Get the longitudes and latitudes of all horizontal grid points.
+
+    The points are flattened in the order of the horizontal dimensions of
+    the cube, which are expected to follow the time dimension. Both 1-d
+    and 2-d (curvilinear) coordinates are supported.
+    """
+    lon = cube.coord('longitude')
+    lat = cube.coord('latitude')
+    if lon.ndim == 1 and lat.ndim == 1:
+        lon_points, lat_points = np.meshgrid(lon.points, lat.points)
+        if cube.coord_dims(lon)[0] < cube.coord_dims(lat)[0]:
+            lon_points, lat_points = lon_points.T, lat_points.T
+    elif lon.ndim == 2 and cube.coord_dims(lon) == cube.coord_dims(lat):
+        lon_points, lat_points = lon.points, lat.points
+        if cube.coord_dims(lon)[0] > cube.coord_dims(lon)[1]:
+            lon_points, lat_points = lon_points.T, lat_points.T
+    else:
+        raise ValueError("Longitude and latitude must both be 1-d or "
+                         "2-d on the same dimensions")
+    return lon_points.ravel(), lat_points.ravel()
+
+
+def mean_inside(multi, lon, lat, order):
+    """Find the indices of the grid points inside a shape.
+
+    The longitudes `lon` and latitudes `lat` are sorted by longitude and
+    `order` maps them back to the grid. Only the points within the
+    bounding box of the shape are tested.
+    """
+    minx, miny, maxx, maxy = multi.bounds
+    first = np.searchsorted(lon, minx, side='left')
+    last = np.searchsorted(lon, maxx, side='right')
+    box = np.arange(first, last)
+    box = box[(lat[box] >= miny) & (lat[box] <= maxy)]
+    inside = contains(multi, lon[box], lat[box])
+    return np.sort(order[box[inside]])
+
+
+def representative(multis, tree):
+    """Find the grid points nearest to a representative point of shapes."""
+    reprpoints = [multi.representative_point().coords[0] for multi in multis]
+    return tree.query(np.array(reprpoints).reshape(-1, 2))[1]
+
+
+def get_weights(cfg, lon, lat):
+    """Compute the weights of the grid points for each shape.
+
+    Parameters
+    ----------
+    cfg: dict
+        configuration dictionary ESMValTool format.
+    lon: numpy array
+        longitudes of all grid points, within [-180, 180].
+    lat: numpy array
+        latitudes of all grid points.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        (shape, grid point) matrix of weights, each row summing to one.
+    numpy array
+        index of the representative grid point of each shape.
+    """
     shppath = cfg['shapefile']
     if not os.path.isabs(shppath):
         shppath = os.path.join(cfg['auxiliary_data_dir'], shppath)
-    wgtmet = cfg['weighting_method']
-    if ((cube.coord('latitude').ndim == 1
-         and cube.coord('longitude').ndim == 1)):
-        coordpoints = [(x, y) for x in cube.coord('longitude').points
-                       for y in cube.coord('latitude').points]
-        for i, crd in enumerate(coordpoints):
-            if crd[0] > 180:
-                coordpoints[i] = (coordpoints[i][0] - 360., coordpoints[i][1])
-    else:
-        raise ValueError("Support for 2-d coords not implemented!")
-    points = MultiPoint(coordpoints)
     with fiona.open(shppath) as shp:
-        gpx = []
-        gpy = []
-        cnt = -1
-        ncts = np.zeros((cube.coord('time').shape[0], len(shp)))
-        nclon = np.zeros((len(shp)))  # Takes representative point
-        nclat = np.zeros((len(shp)))
-        for ishp, multipol in enumerate(shp):
-            cnt += 1
-            multi = shape(multipol['geometry'])
-            if wgtmet == 'mean_inside':
-                gpx, gpy = mean_inside(gpx, gpy, points, multi, cube)
-                if not gpx:
-                    gpx, gpy = representative(gpx, gpy, points, multi, cube)
-            elif wgtmet == 'representative':
-                gpx, gpy = representative(gpx, gpy, points, multi, cube)
-            if len(gpx) == 1:
-                ncts[:, ishp] = np.reshape(cube.data[:, gpy, gpx],
-                                           (cube.data.shape[0], ))
-            else:
-                ncts[:, ishp] = np.mean(cube.data[:, gpy, gpx], axis=1)
-            gxx, gyy = representative([], [], points, multi, cube)
-            nclon[ishp] = cube.coord('longitude').points[gxx]
-            nclat[ishp] = cube.coord('latitude').points[gyy]
-    return ncts, nclon, nclat
-
-
-def mean_inside(gpx, gpy, points, multi, cube):
-    """Find points inside shape."""
-    for point in points:
-        if point.within(multi):
-            if point.x < 0:
-                addx = 360.
-            else:
-                addx = 0.
-            xxx, yyy = best_match(
-                cube.coord('longitude').points,
-                cube.coord('latitude').points, point.x + addx, point.y)
-            gpx.append(xxx)
-            gpy.append(yyy)
-    return gpx, gpy
-
-
-def representative(gpx, gpy, points, multi, cube):
-    """Find representative point in shape."""
-    reprpoint = multi.representative_point()
-    nearest = nearest_points(reprpoint, points)
-    npx = nearest[1].coords[0][0]
-    npy = nearest[1].coords[0][1]
-    if npx < 0:
-        addx = 360.
-    else:
-        addx = 0.
-    xxx, yyy = best_match(
-        cube.coord('longitude').points,
-        cube.coord('latitude').points, npx + addx, npy)
-    gpx.append(xxx)
-    gpy.append(yyy)
-    return gpx, gpy
-
-
-def best_match(iin, jin, pex, pey):
-    """Identify the grid points in 2-d with minimum distance."""
-    if iin.shape != 2 or jin.shape != 2:
-        gpx = deepcopy(iin)
-        gpy = deepcopy(jin)
-        gpxx = np.zeros((len(gpx), len(gpy)))
-        gpyy = np.zeros((len(gpx), len(gpy)))
-        for gpi in range(0, len(gpy)):
-            gpxx[:, gpi] = gpx
-        for gpj in range(0, len(gpx)):
-            gpyy[gpj, :] = gpy
-    else:
-        gpxx = deepcopy(iin)
-        gpyy = deepcopy(jin)
-    distance = ((gpxx - pex)**2 + (gpyy - pey)**2)**0.5
-    ind = np.unravel_index(np.argmin(distance, axis=None), distance.shape)
-    return ind[0], ind[1]
+        multis = [shape(multipol['geometry']) for multipol in shp]
+    tree = cKDTree(np.column_stack((lon, lat)))
+    reprindex = representative(multis, tree)
+    order = np.argsort(lon, kind='stable')
+    lon_sorted = lon[order]
+    lat_sorted = lat[order]
+    rows = []
+    cols = []
+    for ishp, multi in enumerate(multis):
+        index = []
+        if cfg['weighting_method'] == 'mean_inside':
+            index = mean_inside(multi, lon_sorted, lat_sorted, order)
+        if not len(index):
+            index = reprindex[[ishp]]
+        rows.append(np.full(len(index), ishp))
+        cols.append(index)
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    counts = np.bincount(rows, minlength=len(multis))
+    weights = csr_matrix((1. / counts[rows], (rows, cols)),
+                         shape=(len(multis), len(lon)))
+    return weights, reprindex
+
+
+def shapeselect(cfg, cube, cache=None):
+    """Select data inside a shapefile.
+
+    The weights of the grid points are computed once per grid and
+    kept in `cache`, so that all variables on the same grid reuse them.
+    The time series of all shapes are then a single matrix product.
+    """
+    lon, lat = get_grid_points(cube)
+    wrapped = np.where(lon > 180, lon - 360., lon)
+    key = (cfg['shapefile'], cfg['weighting_method'], wrapped.tobytes(),
+           lat.tobytes())
+    if cache is None:
+        cache = {}
+    if key not in cache:
+        cache[key] = get_weights(cfg, wrapped, lat)
+    weights, reprindex = cache[key]
+
+    data = np.ma.reshape(cube.data, (cube.shape[0], -1))
+    valid = (~np.ma.getmaskarray(data)).astype(float)
+    total = weights.dot(np.ma.filled(data, 0.).T).T
+    count = weights.dot(valid.T).T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ncts = np.where(count > 0., total / count, np.nan)
+    return ncts, lon[reprindex], lat[reprindex]
 
 
 def write_netcdf(path, var, plon, plat, cube, cfg):
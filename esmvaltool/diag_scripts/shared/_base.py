@@ -1,6 +1,7 @@
 """Convenience functions for running a diagnostic script."""
 import argparse
 import contextlib
+import fcntl
 import glob
 import logging
 import os
@@ -13,6 +14,9 @@ import yaml
 
 logger = logging.getLogger(__name__)
 
+# Names of the files logged to each provenance journal by this process
+_JOURNAL_RECORDS = {}
+
 
 def get_plot_filename(basename, cfg):
     """Get a valid path for saving a diagnostic plot.
@@ -95,14 +99,27 @@ class ProvenanceLogger:
             with ProvenanceLogger(cfg) as provenance_logger:
                 provenance_logger.log(output_file, record)
 
+    Note
+    ----
+        Within :func:`run_diagnostic`, the records are appended to a
+        journal file when leaving the context, instead of rewriting the
+        complete provenance file. The journal is locked while writing, so
+        parallel worker processes can log concurrently. It is merged into
+        ``diagnostic_provenance.yml`` once, at the end of
+        :func:`run_diagnostic`. Duplicate records are reported by
+        :meth:`log` if they were logged by the same process and when
+        merging otherwise.
+
     """
 
     def __init__(self, cfg):
         """Create a provenance logger."""
         self._log_file = os.path.join(cfg['run_dir'],
                                       'diagnostic_provenance.yml')
+        self._journal_file = _get_provenance_journal(cfg['run_dir'])
+        self._use_journal = os.path.exists(self._journal_file)
 
-        if not os.path.exists(self._log_file):
+        if self._use_journal or not os.path.exists(self._log_file):
             self.table = {}
         else:
             with open(self._log_file, 'r') as file:
@@ -131,7 +148,9 @@ class ProvenanceLogger:
             See also esmvaltool/config-references.yml
 
         """
-        if filename in self.table:
+        if filename in self.table or (
+                self._use_journal and
+                filename in _JOURNAL_RECORDS.get(self._journal_file, ())):
             raise KeyError(
                 "Provenance record for {} already exists.".format(filename))
 
@@ -139,12 +158,31 @@ class ProvenanceLogger:
 
     def _save(self):
         """Save the provenance log to file."""
+        if self._use_journal:
+            self._append_to_journal()
+            return
         dirname = os.path.dirname(self._log_file)
         if not os.path.exists(dirname):
             os.makedirs(dirname)
         with open(self._log_file, 'w') as file:
             yaml.safe_dump(self.table, file)
 
+    def _append_to_journal(self):
+        """Append the new records to the provenance journal."""
+        if not self.table:
+            return
+        document = yaml.safe_dump(self.table, explicit_start=True)
+        with open(self._journal_file, 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.write(document)
+                file.flush()
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+        _JOURNAL_RECORDS.setdefault(self._journal_file, set()).update(
+            self.table)
+        self.table = {}
+
     def __enter__(self):
         """Enter context."""
         return self
@@ -154,6 +192,41 @@ class ProvenanceLogger:
         self._save()
 
 
+def _get_provenance_journal(run_dir):
+    """Get the path to the provenance journal file."""
+    return os.path.join(run_dir, 'diagnostic_provenance_journal.yml')
+
+
+def _merge_provenance_journal(run_dir, raise_duplicates=True):
+    """Merge the provenance journal into the provenance file.
+
+    Records logged more than once, e.g. by different worker processes,
+    raise a :obj:`KeyError`, or are only reported in the log if
+    `raise_duplicates` is False, keeping the first record.
+    """
+    journal_file = _get_provenance_journal(run_dir)
+    _JOURNAL_RECORDS.pop(journal_file, None)
+    if not os.path.exists(journal_file):
+        return
+    table = {}
+    with open(journal_file, 'r') as file:
+        for records in yaml.safe_load_all(file):
+            for filename, record in (records or {}).items():
+                if filename in table:
+                    msg = "Provenance record for {} already exists.".format(
+                        filename)
+                    if raise_duplicates:
+                        raise KeyError(msg)
+                    logger.error(msg)
+                    continue
+                table[filename] = record
+    if table:
+        log_file = os.path.join(run_dir, 'diagnostic_provenance.yml')
+        with open(log_file, 'w') as file:
+            yaml.safe_dump(table, file)
+    os.remove(journal_file)
+
+
 def select_metadata(metadata, **attributes):
     """Select specific metadata describing preprocessed data.
 
@@ -475,6 +548,20 @@ def run_diagnostic():
     if os.path.exists(provenance_file):
         os.remove(provenance_file)
 
-    yield cfg
+    # Provenance records are collected in a journal while the script runs
+    if not os.path.exists(cfg['run_dir']):
+        os.makedirs(cfg['run_dir'])
+    journal_file = _get_provenance_journal(cfg['run_dir'])
+    _JOURNAL_RECORDS.pop(journal_file, None)
+    with open(journal_file, 'w'):
+        pass
+
+    try:
+        yield cfg
+    except BaseException:
+        # Keep the records of the failed run without hiding its error
+        _merge_provenance_journal(cfg['run_dir'], raise_duplicates=False)
+        raise
+    _merge_provenance_journal(cfg['run_dir'])
 
     logger.info("End of diagnostic script run.")
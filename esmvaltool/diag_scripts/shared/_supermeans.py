@@ -6,9 +6,15 @@ month is periodically averaged over several years, an example is the average
 surface temperature in April between 2000 and 2010. For seasonal averages
 seasons are averaged periodically.
 Annual 'Supermeans' are averages over several full years.
+
+All supermeans of all cubes in a file are computed at once, with a single
+pass over the time axis, and stored in a cache file next to it.
 """
 
+import calendar
+import logging
 import os.path
+import tempfile
 
 import cf_units
 import iris
@@ -16,6 +22,16 @@ import iris.coord_categorisation
 from iris.coord_categorisation import _pt_date
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
+SEASONS = ('djf', 'mam', 'jja', 'son')
+
+MONTHS = tuple(month.lower() for month in calendar.month_abbr[1:])
+
+PERIOD_ATTRIBUTE = 'supermean_period'
+
+_SUPERMEANS = {}
+
 
 class NoBoundsError(ValueError):
     """Return error and pass."""
@@ -31,8 +47,8 @@ def get_supermean(name, season, data_dir, obs_flag=None):
     :param name: Cube name. Should be CF-standard name. If no CF-standard name
                  exists the STASH code in msi format (for example m01s30i403)
                  is used as name.
-    :param season: Supermean for a season (including annual).
-                   ['ann', 'djf', 'mam', 'jja', 'son']
+    :param season: Supermean for a season (including annual) or a month.
+                   ['ann', 'djf', 'mam', 'jja', 'son', 'jan', ..., 'dec']
     :param data_dir: Directory containing cubes of model output data for
                      supermeans.
     :returns: Supermeaned cube.
@@ -44,13 +60,66 @@ def get_supermean(name, season, data_dir, obs_flag=None):
     The annual supermean is a continuous mean over multiple years.
 
     Supermeans are only applied to full clima years (Starting Dec 1st).
+
+    The supermeans of all cubes are read from the cache file next to the
+    cubes, which is (re)computed with `save_supermeans` if needed.
     """
-    name_constraint = iris.Constraint(name=name)
+    if season in SEASONS:
+        period = 'season'
+    elif season in MONTHS:
+        period = 'month'
+    elif season == 'ann':
+        period = 'ann'
+    else:
+        raise ValueError(
+            "Argument 'season' must be one of "
+            "['ann', 'djf', 'mam', 'jja', 'son'] or a month. "
+            "It is: " + str(season))
 
     if not obs_flag:
         cubes_path = os.path.join(data_dir, 'cubeList.nc')
     else:
         cubes_path = os.path.join(data_dir, obs_flag + '_cubeList.nc')
+    cache_path = supermeans_path(cubes_path)
+    if (not os.path.isfile(cache_path) or
+            os.path.getmtime(cache_path) < os.path.getmtime(cubes_path)):
+        save_supermeans(cubes_path)
+    if cache_path not in _SUPERMEANS:
+        cubes = iris.load(cache_path)
+        # the time coordinates of the periods got unique names when saved
+        for cube in cubes:
+            cube.coord('time').var_name = 'time'
+        _SUPERMEANS[cache_path] = cubes
+
+    cube = _SUPERMEANS[cache_path].extract_strict(
+        iris.Constraint(name=name) &
+        iris.AttributeConstraint(**{PERIOD_ATTRIBUTE: period}))
+    cube = cube.copy()
+    del cube.attributes[PERIOD_ATTRIBUTE]
+
+    if period == 'season':
+        return cube.extract(iris.Constraint(season=season))
+    if period == 'month':
+        return cube.extract(iris.Constraint(month=season.capitalize()))
+    return cube
+
+
+def supermeans_path(cubes_path):
+    """Return the path of the supermeans cache file for a file of cubes."""
+    return os.path.splitext(cubes_path)[0] + '_supermeans.nc'
+
+
+def save_supermeans(cubes_path):
+    """Compute the supermeans of all cubes in a file and cache them.
+
+    The monthly, seasonal and annual supermeans of each cube are saved in
+    the cache file next to `cubes_path` (see `supermeans_path`), with the
+    period in the attribute `supermean_period` ('month', 'season' or
+    'ann'). Cubes which can not be averaged over time are skipped.
+
+    :param cubes_path: Path to the file of cubes.
+    :returns: Path to the cache file.
+    """
     cubes = iris.load(cubes_path)
 
     # use STASH if no standard name
@@ -58,18 +127,113 @@ def get_supermean(name, season, data_dir, obs_flag=None):
         if cube.name() == 'unknown':
             cube.rename(str(cube.attributes['STASH']))
 
-    cube = cubes.extract_strict(name_constraint)
+    all_supermeans = iris.cube.CubeList()
+    for cube in cubes:
+        if not cube.coords('time') or not cube.coord('time').has_bounds():
+            logger.debug("Skipping supermeans of %s, no time bounds",
+                         cube.name())
+            continue
+        for period, supermeans_cube in supermeans(cube).items():
+            supermeans_cube.attributes[PERIOD_ATTRIBUTE] = period
+            # keep the name, the variable names get unique suffixes
+            if not (supermeans_cube.standard_name or
+                    supermeans_cube.long_name):
+                supermeans_cube.long_name = supermeans_cube.var_name
+            all_supermeans.append(supermeans_cube)
+
+    # write to a temporary file first, other processes may read the cache
+    cache_path = supermeans_path(cubes_path)
+    handle, tmp_path = tempfile.mkstemp(suffix='.nc',
+                                        dir=os.path.dirname(cache_path))
+    os.close(handle)
+    iris.save(all_supermeans, tmp_path)
+    os.replace(tmp_path, cache_path)
+    _SUPERMEANS.pop(cache_path, None)
+    return cache_path
+
+
+def _month_season(month):
+    """Return the season ('djf', 'mam', 'jja' or 'son') of a month name."""
+    return SEASONS[(MONTHS.index(month.lower()) + 1) % 12 // 3]
+
+
+def supermeans(cube):
+    """Return the monthly, seasonal and annual supermeans of a cube.
+
+    The duration weighted data are summed per calendar month in a single
+    pass over the time axis. As weighted sums are additive, the seasonal
+    and annual supermeans are then computed from the twelve monthly sums.
+    The results are the same as those of `periodic_mean` for the
+    periods 'month', 'season' and None.
+
+    :param cube: Cube with data for full Climate Years.
+    :returns: Dictionary with the supermeans cubes for the keys 'month',
+              'season' and 'ann'.
+    :rtype: dict
+    """
+    _cube = cube.copy()
 
-    if season in ['djf', 'mam', 'jja', 'son']:
-        supermeans_cube = periodic_mean(cube, period='season')
-        return supermeans_cube.extract(iris.Constraint(season=season))
-    elif season == 'ann':
-        return periodic_mean(cube)
+    if _cube.coord('time').has_bounds():
+        add_start_hour(_cube, 'time', name='start_hour')
     else:
-        raise ValueError(
-            "Argument 'season' must be one of "
-            "['ann', 'djf', 'mam', 'jja', 'son']. "
-            "It is: " + str(season))
+        iris.coord_categorisation.add_hour(_cube, 'time', name='start_hour')
+
+    if len(set(_cube.coord('start_hour').points)) > 1:
+        # diurnal data are averaged separately for each sampling hour
+        return {
+            'month': periodic_mean(cube, period='month'),
+            'season': periodic_mean(cube, period='season'),
+            'ann': periodic_mean(cube),
+        }
+    _cube.remove_coord('start_hour')
+    iris.coord_categorisation.add_month(_cube, 'time', name='month')
+    orig_cell_methods = _cube.cell_methods
+
+    # weighted sums for each calendar month
+    weights = durations(_cube.coord('time'))
+    weights = weights / np.max(weights)
+    idx_obj = [None] * _cube.data.ndim
+    idx_obj[_cube.coord_dims('time')[0]] = slice(None)
+    idx_obj = tuple(idx_obj)
+    _cube.data *= weights[idx_obj]
+    monthly = _cube.aggregated_by('month', iris.analysis.SUM)
+    months = _cube.coord('month').points
+    monthly_weights = np.array([
+        np.sum(weights[months == month])
+        for month in monthly.coord('month').points
+    ])
+
+    # seasonal and annual sums from the monthly sums
+    seasonal = monthly.copy()
+    iris.coord_categorisation.add_categorised_coord(
+        seasonal, 'season', 'month', lambda _, month: _month_season(month),
+        units='no_unit')
+    seasons = seasonal.coord('season').points
+    seasonal.remove_coord('month')
+    seasonal = seasonal.aggregated_by('season', iris.analysis.SUM)
+    seasonal_weights = np.array([
+        np.sum(monthly_weights[seasons == season])
+        for season in seasonal.coord('season').points
+    ])
+    annual = monthly.copy()
+    annual.remove_coord('month')
+    annual = annual.collapsed('time', iris.analysis.SUM)
+    annual_weights = np.sum(monthly_weights)
+
+    # divide by aggregated weights and correct cell methods
+    results = {}
+    for period, sums_cube, sums_weights in (
+            ('month', monthly, monthly_weights[idx_obj]),
+            ('season', seasonal, seasonal_weights[idx_obj]),
+            ('ann', annual, annual_weights)):
+        sums_cube.data /= sums_weights
+        sums_cube.cell_methods = orig_cell_methods
+        sums_cube.add_cell_method(
+            iris.coords.CellMethod(method='mean',
+                                   coords=period if period != 'ann' else
+                                   'time'))
+        results[period] = sums_cube
+    return results
 
 
 def contains_full_climate_years(cube):
@@ -297,6 +461,7 @@ def time_average_by(cube, periods='time'):
     idx_obj = [None] * cube.data.ndim
     idx_obj[cube.coord_dims('time')[0]] = slice(
         None)  # [None, slice(None), None] == [np.newaxis, :, np.newaxis]
+    idx_obj = tuple(idx_obj)
     cube.data *= durations_cube.data[idx_obj]
 
     if periods == ['time']:  # duration weighted averaging
@@ -25,6 +25,12 @@ The functions that are here contained are:
 - wmbudg: function for water mass and latent energy budgets;
 - write_eb: function for writing global mean energy budgets to file;
 
+The functions baroceff, budgets, indentr, landoc_budg, mask_precip and
+wmbudg accept a backend argument. With backend='cdo' (the default) each
+operator is applied with CDO, writing intermediate NetCDF files. With
+backend='numpy' the same operators are evaluated in memory on lazy arrays
+(see the numpy_backend module), writing only the final products to disk.
+
 @author: valerio.lembo@uni-hamburg.de, Valerio Lembo, Hamburg University, 2019.
 """
 
@@ -36,7 +42,7 @@ from cdo import Cdo
 from netCDF4 import Dataset
 
 import esmvaltool.diag_scripts.shared as e
-from esmvaltool.diag_scripts.thermodyn_diagtool import mkthe
+from esmvaltool.diag_scripts.thermodyn_diagtool import mkthe, numpy_backend
 
 L_C = 2501000  # latent heat of condensation
 LC_SUB = 2835000  # latent heat of sublimation
@@ -44,7 +50,7 @@ L_S = 334000  # latent heat of solidification
 GRAV = 9.81  # gravity acceleration
 
 
-def baroceff(model, wdir, aux_file, toab_file, te_file):
+def baroceff(model, wdir, aux_file, toab_file, te_file, backend='cdo'):
     """Compute the baroclinic efficiency of the atmosphere.
 
     The function computes the baroclinic efficiency of the atmosphere, i.e.
@@ -60,7 +66,10 @@ def baroceff(model, wdir, aux_file, toab_file, te_file):
       (time,lon,lat);
     - te_file: a file containing the annual mean emission temperature
       (time,lon,lat);
+    - backend: the backend used for the computations ('cdo' or 'numpy');
     """
+    if backend == 'numpy':
+        return _baroceff_numpy(toab_file, te_file)
     cdo = Cdo()
     removeif(aux_file)
     gain_file = wdir + '/{}_maskGain.nc'.format(model)
@@ -109,7 +118,7 @@ def baroceff(model, wdir, aux_file, toab_file, te_file):
     return baroc
 
 
-def budgets(model, wdir, aux_file, input_data):
+def budgets(model, wdir, aux_file, input_data, backend='cdo'):
     """Compute radiative budgets from radiative and heat fluxes.
 
     The function computes TOA and surface energy budgets from radiative and
@@ -126,7 +135,10 @@ def budgets(model, wdir, aux_file, input_data):
     - wdir: the working directory where the outputs are stored;
     - aux_file: the name of a dummy aux. file to be used for computations;
     - filelist: a list of file names containing the input fields;
+    - backend: the backend used for the computations ('cdo' or 'numpy');
     """
+    if backend == 'numpy':
+        return _budgets_numpy(model, wdir, input_data)
     cdo = Cdo()
     hfls_file = e.select_metadata(input_data, short_name='hfls',
                                   dataset=model)[0]['filename']
@@ -185,7 +197,15 @@ def budgets(model, wdir, aux_file, input_data):
     return input_list, eb_gmean, eb_file, toab_ymm_file
 
 
-def direntr(logger, model, wdir, input_data, aux_file, te_file, lect, flags):
+def direntr(logger,
+            model,
+            wdir,
+            input_data,
+            aux_file,
+            te_file,
+            lect,
+            flags,
+            backend='cdo'):
     """Compute the material entropy production with the direct method.
 
     The function computes the material entropy production with the direct
@@ -209,6 +229,8 @@ def direntr(logger, model, wdir, input_data, aux_file, te_file, lect, flags):
     - flags: a list of flags containing information on whether the water mass
     and energy budgets are computed, if the material entropy production has to
     be computed, if using the indirect, the direct method, or both methods;
+    - backend: the backend used for masking the precipitation ('cdo' or
+    'numpy');
     """
     lec = flags[1]
     aux_files = mkthe.init_mkthe_direntr(model, wdir, input_data, te_file,
@@ -244,7 +266,8 @@ def direntr(logger, model, wdir, input_data, aux_file, te_file, lect, flags):
         'Material entropy production associated with '
         'evaporation fluxes: %s\n', sevap)
     infile_mask = [prr_file, prsn_file, tlcl_file]
-    prrmask_file, prsnmask_file = mask_precip(model, wdir, infile_mask)
+    prrmask_file, prsnmask_file = mask_precip(model, wdir, infile_mask,
+                                              backend)
     logger.info('2.2 Rainfall precipitation\n')
     infile_rain = [prrmask_file, tcloud_file]
     srain, rainentr_file = rainentr(model, wdir, infile_rain, aux_file)
@@ -340,7 +363,13 @@ def evapentr(model, wdir, infile, aux_file):
     return evapentr_gmean, evapentr_file
 
 
-def indentr(model, wdir, infile, input_data, aux_file, toab_gmean):
+def indentr(model,
+            wdir,
+            infile,
+            input_data,
+            aux_file,
+            toab_gmean,
+            backend='cdo'):
     """Compute the material entropy production with the indirect method.
 
     The function computes the material entropy production with the indirect
@@ -358,7 +387,10 @@ def indentr(model, wdir, infile, input_data, aux_file, toab_gmean):
       (time,lon,lat);
     - aux_file: the name of a dummy aux. file to be used for computations;
     - toab_gmean: the climatological annaul mean TOA energy budget;
+    - backend: the backend used for the computations ('cdo' or 'numpy');
     """
+    if backend == 'numpy':
+        return _indentr_numpy(model, wdir, infile, input_data, toab_gmean)
     cdo = Cdo()
     rlds_file = e.select_metadata(input_data, short_name='rlds',
                                   dataset=model)[0]['filename']
@@ -431,7 +463,7 @@ def kinentr(logger, aux_file, tasvert_file, lect, lec):
     return minentr_mean
 
 
-def landoc_budg(model, wdir, infile, mask, name):
+def landoc_budg(model, wdir, infile, mask, name, backend='cdo'):
     """Compute budgets separately on land and oceans.
 
     Arguments:
@@ -440,7 +472,10 @@ def landoc_budg(model, wdir, infile, mask, name):
     - infile: the file containing the original budget field as (time,lat,lon);
     - mask: the file containing the land-sea mask;
     - name: the variable name as in the input file;
+    - backend: the backend used for the computations ('cdo' or 'numpy');
     """
+    if backend == 'numpy':
+        return _landoc_budg_numpy(infile, mask)
     cdo = Cdo()
     ocean_file = wdir + '/{}_{}_ocean.nc'.format(model, name)
     oc_gmean_file = wdir + '/{}_{}_oc_gmean.nc'.format(model, name)
@@ -466,7 +501,7 @@ def landoc_budg(model, wdir, infile, mask, name):
     return oc_gmean, la_gmean
 
 
-def mask_precip(model, wdir, infile):
+def mask_precip(model, wdir, infile, backend='cdo'):
     """Mask precipitation according to the phase of the droplet.
 
     This function mask the rainfall and snowfall precipitation fields, as well
@@ -479,7 +514,10 @@ def mask_precip(model, wdir, infile):
     - wdir: the working directory where the outputs are stored;
     - infile: a list of input file, containing rainfall precipitation (prr) and
       prsn, respectively (dimensions (time,lat,lon));
+    - backend: the backend used for the computations ('cdo' or 'numpy');
     """
+    if backend == 'numpy':
+        return _mask_precip_numpy(model, wdir, infile)
     cdo = Cdo()
     prr_file = infile[0]
     prsn_file = infile[1]
@@ -745,7 +783,7 @@ def snowentr(model, wdir, infile, aux_file):
     return snowentr_gmean, latsnow_file, snowentr_file
 
 
-def wmbudg(model, wdir, aux_file, input_data, auxlist):
+def wmbudg(model, wdir, aux_file, input_data, auxlist, backend='cdo'):
     """Compute the water mass and latent energy budgets.
 
     This function computes the annual mean water mass and latent energy budgets
@@ -760,7 +798,10 @@ def wmbudg(model, wdir, aux_file, input_data, auxlist):
     - aux_file: the name of a dummy aux. file to be used for computations;
     - filelist: a list of file names containing the input fields;
     - auxlist: a list of auxiliary files;
+    - backend: the backend used for the computations ('cdo' or 'numpy');
     """
+    if backend == 'numpy':
+        return _wmbudg_numpy(model, wdir, input_data, auxlist)
     cdo = Cdo()
     hfls_file = e.select_metadata(input_data, short_name='hfls',
                                   dataset=model)[0]['filename']
@@ -807,3 +848,164 @@ def write_eb(namein, nameout, aux_file, d3_file, gmean_file):
     with Dataset(gmean_file) as f_l:
         constant = f_l.variables[nameout][:]
     return constant
+
+
+def _baroceff_numpy(toab_file, te_file):
+    """Compute the baroclinic efficiency in memory (see baroceff)."""
+    nbe = numpy_backend
+    toab_cube = nbe.load(toab_file)
+    weights = nbe.area_weights(toab_cube)
+    toab = toab_cube.lazy_data()
+    t_e = nbe.load(te_file).lazy_data()
+    gain = nbe.gtc(toab, 0)
+    loss = nbe.ltc(toab, 0)
+    toabgain = nbe.setrtomiss(toab * gain, -1000, 0)
+    toabloss = nbe.setrtomiss(toab * loss, 0, 1000)
+    tegain = nbe.setrtomiss(t_e * gain, -1000, 0)
+    teloss = nbe.setrtomiss(t_e * loss, -1000, 0)
+    tegainm = nbe.div(nbe.fldmean(toabgain, weights),
+                      nbe.fldmean(nbe.div(toabgain, tegain), weights))
+    telossm = nbe.div(nbe.fldmean(toabloss, weights),
+                      nbe.fldmean(nbe.div(toabloss, teloss), weights))
+    aux_baroceff = nbe.reci(telossm) - nbe.reci(tegainm)
+    baroc = nbe.div(aux_baroceff,
+                    0.5 * (nbe.reci(tegainm) + nbe.reci(telossm)))
+    return nbe.realise(baroc)[0]
+
+
+def _budgets_numpy(model, wdir, input_data):
+    """Compute the energy budgets in memory (see budgets)."""
+    nbe = numpy_backend
+    names = [
+        'hfls', 'hfss', 'rlds', 'rlus', 'rlut', 'rsds', 'rsdt', 'rsus', 'rsut'
+    ]
+    input_list = [
+        e.select_metadata(input_data, short_name=name,
+                          dataset=model)[0]['filename'] for name in names
+    ]
+    flx = {name: nbe.load(filen) for name, filen in zip(names, input_list)}
+    toab_file = wdir + '/{}_toab.nc'.format(model)
+    surb_file = wdir + '/{}_surb.nc'.format(model)
+    atmb_file = wdir + '/{}_atmb.nc'.format(model)
+    toab = nbe.to_float32(
+        nbe.apply(lambda rsdt, rsut, rlut: rsdt - rsut - rlut, flx['rsdt'],
+                  flx['rsut'], flx['rlut']))
+    toab_gmean = _write_eb_numpy(toab, 'toab', toab_file)
+    toab_ymm_file = wdir + '/{}_toab_ymm.nc'.format(model)
+    nbe.save(nbe.yearmonmean(toab), 'toab', toab_ymm_file)
+    # Surface energy budget
+    surb = nbe.to_float32(
+        nbe.apply(
+            lambda rsds, rlds, rsus, rlus, hfls, hfss:
+            (rsds + rlds - rsus - rlus - hfls - hfss), flx['rsds'],
+            flx['rlds'], flx['rsus'], flx['rlus'], flx['hfls'], flx['hfss']))
+    surb_gmean = _write_eb_numpy(surb, 'surb', surb_file)
+    # Atmospheric energy budget
+    atmb = nbe.apply(lambda toa, sur: toa - sur, toab, surb)
+    atmb_gmean = _write_eb_numpy(atmb, 'atmb', atmb_file)
+    eb_gmean = [toab_gmean, atmb_gmean, surb_gmean]
+    eb_file = [toab_file, atmb_file, surb_file]
+    return input_list, eb_gmean, eb_file, toab_ymm_file
+
+
+def _indentr_numpy(model, wdir, infile, input_data, toab_gmean):
+    """Compute the indirect material entropy production in memory.
+
+    See indentr.
+    """
+    nbe = numpy_backend
+    flx = {
+        name: nbe.load(
+            e.select_metadata(input_data, short_name=name,
+                              dataset=model)[0]['filename'])
+        for name in ['rlds', 'rlus', 'rsds', 'rsus', 'ts']
+    }
+    t_e = nbe.load(infile[0])
+    toab = nbe.load(infile[1])
+    horzentropy_file = wdir + '/{}_horizEntropy.nc'.format(model)
+    vertentropy_file = wdir + '/{}_verticalEntropy.nc'.format(model)
+    toab_mean = np.nanmean(toab_gmean)
+    horzentr = nbe.yearmonmean(
+        nbe.apply(lambda toa, tem: -1 * nbe.div(toa - toab_mean, tem), toab,
+                  t_e))
+    horzentr_mean = _write_eb_numpy(horzentr, 'shor', horzentropy_file)
+    vertenergy = nbe.yearmonmean(
+        nbe.apply(lambda rlds, rsds, rlus, rsus: rlds + (rsds - (rlus + rsus)),
+                  flx['rlds'], flx['rsds'], flx['rlus'], flx['rsus']))
+    vertentr = nbe.apply(
+        lambda ver, rte, rts: ver * (rte - rts), vertenergy,
+        nbe.yearmonmean(nbe.apply(nbe.reci, t_e)),
+        nbe.yearmonmean(nbe.apply(nbe.reci, flx['ts'])))
+    vertentr_mean = _write_eb_numpy(vertentr, 'sver', vertentropy_file)
+    return horzentr_mean, vertentr_mean, horzentropy_file, vertentropy_file
+
+
+def _landoc_budg_numpy(infile, mask):
+    """Compute budgets over land and oceans in memory (see landoc_budg)."""
+    nbe = numpy_backend
+    fld = nbe.load(infile)
+    weights = nbe.area_weights(fld)
+    ocean = fld.lazy_data() * nbe.eqc(nbe.load(mask).lazy_data(), 0)
+    land = nbe.setctomiss(fld.lazy_data() - ocean, 0)
+    oc_gmean = nbe.realise(nbe.timmean(nbe.fldmean(ocean, weights)))
+    la_gmean = nbe.realise(nbe.timmean(nbe.fldmean(land, weights)))
+    return oc_gmean, la_gmean
+
+
+def _mask_precip_numpy(model, wdir, infile):
+    """Mask rainfall and snowfall precipitation in memory (see mask_precip).
+
+    Only the masked precipitation fields are computed, the other fields of
+    mask_precip are discarded anyway.
+    """
+    nbe = numpy_backend
+    prrmask_file = wdir + '/{}_prr_masked.nc'.format(model)
+    prsnmask_file = wdir + '/{}_prsn_masked.nc'.format(model)
+    for filen, maskfile in zip(infile[0:2], [prrmask_file, prsnmask_file]):
+        prec = nbe.to_float32(nbe.load(filen))
+        prec_masked = nbe.apply(lambda pre: nbe.gtc(pre, 1.0E-7) * pre, prec)
+        nbe.save(prec_masked, prec.var_name, maskfile)
+    return prrmask_file, prsnmask_file
+
+
+def _wmbudg_numpy(model, wdir, input_data, auxlist):
+    """Compute the water mass and latent energy budgets in memory.
+
+    See wmbudg.
+    """
+    nbe = numpy_backend
+    hfls = nbe.load(
+        e.select_metadata(input_data, short_name='hfls',
+                          dataset=model)[0]['filename'])
+    p_r = nbe.load(
+        e.select_metadata(input_data, short_name='pr',
+                          dataset=model)[0]['filename'])
+    prsn = nbe.load(
+        e.select_metadata(input_data, short_name='prsn',
+                          dataset=model)[0]['filename'])
+    evap = nbe.load(auxlist[0])
+    prr = nbe.load(auxlist[1])
+    wmbudg_file = wdir + '/{}_wmb.nc'.format(model)
+    latene_file = wdir + '/{}_latent.nc'.format(model)
+    wmass_gmean = _write_eb_numpy(
+        nbe.apply(lambda eva, pre: eva - pre, evap, p_r), 'wmb', wmbudg_file)
+    latent_gmean = _write_eb_numpy(
+        nbe.apply(lambda lat, snow, rain: lat - (LC_SUB * snow + L_C * rain),
+                  hfls, prsn, prr), 'latent', latene_file)
+    varlist = [wmass_gmean, latent_gmean]
+    fileout = [wmbudg_file, latene_file]
+    return varlist, fileout
+
+
+def _write_eb_numpy(cube, nameout, d3_file):
+    """Write a field to file and compute its global annual means.
+
+    See write_eb.
+    """
+    nbe = numpy_backend
+    cube = nbe.to_float32(cube)
+    nbe.save(cube, nameout, d3_file)
+    yearly = nbe.yearmonmean(cube)
+    gmean = nbe.realise(
+        nbe.fldmean(yearly.lazy_data(), nbe.area_weights(yearly)))
+    return gmean[:, np.newaxis, np.newaxis]
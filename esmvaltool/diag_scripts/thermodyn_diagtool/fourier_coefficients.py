@@ -12,7 +12,7 @@ this is used for the computation of the Lorenz Energy Cycle.
 """
 
 import numpy as np
-from netCDF4 import Dataset
+from netCDF4 import Dataset, num2date
 
 GP_RES = np.array([16, 32, 48, 64, 96, 128, 256, 384, 512, 1024, 2048, 4096])
 FC_RES = np.array([5, 10, 15, 21, 31, 43, 85, 127, 171, 341, 683, 1365])
@@ -33,24 +33,82 @@ def fourier_coeff(tadiagfile, outfile, ta_input, tas_input):
     - tas_input: the name of a file containing t2m field.
     """
     with Dataset(ta_input) as dataset:
-        lon = dataset.variables['lon'][:]
         lat = dataset.variables['lat'][:]
         lev = dataset.variables['plev'][:]
-        time = dataset.variables['time'][:]
         t_a = dataset.variables['ta'][:, :, :, :]
         u_a = dataset.variables['ua'][:, :, :, :]
         v_a = dataset.variables['va'][:, :, :, :]
         wap = dataset.variables['wap'][:, :, :, :]
-    nlon = len(lon)
-    nlat = len(lat)
-    nlev = len(lev)
-    ntime = len(time)
-    i = np.min(np.where(2 * nlat <= GP_RES))
-    trunc = FC_RES[i] + 1
-    wave2 = np.linspace(0, trunc - 1, trunc)
     with Dataset(tas_input) as dataset:
         tas = dataset.variables['tas'][:, :, :]
     tas = tas[:, ::-1, :]
+    t_a = fill_ta(t_a, tas, lev)
+    pr_output_diag(t_a, ta_input, tadiagfile, 'ta')
+    dict_v, wave2 = spectral_coeff({
+        'ta': t_a,
+        'ua': u_a,
+        'va': v_a,
+        'wap': wap
+    }, len(lat))
+    file_desc = 'Fourier coefficients'
+    pr_output(dict_v, ta_input, outfile, file_desc, wave2)
+
+
+def fourier_coeff_year(ta_input, tas_input, year):
+    """Compute Fourier coefficients in lon direction for a single year.
+
+    Same as fourier_coeff, but the fields of the selected year are read
+    directly from the multi-year input files and the coefficients are
+    returned as arrays instead of being stored to NetCDF files.
+
+    Arguments:
+    ---------
+    - ta_input: the name of a file containing t,u,v,w fields;
+    - tas_input: the name of a file containing t2m field;
+    - year: the year to be selected.
+
+    Returns
+    -------
+    A dictionary with the Fourier coefficients of ta, ua, va, wap as
+    (time,level,lat,wave) and the coordinates plev, lat, time and wave.
+    """
+    with Dataset(ta_input) as dataset:
+        t_sl = _year_slice(dataset, year)
+        lat = dataset.variables['lat'][:]
+        lev = dataset.variables['plev'][:]
+        time = dataset.variables['time'][t_sl]
+        t_a = dataset.variables['ta'][t_sl, :, :, :]
+        u_a = dataset.variables['ua'][t_sl, :, :, :]
+        v_a = dataset.variables['va'][t_sl, :, :, :]
+        wap = dataset.variables['wap'][t_sl, :, :, :]
+    with Dataset(tas_input) as dataset:
+        tas = dataset.variables['tas'][_year_slice(dataset, year), :, :]
+    tas = tas[:, ::-1, :].astype(np.float32)
+    t_a = fill_ta(t_a, tas, lev)
+    coeffs, wave2 = spectral_coeff({
+        'ta': t_a,
+        'ua': u_a,
+        'va': v_a,
+        'wap': wap
+    }, len(lat))
+    coeffs.update({'plev': lev, 'lat': lat, 'time': time, 'wave': wave2})
+    return coeffs
+
+
+def fill_ta(t_a, tas, lev):
+    """Fill the temperature below the surface.
+
+    The temperature at the levels below the surface is extrapolated from
+    the near-surface temperature, assuming a standard lapse rate.
+
+    Arguments:
+    ---------
+    - t_a: the temperature field as (time,level,lat,lon), with values
+      below the surface set to 0;
+    - tas: the near-surface temperature field as (time,lat,lon);
+    - lev: the pressure levels.
+    """
+    ntime, nlev, nlat, nlon = np.shape(t_a)
     ta1_fx = np.array(t_a)
     deltat = np.zeros([ntime, nlev, nlat, nlon])
     p_s = np.full([ntime, nlat, nlon], P_0)
@@ -91,26 +149,35 @@ def fourier_coeff(tadiagfile, outfile, ta_input, tas_input):
         dat[i, :, :, :] = (ta2_fx[:, i, :, :] *
                            (1 - 1 * np.array(mask[i, :, :, :])))
         t_a[:, i, :, :] = dat[i, :, :, :] + tafr_bar[i, :, :, :]
-    pr_output_diag(t_a, ta_input, tadiagfile, 'ta')
-    tafft_p = np.fft.fft(t_a, axis=3)[:, :, :, :int(trunc / 2)] / (nlon)
-    uafft_p = np.fft.fft(u_a, axis=3)[:, :, :, :int(trunc / 2)] / (nlon)
-    vafft_p = np.fft.fft(v_a, axis=3)[:, :, :, :int(trunc / 2)] / (nlon)
-    wapfft_p = np.fft.fft(wap, axis=3)[:, :, :, :int(trunc / 2)] / (nlon)
-    tafft = np.zeros([ntime, nlev, nlat, trunc])
-    uafft = np.zeros([ntime, nlev, nlat, trunc])
-    vafft = np.zeros([ntime, nlev, nlat, trunc])
-    wapfft = np.zeros([ntime, nlev, nlat, trunc])
-    tafft[:, :, :, 0::2] = np.real(tafft_p)
-    tafft[:, :, :, 1::2] = np.imag(tafft_p)
-    uafft[:, :, :, 0::2] = np.real(uafft_p)
-    uafft[:, :, :, 1::2] = np.imag(uafft_p)
-    vafft[:, :, :, 0::2] = np.real(vafft_p)
-    vafft[:, :, :, 1::2] = np.imag(vafft_p)
-    wapfft[:, :, :, 0::2] = np.real(wapfft_p)
-    wapfft[:, :, :, 1::2] = np.imag(wapfft_p)
-    dict_v = {'ta': tafft, 'ua': uafft, 'va': vafft, 'wap': wapfft}
-    file_desc = 'Fourier coefficients'
-    pr_output(dict_v, ta_input, outfile, file_desc, wave2)
+    return t_a
+
+
+def spectral_coeff(fields, nlat):
+    """Compute the truncated Fourier coefficients in lon direction.
+
+    Arguments:
+    ---------
+    - fields: a dictionary of fields as (time,level,lat,lon);
+    - nlat: the number of latitudes, determining the spectral truncation.
+
+    Returns
+    -------
+    A dictionary with the coefficients as (time,level,lat,wave), real and
+    imaginary parts alternating along the wave dimension, and the array
+    of zonal wavenumbers.
+    """
+    i = np.min(np.where(2 * nlat <= GP_RES))
+    trunc = FC_RES[i] + 1
+    wave2 = np.linspace(0, trunc - 1, trunc)
+    dict_v = {}
+    for key, fld in fields.items():
+        nlon = np.shape(fld)[3]
+        fft_p = np.fft.fft(fld, axis=3)[:, :, :, :int(trunc / 2)] / (nlon)
+        coeff = np.zeros(np.shape(fld)[0:3] + (trunc, ))
+        coeff[:, :, :, 0::2] = np.real(fft_p)
+        coeff[:, :, :, 1::2] = np.imag(fft_p)
+        dict_v[key] = coeff
+    return dict_v, wave2
 
 
 def pr_output(dict_v, nc_f, fileo, file_desc, wave2):
@@ -307,3 +374,18 @@ def varatts(w_nc_var, varname):
             'units': "Pa s-1",
             'level_desc': 'pressure levels'
         })
+
+
+def _year_slice(dataset, year):
+    """Get the slice of the time dimension covering a year.
+
+    Arguments:
+    ---------
+    - dataset: a NetCDF dataset with a time coordinate;
+    - year: the year to be selected.
+    """
+    time = dataset.variables['time']
+    dates = num2date(time[:], time.units,
+                     getattr(time, 'calendar', 'standard'))
+    index = np.where(np.array([date.year for date in dates]) == int(year))[0]
+    return slice(index[0], index[-1] + 1)
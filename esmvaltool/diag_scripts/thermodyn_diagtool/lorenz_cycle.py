@@ -6,7 +6,6 @@ The module contains the following functions:
               NetCDF files and providing a flux diagram and a table outputs,
               the latter separately for the two hemispheres;
     - averages: a script computing time, global and zonal averages;
-    - averages_comp: a script computing global mean of the output fields;
     - bsslzr: it contains the coefficients for the conversion from regular
               lonlat grid to Gaussian grid;
     - diagram: it is the interface between the main program and a
@@ -28,6 +27,8 @@ The module contains the following functions:
                       from imaginary part of the Fourier coefficients,
                       reordering the latitudinal dimension (from N to S),
                       interpolating on a reference sigma coordinate,
+    - lec_years: computes the LEC for each year in parallel, passing the
+                 Fourier coefficients in memory;
     - pr_output: prints a single component of the LEC computations to a
                  single Nc file;
     - removeif: removes a file if it exists;
@@ -36,6 +37,9 @@ The module contains the following functions:
              the reservoirs;
     - table_conv: prints the global and hemispheric mean values of the
                   conversion terms;
+    - transient_terms: computes the time mean transient eddy reservoirs and
+                       conversion terms, processing blocks of time steps
+                       at once;
     - varatts: prints the attributes of a variable in a Nc file;
     - weights: computes the weights for vertical integrations and meridional
                averages;
@@ -51,6 +55,7 @@ References.
 import math
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 from cdo import Cdo
@@ -70,7 +75,14 @@ NW_2 = 9
 NW_3 = 21
 
 
-def lorenz(outpath, model, year, filenc, plotfile, logfile):
+def lorenz(outpath,
+           model,
+           year,
+           filenc,
+           plotfile,
+           logfile,
+           chunk_size=None,
+           coeffs=None):
     """Manage input and output fields and calling functions.
 
     Receive fields t,u,v,w as input fields in Fourier
@@ -80,13 +92,21 @@ def lorenz(outpath, model, year, filenc, plotfile, logfile):
         - outpath: ath where otput fields are stored (as NetCDF fields);
         - model: name of the model that is analysed;
         - year: year that is considered;
-        - filenc: name of the file containing the input fields;
+        - filenc: name of the file containing the input fields (if coeffs
+          is given, only the metadata of the latitudes and levels are
+          taken from it);
         - plotfile: name of the file that will contain the flux diagram;
-        - logfile: name of the file containing the table as a .txt file.
+        - logfile: name of the file containing the table as a .txt file;
+        - chunk_size: the number of time steps that are processed at once
+          (all of them if None);
+        - coeffs: a dictionary with the Fourier coefficients and
+          coordinates, as returned by
+          fourier_coefficients.fourier_coeff_year, replacing the input
+          fields in filenc.
     """
-    ta_c, ua_c, va_c, wap_c, dims, lev, lat, log = init(logfile, filenc)
+    ta_c, ua_c, va_c, wap_c, dims, lev, lat, wave, log = init(
+        logfile, filenc, coeffs)
     nlev = int(dims[0])
-    ntime = int(dims[1])
     nlat = int(dims[2])
     ntp = int(dims[3])
     d_s, y_l, g_w = weights(lev, nlev, lat)
@@ -98,56 +118,25 @@ def lorenz(outpath, model, year, filenc, plotfile, logfile):
     wap_tmn = np.nanmean(wap_c, axis=1)
     _, wap_gmn = averages(wap_tmn, g_w)
     # Compute stability parameter
-    gam_ztmn = np.zeros([nlev, nlat])
-    for l_l in range(nlat):
-        gam_ztmn[:, l_l] = stabil(ta_ztmn[:, l_l], lev, nlev)
+    gam_ztmn = stabil(ta_ztmn, lev, nlev)
     gam_tmn = stabil(ta_gmn, lev, nlev)
-    e_k = np.zeros([nlev, ntime, nlat, ntp - 1])
-    ape = np.zeros([nlev, ntime, nlat, ntp - 1])
-    a2k = np.zeros([nlev, ntime, nlat, ntp - 1])
-    ae2az = np.zeros([nlev, ntime, nlat, ntp - 1])
-    ke2kz = np.zeros([nlev, ntime, nlat, ntp - 1])
-    at2as = np.zeros([nlev, ntime, nlat, ntp - 1])
-    kt2ks = np.zeros([nlev, ntime, nlat, ntp - 1])
-    for t_t in range(ntime):
-        ta_tan = ta_c[:, t_t, :, :] - ta_tmn
-        ua_tan = ua_c[:, t_t, :, :] - ua_tmn
-        va_tan = va_c[:, t_t, :, :] - va_tmn
-        wap_tan = wap_c[:, t_t, :, :] - wap_tmn
-        # Compute zonal means
-        _, ta_tgan = averages(ta_tan, g_w)
-        _, wap_tgan = averages(wap_tan, g_w)
-        # Compute kinetic energy
-        e_k[:, t_t, :, :] = makek(ua_tan, va_tan)
-        # Compute available potential energy
-        ape[:, t_t, :, :] = makea(ta_tan, ta_tgan, gam_tmn)
-        # Compute conversion between kin.en. and pot.en.
-        a2k[:, t_t, :, :] = mka2k(wap_tan, ta_tan, wap_tgan, ta_tgan, lev)
-        # Compute conversion between zonal and eddy APE
-        ae2az[:, t_t, :, :] = mkaeaz(va_tan, wap_tan, ta_tan, ta_tmn, ta_gmn,
-                                     lev, y_l, gam_tmn, nlat, nlev)
-        # Compute conversion between zonal and eddy KE
-        ke2kz[:, t_t, :, :] = mkkekz(ua_tan, va_tan, wap_tan, ua_tmn, va_tmn,
-                                     lev, y_l, nlat, ntp, nlev)
-        # Compute conversion between stationary and transient eddy APE
-        at2as[:, t_t, :, :] = mkatas(ua_tan, va_tan, wap_tan, ta_tan, ta_ztmn,
-                                     gam_ztmn, lev, y_l, nlat, ntp, nlev)
-        # Compute conversion between stationary and transient eddy KE
-        kt2ks[:, t_t, :, :] = mkktks(ua_tan, va_tan, ua_tmn, va_tmn, y_l, nlat,
-                                     ntp, nlev)
-    ek_tgmn = averages_comp(e_k, g_w, d_s, dims)
+    trans = transient_terms([ta_c, ua_c, va_c, wap_c],
+                            [ta_tmn, ua_tmn, va_tmn, wap_tmn],
+                            [ta_ztmn, ta_gmn, gam_ztmn, gam_tmn], lev, y_l,
+                            g_w, chunk_size)
+    ek_tgmn = globall_cg(trans['ek'], g_w, d_s, dims)
     table(ek_tgmn, ntp, 'TOT. KIN. EN.    ', logfile, flag=0)
-    ape_tgmn = averages_comp(ape, g_w, d_s, dims)
+    ape_tgmn = globall_cg(trans['ape'], g_w, d_s, dims)
     table(ape_tgmn, ntp, 'TOT. POT. EN.   ', logfile, flag=0)
-    a2k_tgmn = averages_comp(a2k, g_w, d_s, dims)
+    a2k_tgmn = globall_cg(trans['a2k'], g_w, d_s, dims)
     table(a2k_tgmn, ntp, 'KE -> APE (trans) ', logfile, flag=1)
-    ae2az_tgmn = averages_comp(ae2az, g_w, d_s, dims)
+    ae2az_tgmn = globall_cg(trans['ae2az'], g_w, d_s, dims)
     table(ae2az_tgmn, ntp, 'AZ <-> AE (trans) ', logfile, flag=1)
-    ke2kz_tgmn = averages_comp(ke2kz, g_w, d_s, dims)
+    ke2kz_tgmn = globall_cg(trans['ke2kz'], g_w, d_s, dims)
     table(ke2kz_tgmn, ntp, 'KZ <-> KE (trans) ', logfile, flag=1)
-    at2as_tgmn = averages_comp(at2as, g_w, d_s, dims)
+    at2as_tgmn = globall_cg(trans['at2as'], g_w, d_s, dims)
     table(at2as_tgmn, ntp, 'ASE  <->  ATE   ', logfile, flag=1)
-    kt2ks_tgmn = averages_comp(kt2ks, g_w, d_s, dims)
+    kt2ks_tgmn = globall_cg(trans['kt2ks'], g_w, d_s, dims)
     table(kt2ks_tgmn, ntp, 'KSE  <->  KTE   ', logfile, flag=1)
     ek_st = makek(ua_tmn, va_tmn)
     ek_stgmn = globall_cg(ek_st, g_w, d_s, dims)
@@ -171,16 +160,9 @@ def lorenz(outpath, model, year, filenc, plotfile, logfile):
         a2k_tgmn, a2k_stgmn, at2as_tgmn, kt2ks_tgmn, ke2kz_tgmn, ke2kz_stgmn
     ]
     lec_strength = diagram(plotfile, list_diag, dims)
-    nc_f = outpath + '/ek_tmap_{}_{}.nc'.format(model, year)
-    output(e_k, d_s, filenc, 'ek', nc_f)
-    nc_f = outpath + '/ape_tmap_{}_{}.nc'.format(model, year)
-    output(ape, d_s, filenc, 'ape', nc_f)
-    nc_f = outpath + '/a2k_tmap_{}_{}.nc'.format(model, year)
-    output(a2k, d_s, filenc, 'a2k', nc_f)
-    nc_f = outpath + '/ae2az_tmap_{}_{}.nc'.format(model, year)
-    output(ae2az, d_s, filenc, 'ae2az', nc_f)
-    nc_f = outpath + '/ke2kz_tmap_{}_{}.nc'.format(model, year)
-    output(ke2kz, d_s, filenc, 'ke2kz', nc_f)
+    for name in ['ek', 'ape', 'a2k', 'ae2az', 'ke2kz']:
+        nc_f = outpath + '/{}_tmap_{}_{}.nc'.format(name, model, year)
+        output(trans[name], d_s, filenc, name, nc_f, wave)
     log.close()
     return lec_strength
 
@@ -189,28 +171,15 @@ def averages(x_c, g_w):
     """Compute time, zonal and global mean averages of initial fields.
 
     Arguments:
-    - x_c: the input field as (lev, lat, wave);
+    - x_c: the input field as (lev, lat, wave), optionally with leading
+      time dimension;
     - g_w: the Gaussian weights for meridional averaging;
     """
-    xc_ztmn = np.squeeze(np.real(x_c[:, :, 0]))
-    xc_gmn = np.nansum(xc_ztmn * g_w[np.newaxis, :], axis=1) / np.nansum(g_w)
+    xc_ztmn = np.real(x_c[..., 0])
+    xc_gmn = np.nansum(xc_ztmn * g_w, axis=-1) / np.nansum(g_w)
     return xc_ztmn, xc_gmn
 
 
-def averages_comp(fld, g_w, d_s, dims):
-    """Compute the global mean averages of reservoirs and conversion terms.
-
-    Arguments:
-    - fld: the component of the LEC (time, lev, lat, wave);
-    - g_w: the Gaussian weights for meridional averaging;
-    - d_s: the Delta sigma of the sigma levels;
-    - dims: a list containing the dimensions length0;
-    """
-    fld_tmn = np.nanmean(fld, axis=1)
-    fld_tgmn = globall_cg(fld_tmn, g_w, d_s, dims)
-    return fld_tgmn
-
-
 def bsslzr(kdim):
     """Obtain parameters for the Gaussian coefficients.
 
@@ -397,7 +366,7 @@ def globall_cg(d3v, g_w, d_s, dims):
     return gmn
 
 
-def init(logfile, filep):
+def init(logfile, filep, coeffs=None):
     """Ingest input fields as complex fields and initialise tables.
 
     Receive fields t,u,v,w as input fields in Fourier
@@ -406,7 +375,9 @@ def init(logfile, filep):
 
     Arguments:
         - filenc: name of the file containing the input fields;
-        - logfile: name of the file containing the table as a .txt file.
+        - logfile: name of the file containing the table as a .txt file;
+        - coeffs: a dictionary containing the input fields, if they are not
+          read from filenc.
     """
     with open(logfile, 'w') as log:
         log.write('########################################################\n')
@@ -414,14 +385,21 @@ def init(logfile, filep):
         log.write('#      LORENZ     ENERGY    CYCLE                      #\n')
         log.write('#                                                      #\n')
         log.write('########################################################\n')
-    with Dataset(filep) as dataset0:
-        t_a = dataset0.variables['ta'][:, :, :, :]
-        u_a = dataset0.variables['ua'][:, :, :, :]
-        v_a = dataset0.variables['va'][:, :, :, :]
-        wap = dataset0.variables['wap'][:, :, :, :]
-        lev = dataset0.variables['plev'][:]
-        time = dataset0.variables['time'][:]
-        lat = dataset0.variables['lat'][:]
+    if coeffs is None:
+        with Dataset(filep) as dataset0:
+            coeffs = {
+                name: dataset0.variables[name][:]
+                for name in ['ta', 'ua', 'va', 'wap', 'plev', 'time', 'lat',
+                             'wave']
+            }
+    t_a = coeffs['ta']
+    u_a = coeffs['ua']
+    v_a = coeffs['va']
+    wap = coeffs['wap']
+    lev = coeffs['plev']
+    time = coeffs['time']
+    lat = coeffs['lat']
+    wave = coeffs['wave']
     nfc = np.shape(t_a)[3]
     nlev = len(lev)
     ntime = len(time)
@@ -468,7 +446,7 @@ def init(logfile, filep):
         log.write('  \n')
         log.write('                            I GLOBAL I NORTH I SOUTH I\n')
         log.write('------------------------------------------------------\n')
-    return ta_c, ua_c, va_c, wap_c, dims, lev, lat, log
+    return ta_c, ua_c, va_c, wap_c, dims, lev, lat, wave, log
 
 
 def makek(u_t, v_t):
@@ -481,8 +459,8 @@ def makek(u_t, v_t):
     ck1 = u_t * np.conj(u_t)
     ck2 = v_t * np.conj(v_t)
     e_k = np.real(ck1 + ck2)
-    e_k[:, :, 0] = 0.5 * np.real(u_t[:, :, 0] * u_t[:, :, 0] +
-                                 v_t[:, :, 0] * v_t[:, :, 0])
+    e_k[..., 0] = 0.5 * np.real(u_t[..., 0] * u_t[..., 0] +
+                                v_t[..., 0] * v_t[..., 0])
     return e_k
 
 
@@ -495,9 +473,9 @@ def makea(t_t, t_g, gam):
     - gam: a vertical profile of the stability parameter;
     """
     ape = gam[:, np.newaxis, np.newaxis] * np.real(t_t * np.conj(t_t))
-    ape[:, :, 0] = (gam[:, np.newaxis] * 0.5 * np.real(
-        (t_t[:, :, 0] - t_g[:, np.newaxis]) *
-        (t_t[:, :, 0] - t_g[:, np.newaxis])))
+    ape[..., 0] = (gam[:, np.newaxis] * 0.5 * np.real(
+        (t_t[..., 0] - t_g[..., np.newaxis]) *
+        (t_t[..., 0] - t_g[..., np.newaxis])))
     return ape
 
 
@@ -513,9 +491,9 @@ def mka2k(wap, t_t, w_g, t_g, p_l):
     """
     a2k = -(R / p_l[:, np.newaxis, np.newaxis] *
             (t_t * np.conj(wap) + np.conj(t_t) * wap))
-    a2k[:, :, 0] = -(R / p_l[:, np.newaxis] *
-                     (t_t[:, :, 0] - t_g[:, np.newaxis]) *
-                     (wap[:, :, 0] - w_g[:, np.newaxis]))
+    a2k[..., 0] = -(R / p_l[:, np.newaxis] *
+                    (t_t[..., 0] - t_g[..., np.newaxis]) *
+                    (wap[..., 0] - w_g[..., np.newaxis]))
     return a2k
 
 
@@ -533,48 +511,17 @@ def mkaeaz(v_t, wap, t_t, ttt, ttg, p_l, lat, gam, nlat, nlev):
     - nlat: the number of latitudes;
     - nlev: the number of levels;
     """
-    dtdp = np.zeros([nlev, nlat])
-    dtdy = np.zeros([nlev, nlat])
-    for l_l in np.arange(nlev):
-        if l_l == 0:
-            t_1 = np.real(ttt[l_l, :, 0]) - ttg[l_l]
-            t_2 = np.real(ttt[l_l + 1, :, 0]) - ttg[l_l + 1]
-            dtdp[l_l, :] = (t_2 - t_1) / (p_l[l_l + 1] - p_l[l_l])
-        elif l_l == nlev - 1:
-            t_1 = np.real(ttt[l_l - 1, :, 0]) - ttg[l_l - 1]
-            t_2 = np.real(ttt[l_l, :, 0]) - ttg[l_l]
-            dtdp[l_l, :] = (t_2 - t_1) / (p_l[l_l] - p_l[l_l - 1])
-        else:
-            t_1 = np.real(ttt[l_l, :, 0]) - ttg[l_l]
-            t_2 = np.real(ttt[l_l + 1, :, 0]) - ttg[l_l + 1]
-            dtdp1 = (t_2 - t_1) / (p_l[l_l + 1] - p_l[l_l])
-            t_2 = t_1
-            t_1 = np.real(ttt[l_l - 1, :, 0]) - ttg[l_l - 1]
-            dtdp2 = (t_2 - t_1) / (p_l[l_l] - p_l[l_l - 1])
-            dtdp[l_l, :] = ((dtdp1 * (p_l[l_l] - p_l[l_l - 1]) + dtdp2 *
-                             (p_l[l_l + 1] - p_l[l_l])) /
-                            (p_l[l_l + 1] - p_l[l_l - 1]))
-        dtdp[l_l, :] = dtdp[l_l, :] - (R / (CP * p_l[l_l]) *
-                                       (ttt[l_l, :, 0] - ttg[l_l]))
-    for i_l in np.arange(nlat):
-        if i_l == 0:
-            t_1 = np.real(ttt[:, i_l, 0])
-            t_2 = np.real(ttt[:, i_l + 1, 0])
-            dtdy[:, i_l] = (t_2 - t_1) / (lat[i_l + 1] - lat[i_l])
-        elif i_l == nlat - 1:
-            t_1 = np.real(ttt[:, i_l - 1, 0])
-            t_2 = np.real(ttt[:, i_l, 0])
-            dtdy[:, i_l] = (t_2 - t_1) / (lat[i_l] - lat[i_l - 1])
-        else:
-            t_1 = np.real(ttt[:, i_l - 1, 0])
-            t_2 = np.real(ttt[:, i_l + 1, 0])
-            dtdy[:, i_l] = (t_2 - t_1) / (lat[i_l + 1] - lat[i_l - 1])
+    dtdp = _vert_deriv(np.real(ttt[:, :, 0]) - ttg[:, np.newaxis], p_l)
+    dtdp = dtdp - np.real(R / (CP * p_l[:, np.newaxis]) *
+                          (ttt[:, :, 0] - ttg[:, np.newaxis]))
+    d_t, d_lat = _lat_diff(np.real(ttt[:, :, 0]), lat)
+    dtdy = d_t / d_lat
     dtdy = dtdy / AA
     c_1 = np.real(v_t * np.conj(t_t) + t_t * np.conj(v_t))
     c_2 = np.real(wap * np.conj(t_t) + t_t * np.conj(wap))
     ae2az = (gam[:, np.newaxis, np.newaxis] *
              (dtdy[:, :, np.newaxis] * c_1 + dtdp[:, :, np.newaxis] * c_2))
-    ae2az[:, :, 0] = 0.
+    ae2az[..., 0] = 0.
     return ae2az
 
 
@@ -593,81 +540,27 @@ def mkkekz(u_t, v_t, wap, utt, vtt, p_l, lat, nlat, ntp, nlev):
     - ntp: the number of wavenumbers;
     - nlev: the number of vertical levels;
     """
-    dudp = np.zeros([nlev, nlat])
-    dvdp = np.zeros([nlev, nlat])
-    dudy = np.zeros([nlev, nlat])
-    dvdy = np.zeros([nlev, nlat])
-    for l_l in np.arange(nlev):
-        if l_l == 0:
-            dudp[l_l, :] = ((np.real(utt[l_l + 1, :, 0] - utt[l_l, :, 0])) /
-                            (p_l[l_l + 1] - p_l[l_l]))
-            dvdp[l_l, :] = ((np.real(vtt[l_l + 1, :, 0] - vtt[l_l, :, 0])) /
-                            (p_l[l_l + 1] - p_l[l_l]))
-        elif l_l == nlev - 1:
-            dudp[l_l, :] = ((np.real(utt[l_l, :, 0] - utt[l_l - 1, :, 0])) /
-                            (p_l[l_l] - p_l[l_l - 1]))
-            dvdp[l_l, :] = ((np.real(vtt[l_l, :, 0] - vtt[l_l - 1, :, 0])) /
-                            (p_l[l_l] - p_l[l_l - 1]))
-        else:
-            dudp1 = ((np.real(utt[l_l + 1, :, 0] - utt[l_l, :, 0])) /
-                     (p_l[l_l + 1] - p_l[l_l]))
-            dvdp1 = ((np.real(vtt[l_l + 1, :, 0] - vtt[l_l, :, 0])) /
-                     (p_l[l_l + 1] - p_l[l_l]))
-            dudp2 = ((np.real(utt[l_l, :, 0] - utt[l_l - 1, :, 0])) /
-                     (p_l[l_l] - p_l[l_l - 1]))
-            dvdp2 = ((np.real(vtt[l_l, :, 0] - vtt[l_l - 1, :, 0])) /
-                     (p_l[l_l] - p_l[l_l - 1]))
-            dudp[l_l, :] = ((dudp1 * (p_l[l_l] - p_l[l_l - 1]) + dudp2 *
-                             (p_l[l_l + 1] - p_l[l_l])) /
-                            (p_l[l_l + 1] - p_l[l_l - 1]))
-            dvdp[l_l, :] = ((dvdp1 * (p_l[l_l] - p_l[l_l - 1]) + dvdp2 *
-                             (p_l[l_l + 1] - p_l[l_l])) /
-                            (p_l[l_l + 1] - p_l[l_l - 1]))
-    for i_l in np.arange(nlat):
-        if i_l == 0:
-            dudy[:, i_l] = ((np.real(utt[:, i_l + 1, 0] - utt[:, i_l, 0])) /
-                            (lat[i_l + 1] - lat[i_l]))
-            dvdy[:, i_l] = ((np.real(vtt[:, i_l + 1, 0] - vtt[:, i_l, 0])) /
-                            (lat[i_l + 1] - lat[i_l]))
-        elif i_l == nlat - 1:
-            dudy[:, i_l] = ((np.real(utt[:, i_l, 0] - utt[:, i_l - 1, 0])) /
-                            (lat[i_l] - lat[i_l - 1]))
-            dvdy[:, i_l] = ((np.real(vtt[:, i_l, 0] - vtt[:, i_l - 1, 0])) /
-                            (lat[i_l] - lat[i_l - 1]))
-        else:
-            dudy[:, i_l] = (
-                (np.real(utt[:, i_l + 1, 0] - utt[:, i_l - 1, 0])) /
-                (lat[i_l + 1] - lat[i_l - 1]))
-            dvdy[:, i_l] = (
-                (np.real(vtt[:, i_l + 1, 0] - vtt[:, i_l - 1, 0])) /
-                (lat[i_l + 1] - lat[i_l - 1]))
-    dudy = dudy / AA
-    dvdy = dvdy / AA
-    c_1 = np.zeros([nlev, nlat, ntp - 1])
-    c_2 = np.zeros([nlev, nlat, ntp - 1])
-    c_3 = np.zeros([nlev, nlat, ntp - 1])
-    c_4 = np.zeros([nlev, nlat, ntp - 1])
-    c_5 = np.zeros([nlev, nlat, ntp - 1])
-    c_6 = np.zeros([nlev, nlat, ntp - 1])
+    dudp = _vert_deriv(np.real(utt[:, :, 0]), p_l)
+    dvdp = _vert_deriv(np.real(vtt[:, :, 0]), p_l)
+    d_u, d_lat = _lat_diff(np.real(utt[:, :, 0]), lat)
+    d_v, _ = _lat_diff(np.real(vtt[:, :, 0]), lat)
+    dudy = d_u / d_lat / AA
+    dvdy = d_v / d_lat / AA
     u_u = u_t * np.conj(u_t) + u_t * np.conj(u_t)
     u_v = u_t * np.conj(v_t) + v_t * np.conj(u_t)
     v_v = v_t * np.conj(v_t) + v_t * np.conj(v_t)
     u_w = u_t * np.conj(wap) + wap * np.conj(u_t)
     v_w = v_t * np.conj(wap) + wap * np.conj(v_t)
-    for i_l in np.arange(nlat):
-        c_1[:, i_l, :] = dudy[:, i_l][:, np.newaxis] * u_v[:, i_l, :]
-        c_2[:, i_l, :] = dvdy[:, i_l][:, np.newaxis] * v_v[:, i_l, :]
-        c_5[:, i_l, :] = (np.tan(lat[i_l]) / AA *
-                          np.real(utt[:, i_l, 0])[:, np.newaxis] *
-                          (u_v[:, i_l, :]))
-        c_6[:, i_l, :] = -(np.tan(lat[i_l]) / AA *
-                           np.real(vtt[:, i_l, 0])[:, np.newaxis] *
-                           (u_u[:, i_l, :]))
-    for l_l in np.arange(nlev):
-        c_3[l_l, :, :] = dudp[l_l, :][:, np.newaxis] * u_w[l_l, :, :]
-        c_4[l_l, :, :] = dvdp[l_l, :][:, np.newaxis] * v_w[l_l, :, :]
+    c_1 = np.real(dudy[:, :, np.newaxis] * u_v)
+    c_2 = np.real(dvdy[:, :, np.newaxis] * v_v)
+    c_3 = np.real(dudp[:, :, np.newaxis] * u_w)
+    c_4 = np.real(dvdp[:, :, np.newaxis] * v_w)
+    c_5 = np.real((np.tan(lat) / AA * np.real(utt[:, :, 0]))[:, :, np.newaxis]
+                  * u_v)
+    c_6 = -np.real((np.tan(lat) / AA * np.real(vtt[:, :, 0]))[:, :, np.newaxis]
+                   * u_u)
     ke2kz = (c_1 + c_2 + c_3 + c_4 + c_5 + c_6)
-    ke2kz[:, :, 0] = 0.
+    ke2kz[..., 0] = 0.
     return ke2kz
 
 
@@ -687,64 +580,26 @@ def mkatas(u_t, v_t, wap, t_t, ttt, g_w, p_l, lat, nlat, ntp, nlev):
     - ntp: the number of wavenumbers;
     - nlev: the number of vertical levels;
     """
-    t_r = np.fft.ifft(t_t, axis=2)
-    u_r = np.fft.ifft(u_t, axis=2)
-    v_r = np.fft.ifft(v_t, axis=2)
-    w_r = np.fft.ifft(wap, axis=2)
+    t_r = np.fft.ifft(t_t, axis=-1)
+    u_r = np.fft.ifft(u_t, axis=-1)
+    v_r = np.fft.ifft(v_t, axis=-1)
+    w_r = np.fft.ifft(wap, axis=-1)
     tur = t_r * u_r
     tvr = t_r * v_r
     twr = t_r * w_r
-    t_u = np.fft.fft(tur, axis=2)
-    t_v = np.fft.fft(tvr, axis=2)
-    t_w = np.fft.fft(twr, axis=2)
+    t_u = np.fft.fft(tur, axis=-1)
+    t_v = np.fft.fft(tvr, axis=-1)
+    t_w = np.fft.fft(twr, axis=-1)
     c_1 = (t_u * np.conj(ttt[:, :, np.newaxis]) -
            ttt[:, :, np.newaxis] * np.conj(t_u))
     c_6 = (t_w * np.conj(ttt[:, :, np.newaxis]) -
            ttt[:, :, np.newaxis] * np.conj(t_w))
-    c_2 = np.zeros([nlev, nlat, ntp - 1])
-    c_3 = np.zeros([nlev, nlat, ntp - 1])
-    c_5 = np.zeros([nlev, nlat, ntp - 1])
-    for i_l in range(nlat):
-        if i_l == 0:
-            c_2[:, i_l, :] = (
-                t_v[:, i_l, :] / (AA * (lat[i_l + 1] - lat[i_l])) *
-                np.conj(ttt[:, i_l + 1, np.newaxis] - ttt[:, i_l, np.newaxis]))
-            c_3[:, i_l, :] = (
-                np.conj(t_v[:, i_l, :]) / (AA * (lat[i_l + 1] - lat[i_l])) *
-                (ttt[:, i_l + 1, np.newaxis] - ttt[:, i_l, np.newaxis]))
-        elif i_l == nlat - 1:
-            c_2[:, i_l, :] = (
-                t_v[:, i_l, :] / (AA * (lat[i_l] - lat[i_l - 1])) *
-                np.conj(ttt[:, i_l, np.newaxis] - ttt[:, i_l - 1, np.newaxis]))
-            c_3[:, i_l, :] = (
-                np.conj(t_v[:, i_l, :]) / (AA * (lat[i_l] - lat[i_l - 1])) *
-                (ttt[:, i_l, np.newaxis] - ttt[:, i_l - 1, np.newaxis]))
-        else:
-            c_2[:, i_l, :] = (t_v[:, i_l, :] /
-                              (AA * (lat[i_l + 1] - lat[i_l - 1])) *
-                              np.conj(ttt[:, i_l + 1, np.newaxis] -
-                                      ttt[:, i_l - 1, np.newaxis]))
-            c_3[:, i_l, :] = (
-                np.conj(t_v[:, i_l, :]) / (AA *
-                                           (lat[i_l + 1] - lat[i_l - 1])) *
-                (ttt[:, i_l + 1, np.newaxis] - ttt[:, i_l - 1, np.newaxis]))
-    for l_l in range(nlev):
-        if l_l == 0:
-            c_5[l_l, :, :] = (
-                (ttt[l_l + 1, :, np.newaxis] - ttt[l_l, :, np.newaxis]) /
-                (p_l[l_l + 1] - p_l[l_l]))
-        elif l_l == nlev - 1:
-            c_5[l_l, :, :] = (
-                (ttt[l_l, :, np.newaxis] - ttt[l_l - 1, :, np.newaxis]) /
-                (p_l[l_l] - p_l[l_l - 1]))
-        else:
-            c51 = ((ttt[l_l + 1, :, np.newaxis] - ttt[l_l, :, np.newaxis]) /
-                   (p_l[l_l + 1] - p_l[l_l]))
-            c52 = ((ttt[l_l, :, np.newaxis] - ttt[l_l - 1, :, np.newaxis]) /
-                   (p_l[l_l] - p_l[l_l - 1]))
-            c_5[l_l, :, :] = ((c51 * (p_l[l_l] - p_l[l_l - 1]) + c52 *
-                               (p_l[l_l + 1] - p_l[l_l])) /
-                              (p_l[l_l + 1] - p_l[l_l - 1]))
+    d_t, d_lat = _lat_diff(ttt, lat)
+    c_2 = np.real(t_v / (AA * d_lat[:, np.newaxis]) *
+                  np.conj(d_t[:, :, np.newaxis]))
+    c_3 = np.real(np.conj(t_v) / (AA * d_lat[:, np.newaxis]) *
+                  d_t[:, :, np.newaxis])
+    c_5 = _vert_deriv(ttt, p_l)[:, :, np.newaxis]
     k_k = np.arange(0, ntp - 1)
     at2as = (((k_k - 1)[np.newaxis, np.newaxis, :] * np.imag(c_1) /
               (AA * np.cos(lat[np.newaxis, :, np.newaxis])) +
@@ -752,7 +607,7 @@ def mkatas(u_t, v_t, wap, t_t, ttt, g_w, p_l, lat, nlat, ntp, nlev):
               np.real(c_2 + c_3) + R /
               (CP * p_l[:, np.newaxis, np.newaxis]) * np.real(c_6)) *
              g_w[:, :, np.newaxis])
-    at2as[:, :, 0] = 0.
+    at2as[..., 0] = 0.
     return at2as
 
 
@@ -769,34 +624,20 @@ def mkktks(u_t, v_t, utt, vtt, lat, nlat, ntp, nlev):
     - ntp: the number of wavenumbers;
     - nlev: the number of vertical levels;
     """
-    dut = np.zeros([nlev, nlat, ntp - 1])
-    dvt = np.zeros([nlev, nlat, ntp - 1])
-    dlat = np.zeros([nlat])
-    u_r = np.fft.irfft(u_t, axis=2)
-    v_r = np.fft.irfft(v_t, axis=2)
+    u_r = np.fft.irfft(u_t, axis=-1)
+    v_r = np.fft.irfft(v_t, axis=-1)
     uur = u_r * u_r
     uvr = u_r * v_r
     vvr = v_r * v_r
-    u_u = np.fft.rfft(uur, axis=2)
-    v_v = np.fft.rfft(vvr, axis=2)
-    u_v = np.fft.rfft(uvr, axis=2)
+    u_u = np.fft.rfft(uur, axis=-1)
+    v_v = np.fft.rfft(vvr, axis=-1)
+    u_v = np.fft.rfft(uvr, axis=-1)
     c_1 = u_u * np.conj(u_t) - u_t * np.conj(u_u)
     # c_3 = u_v * np.conj(u_t) + u_t * np.conj(u_v)
     c_5 = u_u * np.conj(v_t) + v_t * np.conj(u_u)
     c_6 = u_v * np.conj(v_t) - v_t * np.conj(u_v)
-    for i_l in range(nlat):
-        if i_l == 0:
-            dut[:, i_l, :] = (utt[:, i_l + 1, :] - utt[:, i_l, :])
-            dvt[:, i_l, :] = (vtt[:, i_l + 1, :] - vtt[:, i_l, :])
-            dlat[i_l] = (lat[i_l + 1] - lat[i_l])
-        elif i_l == nlat - 1:
-            dut[:, i_l, :] = (utt[:, i_l, :] - utt[:, i_l - 1, :])
-            dvt[:, i_l, :] = (vtt[:, i_l, :] - vtt[:, i_l - 1, :])
-            dlat[i_l] = (lat[i_l] - lat[i_l - 1])
-        else:
-            dut[:, i_l, :] = (utt[:, i_l + 1, :] - utt[:, i_l - 1, :])
-            dvt[:, i_l, :] = (vtt[:, i_l + 1, :] - vtt[:, i_l - 1, :])
-            dlat[i_l] = (lat[i_l + 1] - lat[i_l - 1])
+    dut, dlat = _lat_diff(np.real(utt), lat)
+    dvt, _ = _lat_diff(np.real(vtt), lat)
     c21 = np.conj(u_u) * dut / dlat[np.newaxis, :, np.newaxis]
     c22 = u_u * np.conj(dut) / dlat[np.newaxis, :, np.newaxis]
     c41 = np.conj(v_v) * dvt / dlat[np.newaxis, :, np.newaxis]
@@ -806,11 +647,11 @@ def mkktks(u_t, v_t, utt, vtt, lat, nlat, ntp, nlev):
              np.tan(lat)[np.newaxis, :, np.newaxis] * np.real(c_1 - c_5) / AA +
              np.imag(c_1 + c_6) * (k_k - 1)[np.newaxis, np.newaxis, :] /
              (AA * np.cos(lat)[np.newaxis, :, np.newaxis]))
-    kt2ks[:, :, 0] = 0
+    kt2ks[..., 0] = 0
     return kt2ks
 
 
-def output(fld, d_s, filenc, name, nc_f):
+def output(fld, d_s, filenc, name, nc_f, wave):
     """Compute vertical integrals and print (time,lat,ntp) to NC output.
 
     Arguments:
@@ -818,16 +659,16 @@ def output(fld, d_s, filenc, name, nc_f):
     - d_s: Delta sigma;
     - filenc: the input file containing the Fourier coefficients of t,u,v,w;
     - name: the variable name;
-    - nc_f: the name of the output file (with path)
+    - nc_f: the name of the output file (with path);
+    - wave: the zonal wavenumbers of the input Fourier coefficients;
     """
-    fld_tmn = np.nanmean(fld, axis=1)
-    fld_aux = fld_tmn * d_s[:, np.newaxis, np.newaxis]
+    fld_aux = fld * d_s[:, np.newaxis, np.newaxis]
     fld_vmn = np.nansum(fld_aux, axis=0) / np.nansum(d_s)
     removeif(nc_f)
-    pr_output(fld_vmn, name, filenc, nc_f)
+    pr_output(fld_vmn, name, filenc, nc_f, wave)
 
 
-def pr_output(varo, varname, filep, nc_f):
+def pr_output(varo, varname, filep, nc_f, wave):
     """Print outputs to NetCDF.
 
     Save fields to NetCDF, retrieving information from an existing
@@ -838,6 +679,7 @@ def pr_output(varo, varname, filep, nc_f):
     - varname: the name of the variables to be saved;
     - filep: the existing dataset, containing the metadata;
     - nc_f: the name of the output file;
+    - wave: the zonal wavenumbers of the input Fourier coefficients;
 
     PROGRAMMER(S)
         Chris Slocum (2014), modified by Valerio Lembo (2018).
@@ -846,25 +688,30 @@ def pr_output(varo, varname, filep, nc_f):
     with Dataset(nc_f, 'w', format='NETCDF4') as w_nc_fid:
         w_nc_fid.description = "Outputs of LEC program"
         with Dataset(filep, 'r') as nc_fid:
-            # Extract data from NetCDF file
-            wave = nc_fid.variables['wave'][:]
             ntp = int(len(wave) / 2)
             # Writing NetCDF files
             fourc.extr_lat(nc_fid, w_nc_fid, 'lat')
             w_nc_fid.createDimension('wave', ntp)
             w_nc_dim = w_nc_fid.createVariable('wave',
-                                               nc_fid.variables['wave'].dtype,
+                                               nc_fid.variables['plev'].dtype,
                                                ('wave', ))
-            for ncattr in nc_fid.variables['wave'].ncattrs():
-                w_nc_dim.setncattr(ncattr,
-                                   nc_fid.variables['wave'].getncattr(ncattr))
+            if 'wave' in nc_fid.variables:
+                for ncattr in nc_fid.variables['wave'].ncattrs():
+                    w_nc_dim.setncattr(
+                        ncattr, nc_fid.variables['wave'].getncattr(ncattr))
         w_nc_fid.variables['wave'][:] = wave[0:ntp]
         w_nc_var = w_nc_fid.createVariable(varname, 'f8', ('lat', 'wave'))
         varatts(w_nc_var, varname, 1, 0)
         w_nc_fid.variables[varname][:] = varo
 
 
-def preproc_lec(model, wdir, pdir, input_data):
+def preproc_lec(model,
+                wdir,
+                pdir,
+                input_data,
+                chunk_size=None,
+                pipeline=False,
+                n_workers=1):
     """Preprocess fields for LEC computations and send it to lorenz program.
 
     This function computes the interpolation of ta, ua, va, wap daily fields to
@@ -880,9 +727,15 @@ def preproc_lec(model, wdir, pdir, input_data):
       to store tables of conversion/reservoir terms and the flux diagram for
       year;
     - filelist: a list of file names containing the input fields;
+    - chunk_size: the number of time steps that are processed at once in the
+      LEC computations (all time steps of a year if None);
+    - pipeline: if True, the filled temperature and the Fourier coefficients
+      are passed to the LEC computations as arrays, instead of being stored
+      to intermediate NetCDF files for each year;
+    - n_workers: the number of years that are processed in parallel (only
+      used if pipeline is True).
     """
     cdo = Cdo()
-    fourc = fourier_coefficients
     ta_file = e.select_metadata(input_data, short_name='ta',
                                 dataset=model)[0]['filename']
     tas_file = e.select_metadata(input_data, short_name='tas',
@@ -926,8 +779,7 @@ def preproc_lec(model, wdir, pdir, input_data):
     yrs = cdo.showyear(input=energy3_file)
     yrs = str(yrs)
     yrs2 = yrs.split()
-    y_i = 0
-    lect = np.zeros(len(yrs2))
+    years = []
     for y_r in yrs2:
         y_rl = [y_n for y_n in y_r]
         y_ro = ''
@@ -935,7 +787,62 @@ def preproc_lec(model, wdir, pdir, input_data):
             e_l = str(e_l)
             if e_l.isdigit() is True:
                 y_ro += e_l
-        # print(filter(str.isdigit, str(y_r)))
+        years.append(y_ro)
+    if pipeline:
+        lect = lec_years(model, wdir, ldir, [energy3_file, tas_file], years,
+                         chunk_size, n_workers)
+    else:
+        lect = _lec_years_files(cdo, model, wdir, ldir,
+                                [energy3_file, tas_file], years, chunk_size)
+    os.remove(maskorog)
+    os.remove(ua_file_mask)
+    os.remove(va_file_mask)
+    os.remove(energy3_file)
+    return lect
+
+
+def lec_years(model, wdir, ldir, infiles, years, chunk_size, n_workers):
+    """Compute the LEC for each year, processing years in parallel.
+
+    The intermediate fields are passed between the computation stages as
+    arrays, only the final products are written to disk.
+
+    Arguments:
+    - model: the model name;
+    - wdir: the working directory where the outputs are stored;
+    - ldir: the directory where the tables and flux diagrams are stored;
+    - infiles: the names of the files containing the t,u,v,w fields and the
+      near-surface temperature;
+    - years: a list of the years to be processed;
+    - chunk_size: the number of time steps that are processed at once in the
+      LEC computations;
+    - n_workers: the number of worker processes.
+    """
+    args = [(model, wdir, ldir, infiles, y_ro, chunk_size) for y_ro in years]
+    if n_workers == 1:
+        lect = [_lec_year(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            lect = list(executor.map(_lec_year, *zip(*args)))
+    return np.array(lect, dtype=float)
+
+
+def _lec_year(model, wdir, ldir, infiles, y_ro, chunk_size):
+    """Compute the LEC for a single year from in-memory coefficients."""
+    coeffs = fourier_coefficients.fourier_coeff_year(infiles[0], infiles[1],
+                                                     y_ro)
+    diagfile = (ldir + '/{}_{}_lec_diagram.png'.format(model, y_ro))
+    logfile = (ldir + '/{}_{}_lec_table.txt'.format(model, y_ro))
+    return lorenz(wdir, model, y_ro, infiles[0], diagfile, logfile,
+                  chunk_size, coeffs)
+
+
+def _lec_years_files(cdo, model, wdir, ldir, infiles, years, chunk_size):
+    """Compute the LEC for each year, using intermediate NetCDF files."""
+    fourc = fourier_coefficients
+    energy3_file, tas_file = infiles
+    lect = np.zeros(len(years))
+    for y_i, y_ro in enumerate(years):
         enfile_yr = wdir + '/inputen.nc'
         tasfile_yr = wdir + '/tas_yr.nc'
         tadiag_file = wdir + '/ta_filled.nc'
@@ -948,16 +855,12 @@ def preproc_lec(model, wdir, pdir, input_data):
         fourc.fourier_coeff(tadiag_file, ncfile, enfile_yr, tasfile_yr)
         diagfile = (ldir + '/{}_{}_lec_diagram.png'.format(model, y_ro))
         logfile = (ldir + '/{}_{}_lec_table.txt'.format(model, y_ro))
-        lect[y_i] = lorenz(wdir, model, y_ro, ncfile, diagfile, logfile)
-        y_i = y_i + 1
+        lect[y_i] = lorenz(wdir, model, y_ro, ncfile, diagfile, logfile,
+                           chunk_size)
         os.remove(enfile_yr)
         os.remove(tasfile_yr)
         os.remove(tadiag_file)
         os.remove(ncfile)
-    os.remove(maskorog)
-    os.remove(ua_file_mask)
-    os.remove(va_file_mask)
-    os.remove(energy3_file)
     return lect
 
 
@@ -973,25 +876,15 @@ def stabil(ta_gmn, p_l, nlev):
     """Compute the stability parameter from temp. and pressure levels.
 
     Arguments
-    - ta_gmn: a temperature vertical profile;
+    - ta_gmn: a temperature vertical profile, or a (lev, lat) field;
     - p_l: the vertical levels;
     - nlev: the number of vertical levels;
     """
     cpdr = CP / R
     t_g = ta_gmn
-    g_s = np.zeros(nlev)
-    for i_l in range(nlev):
-        if i_l == 0:
-            dtdp = (t_g[i_l + 1] - t_g[i_l]) / (p_l[i_l + 1] - p_l[i_l])
-        elif i_l == nlev - 1:
-            dtdp = (t_g[i_l] - t_g[i_l - 1]) / (p_l[i_l] - p_l[i_l - 1])
-        else:
-            dtdp1 = (t_g[i_l + 1] - t_g[i_l]) / (p_l[i_l + 1] - p_l[i_l])
-            dtdp2 = (t_g[i_l] - t_g[i_l - 1]) / (p_l[i_l] - p_l[i_l - 1])
-            dtdp = ((dtdp1 * (p_l[i_l] - p_l[i_l - 1]) + dtdp2 *
-                     (p_l[i_l + 1] - p_l[i_l])) /
-                    (p_l[i_l + 1] - p_l[i_l - 1]))
-        g_s[i_l] = CP / (t_g[i_l] - p_l[i_l] * dtdp * cpdr)
+    dtdp = _vert_deriv(t_g, p_l)
+    p_l = np.reshape(p_l, (nlev, ) + (1, ) * (np.ndim(t_g) - 1))
+    g_s = CP / (t_g - p_l * dtdp * cpdr)
     return g_s
 
 
@@ -1017,6 +910,70 @@ def table(varin, ntp, name, logfile, flag):
     write_to_tab(logfile, name, vared_tog, varzon)
 
 
+def transient_terms(fields, tmeans, zmeans, lev, lat, g_w, chunk_size=None):
+    """Compute the time mean of the transient eddy LEC terms.
+
+    The reservoirs and conversion terms are computed for blocks of
+    chunk_size time steps at once (all time steps if None). Only the sums
+    over time are retained, so that the memory needed does not depend on
+    the length of the time series.
+
+    Arguments:
+    - fields: a list with the Fourier coefficients of t,u,v,w as
+      (lev, time, lat, wave);
+    - tmeans: a list with the time means of t,u,v,w as (lev, lat, wave);
+    - zmeans: a list with the zonal and global time mean temperature and
+      stability parameter;
+    - lev: the pressure levels;
+    - lat: the latitudes (in radians);
+    - g_w: the Gaussian weights for meridional averaging;
+    - chunk_size: the number of time steps that are processed at once.
+    """
+    ta_c, ua_c, va_c, wap_c = fields
+    ta_tmn, ua_tmn, va_tmn, wap_tmn = tmeans
+    ta_ztmn, ta_gmn, gam_ztmn, gam_tmn = zmeans
+    nlev, ntime, nlat = np.shape(ta_c)[0:3]
+    ntp = np.shape(ta_c)[3] + 1
+    if chunk_size is None:
+        chunk_size = ntime
+    names = ['ek', 'ape', 'a2k', 'ae2az', 'ke2kz', 'at2as', 'kt2ks']
+    tsum = {name: np.zeros([nlev, nlat, ntp - 1]) for name in names}
+    tnum = {name: np.zeros([nlev, nlat, ntp - 1]) for name in names}
+    for t_0 in range(0, ntime, chunk_size):
+        t_1 = min(t_0 + chunk_size, ntime)
+        # Time as leading dimension, anomalies as (time, lev, lat, wave)
+        ta_tan = np.moveaxis(ta_c[:, t_0:t_1], 1, 0) - ta_tmn
+        ua_tan = np.moveaxis(ua_c[:, t_0:t_1], 1, 0) - ua_tmn
+        va_tan = np.moveaxis(va_c[:, t_0:t_1], 1, 0) - va_tmn
+        wap_tan = np.moveaxis(wap_c[:, t_0:t_1], 1, 0) - wap_tmn
+        # Compute zonal means
+        _, ta_tgan = averages(ta_tan, g_w)
+        _, wap_tgan = averages(wap_tan, g_w)
+        terms = {
+            'ek':
+            makek(ua_tan, va_tan),
+            'ape':
+            makea(ta_tan, ta_tgan, gam_tmn),
+            'a2k':
+            np.real(mka2k(wap_tan, ta_tan, wap_tgan, ta_tgan, lev)),
+            'ae2az':
+            mkaeaz(va_tan, wap_tan, ta_tan, ta_tmn, ta_gmn, lev, lat,
+                   gam_tmn, nlat, nlev),
+            'ke2kz':
+            mkkekz(ua_tan, va_tan, wap_tan, ua_tmn, va_tmn, lev, lat, nlat,
+                   ntp, nlev),
+            'at2as':
+            mkatas(ua_tan, va_tan, wap_tan, ta_tan, ta_ztmn, gam_ztmn, lev,
+                   lat, nlat, ntp, nlev),
+            'kt2ks':
+            mkktks(ua_tan, va_tan, ua_tmn, va_tmn, lat, nlat, ntp, nlev),
+        }
+        for name in names:
+            tsum[name] += np.nansum(terms[name], axis=0)
+            tnum[name] += np.sum(~np.isnan(terms[name]), axis=0)
+    return {name: tsum[name] / tnum[name] for name in names}
+
+
 def varatts(w_nc_var, varname, tres, vres):
     """Add attibutes to the variables, depending on name and time res.
 
@@ -1124,3 +1081,45 @@ def write_to_tab(logfile, name, vared, varzon):
         log.write(' {} EDDY(KW) {: 4.3f}  {: 4.3f}  {: 4.3f}\n'.format(
             name, vared[3][0], vared[3][1], vared[3][2]))
         log.write('--------------------------------------\n')
+
+
+def _lat_diff(fld, lat):
+    """Compute the meridional differences of a field and of the latitudes.
+
+    Differences are centred, except for the first and last latitude.
+
+    Arguments:
+    - fld: a field with latitudes along the second dimension;
+    - lat: the latitudes;
+    """
+    dfld = np.empty(np.shape(fld), dtype=fld.dtype)
+    dfld[:, 0] = fld[:, 1] - fld[:, 0]
+    dfld[:, -1] = fld[:, -1] - fld[:, -2]
+    dfld[:, 1:-1] = fld[:, 2:] - fld[:, :-2]
+    dlat = np.empty(np.shape(lat), dtype=lat.dtype)
+    dlat[0] = lat[1] - lat[0]
+    dlat[-1] = lat[-1] - lat[-2]
+    dlat[1:-1] = lat[2:] - lat[:-2]
+    return dfld, dlat
+
+
+def _vert_deriv(fld, p_l):
+    """Compute the vertical derivative of a field.
+
+    The derivative is the average of the forward and backward derivatives
+    weighted with the layer thicknesses, except for the first and last
+    level.
+
+    Arguments:
+    - fld: a field with the vertical levels along the first dimension;
+    - p_l: the pressure levels;
+    """
+    shape = (-1, ) + (1, ) * (np.ndim(fld) - 1)
+    d_p = np.reshape(p_l[1:] - p_l[:-1], shape)
+    dfdp = (fld[1:] - fld[:-1]) / d_p
+    deriv = np.empty(np.shape(fld), dtype=dfdp.dtype)
+    deriv[0] = dfdp[0]
+    deriv[-1] = dfdp[-1]
+    deriv[1:-1] = ((dfdp[1:] * d_p[:-1] + dfdp[:-1] * d_p[1:]) /
+                   np.reshape(p_l[2:] - p_l[:-2], shape))
+    return deriv
@@ -0,0 +1,190 @@
+"""IN-PROCESS REPLACEMENTS FOR CDO OPERATORS.
+
+Module containing array based equivalents of the CDO operators used in the
+computations module.
+
+The fields are loaded as iris cubes with lazy (dask) data and all operators
+act on the lazy arrays, so that a chain of operators is evaluated in memory
+when its result is saved or computed, instead of writing an intermediate
+NetCDF file after each operator.
+
+The functions that are here contained are:
+- apply: combine fields elementwise, keeping the metadata of the first one;
+- area_weights: the grid cell areas used by fldmean;
+- div: division, with division by zero leading to missing values (div);
+- eqc, gtc, ltc: comparisons with a constant, returning 1 or 0 (eqc, gtc, ltc);
+- fldmean: area weighted horizontal average (fldmean);
+- load: load a single-variable NetCDF file;
+- realise: compute a lazy array;
+- reci: reciprocal value (reci);
+- save: save a field to a NetCDF file under a new variable name (chname);
+- setctomiss: set a constant to missing value (setctomiss);
+- setrtomiss: set a range to missing value (setrtomiss);
+- timmean: time average (timmean);
+- to_float32: convert to single precision (-b F32);
+- yearmonmean: yearly average of monthly means, weighted by the number of
+  days per month (yearmonmean);
+"""
+
+import dask.array as da
+import iris
+import numpy as np
+
+
+def apply(func, *cubes):
+    """Combine fields elementwise.
+
+    The metadata are taken from the first field among those with the
+    largest number of dimensions, as CDO does for the first input.
+
+    Arguments:
+    - func: a function combining the lazy data of the fields;
+    - cubes: the fields, as iris cubes.
+    """
+    template = max(cubes, key=lambda cube: cube.ndim)
+    return template.copy(data=func(*[cube.lazy_data() for cube in cubes]))
+
+
+def area_weights(cube):
+    """Compute the (lat,lon) grid cell areas on the unit sphere.
+
+    Arguments:
+    - cube: a field on a regular lonlat grid.
+    """
+    bounds = []
+    for name in ['latitude', 'longitude']:
+        coord = cube.coord(name).copy()
+        if not coord.has_bounds():
+            coord.guess_bounds()
+        bounds.append(np.deg2rad(coord.bounds))
+    lat_bnds = np.clip(bounds[0], -np.pi / 2, np.pi / 2)
+    lon_bnds = bounds[1]
+    dlat = np.abs(np.sin(lat_bnds[:, 1]) - np.sin(lat_bnds[:, 0]))
+    dlon = np.abs(lon_bnds[:, 1] - lon_bnds[:, 0])
+    return dlat[:, np.newaxis] * dlon[np.newaxis, :]
+
+
+def div(num, den):
+    """Divide two fields, setting division by zero to missing value."""
+    return num / da.ma.masked_equal(den, 0.)
+
+
+def eqc(data, const):
+    """Return 1 where a field equals a constant, 0 elsewhere."""
+    return (data == const).astype(data.dtype)
+
+
+def gtc(data, const):
+    """Return 1 where a field is greater than a constant, 0 elsewhere."""
+    return (data > const).astype(data.dtype)
+
+
+def ltc(data, const):
+    """Return 1 where a field is less than a constant, 0 elsewhere."""
+    return (data < const).astype(data.dtype)
+
+
+def fldmean(data, weights):
+    """Compute the area weighted average over the last two (lat,lon) axes.
+
+    Arguments:
+    - data: the lazy data of a field;
+    - weights: the grid cell areas, as obtained from area_weights.
+    """
+    return _weighted_mean(data, weights, axis=(-2, -1))
+
+
+def load(filename):
+    """Load the single variable in a NetCDF file as a cube with lazy data.
+
+    As in CDO, the data are processed in double precision.
+    """
+    cube = iris.load_cube(filename)
+    return cube.copy(data=cube.lazy_data().astype(np.float64))
+
+
+def realise(data):
+    """Compute a lazy array, returning missing values as a masked array."""
+    return np.ma.masked_invalid(da.ma.filled(data, np.nan).compute())
+
+
+def reci(data):
+    """Compute the reciprocal of a field."""
+    return div(1., data)
+
+
+def save(cube, var_name, filename):
+    """Save a field to a NetCDF file under a new variable name.
+
+    Arguments:
+    - cube: the field to be saved;
+    - var_name: the name of the variable in the NetCDF file;
+    - filename: the name of the output file.
+    """
+    cube = cube.copy()
+    cube.var_name = var_name
+    iris.save(cube, filename)
+
+
+def setctomiss(data, const):
+    """Set the values of a field equal to a constant to missing value."""
+    return da.ma.masked_equal(data, const)
+
+
+def setrtomiss(data, rmin, rmax):
+    """Set the values of a field within a range to missing value."""
+    return da.ma.masked_inside(data, rmin, rmax)
+
+
+def timmean(data):
+    """Compute the average over the first (time) axis of a lazy array."""
+    return _weighted_mean(data, 1., axis=0)
+
+
+def to_float32(cube):
+    """Convert the data of a field to single precision."""
+    return cube.copy(data=cube.lazy_data().astype(np.float32))
+
+
+def yearmonmean(cube):
+    """Compute yearly averages of monthly means.
+
+    Each month is weighted by its number of days, according to the calendar
+    of the time coordinate.
+
+    Arguments:
+    - cube: a field with time as first dimension.
+    """
+    time = cube.coord('time')
+    dates = time.units.num2date(time.points)
+    years = np.array([date.year for date in dates])
+    ndays = np.array([date.daysinmonth for date in dates], dtype=float)
+    data = cube.lazy_data()
+    shape = (-1, ) + (1, ) * (cube.ndim - 1)
+    first = []
+    means = []
+    points = []
+    bounds = []
+    for year in np.unique(years):
+        idx = np.where(years == year)[0]
+        first.append(idx[0])
+        means.append(
+            _weighted_mean(data[idx], np.reshape(ndays[idx], shape), axis=0))
+        points.append(np.mean(time.points[idx]))
+        if time.has_bounds():
+            bounds.append([time.bounds[idx[0], 0], time.bounds[idx[-1], 1]])
+        else:
+            bounds.append([time.points[idx[0]], time.points[idx[-1]]])
+    yearly = cube[first].copy(data=da.stack(means))
+    yearly.coord('time').points = points
+    yearly.coord('time').bounds = bounds
+    return yearly
+
+
+def _weighted_mean(data, weights, axis):
+    """Compute a weighted average, ignoring missing values."""
+    weights = weights * ~da.ma.getmaskarray(data)
+    total = da.sum(weights, axis=axis)
+    mean = (da.sum(da.ma.filled(data, 0.) * weights, axis=axis) /
+            da.where(total > 0., total, 1.))
+    return da.ma.masked_where(total == 0., mean)
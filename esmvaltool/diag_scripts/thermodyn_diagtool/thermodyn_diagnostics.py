@@ -115,6 +115,20 @@ USAGE
               latent energy budget,
        - lec: if set to true, the program will compute the Lorenz Energy Cycle
               (LEC) averaged on each year;
+       - backend: optional, if set to numpy, the energy and water mass
+              budgets, the baroclinic efficiency, the budgets over land and
+              oceans, the material entropy production with the indirect
+              method and the masking of the precipitation are computed in
+              memory with lazy arrays instead of with CDO, so that no
+              intermediate files are written (default: cdo);
+       - lec_chunk_size: optional, the number of time steps that are
+              processed at once in the LEC computations (default: a whole
+              year). Smaller values reduce the memory usage;
+       - lec_pipeline: optional, if set to true the Fourier coefficients are
+              passed to the LEC computations in memory, instead of being
+              stored to intermediate files for each year;
+       - lec_workers: optional, the number of years for which the LEC is
+              computed in parallel if lec_pipeline is set to true;
        - entr: if set to true, the program will compute the material entropy
                production (MEP);
        - met: if set to 1, the program will compute the MEP with the indirect
@@ -260,7 +274,8 @@ def compute_water_mass_budget(cfg, wdir_up, pdir, model, wdir, input_data,
     logger.info('Computing water mass and latent energy budgets\n')
     aux_list = mkthe.init_mkthe_wat(model, wdir, input_data, flags)
     wm_gmean, wm_file = computations.wmbudg(model, wdir, aux_file, input_data,
-                                            aux_list)
+                                            aux_list,
+                                            cfg.get('backend', 'cdo'))
     wm_time_mean = np.nanmean(wm_gmean[0])
     wm_time_std = np.nanstd(wm_gmean[0])
     logger.info('Water mass budget: %s\n', wm_time_mean)
@@ -278,9 +293,9 @@ def compute_water_mass_budget(cfg, wdir_up, pdir, model, wdir, input_data,
             latent_time_std)
 
 
-def compute_land_ocean(model, wdir, file, sftlf_fx, name):
+def compute_land_ocean(model, wdir, file, sftlf_fx, name, backend='cdo'):
     ocean_mean, land_mean = computations.landoc_budg(model, wdir, file,
-                                                     sftlf_fx, name)
+                                                     sftlf_fx, name, backend)
     logger.info('%s budget over oceans: %s\n', name, ocean_mean)
     logger.info('%s budget over land: %s\n', name, land_mean)
     return (ocean_mean, land_mean)
@@ -319,6 +334,10 @@ def main(cfg):
     entr = str(cfg['entr'])
     met = str(cfg['met'])
     flags = [wat, lec, entr, met]
+    backend = cfg.get('backend', 'cdo')
+    if backend not in ('cdo', 'numpy'):
+        raise ValueError("Unknown backend '{}', choose 'cdo' or "
+                         "'numpy'".format(backend))
     # Initialize multi-model arrays
     modnum = len(model_names)
     te_all = np.zeros(modnum)
@@ -358,7 +377,7 @@ def main(cfg):
         te_all[i_m] = te_gmean_constant
         logger.info('Computing energy budgets\n')
         in_list, eb_gmean, eb_file, toab_ymm_file = comp.budgets(
-            model, wdir, aux_file, input_data)
+            model, wdir, aux_file, input_data, backend)
         prov_rec = provenance_meta.get_prov_map(
             ['TOA energy budgets', model],
             [in_list[4], in_list[6], in_list[7]])
@@ -388,7 +407,8 @@ def main(cfg):
         logger.info('Surface energy budget: %s\n', surb_all[i_m, 0])
         logger.info('Done\n')
         baroc_eff_all[i_m] = comp.baroceff(model, wdir, aux_file,
-                                           toab_ymm_file, te_ymm_file)
+                                           toab_ymm_file, te_ymm_file,
+                                           backend)
         logger.info('Baroclinic efficiency (Lucarini et al., 2011): %s\n',
                     baroc_eff_all[i_m])
         logger.info('Running the plotting module for the budgets\n')
@@ -410,24 +430,27 @@ def main(cfg):
                                          dataset=model)[0]['filename']
             logger.info('Computing energy budgets over land and oceans\n')
             toab_oc_all[i_m], toab_la_all[i_m] = compute_land_ocean(
-                model, wdir, eb_file[0], sftlf_fx, 'toab')
+                model, wdir, eb_file[0], sftlf_fx, 'toab', backend)
             atmb_oc_all[i_m], atmb_la_all[i_m] = compute_land_ocean(
-                model, wdir, eb_file[1], sftlf_fx, 'atmb')
+                model, wdir, eb_file[1], sftlf_fx, 'atmb', backend)
             surb_oc_all[i_m], surb_la_all[i_m] = compute_land_ocean(
-                model, wdir, eb_file[2], sftlf_fx, 'surb')
+                model, wdir, eb_file[2], sftlf_fx, 'surb', backend)
             if wat == 'True':
                 logger.info('Computing water mass and latent energy'
                             ' budgets over land and oceans\n')
                 wmb_oc_all[i_m], wmb_la_all[i_m] = compute_land_ocean(
-                    model, wdir, wm_file[0], sftlf_fx, 'wmb')
+                    model, wdir, wm_file[0], sftlf_fx, 'wmb', backend)
                 latent_oc_all[i_m], latent_la_all[i_m] = compute_land_ocean(
-                    model, wdir, wm_file[1], sftlf_fx, 'latent')
+                    model, wdir, wm_file[1], sftlf_fx, 'latent', backend)
             logger.info('Done\n')
         if lec == 'True':
             logger.info('Computation of the Lorenz Energy '
                         'Cycle (year by year)\n')
             _, _ = mkthe.init_mkthe_lec(model, wdir, input_data)
-            lect = lorenz.preproc_lec(model, wdir, pdir, input_data)
+            lect = lorenz.preproc_lec(model, wdir, pdir, input_data,
+                                      cfg.get('lec_chunk_size'),
+                                      cfg.get('lec_pipeline', False),
+                                      cfg.get('lec_workers', 1))
             lec_all[i_m, 0] = np.nanmean(lect)
             lec_all[i_m, 1] = np.nanstd(lect)
             logger.info(
@@ -445,7 +468,7 @@ def main(cfg):
                 indentr_list = [te_file, eb_file[0]]
                 horz_mn, vert_mn, horzentr_file, vertentr_file = comp.indentr(
                     model, wdir, indentr_list, input_data, aux_file,
-                    eb_gmean[0])
+                    eb_gmean[0], backend)
                 listind = [horzentr_file, vertentr_file]
                 provenance_meta.meta_indentr(cfg, model, input_data, listind)
                 horzentr_all[i_m, 0] = np.nanmean(horz_mn)
@@ -467,7 +490,7 @@ def main(cfg):
             if met in {'2', '3'}:
                 matentr, irrevers, entr_list = comp.direntr(
                     logger, model, wdir, input_data, aux_file, te_file, lect,
-                    flags)
+                    flags, backend)
                 provenance_meta.meta_direntr(cfg, model, input_data, entr_list)
                 matentr_all[i_m, 0] = matentr
                 if met in {'3'}:
@@ -93,14 +93,14 @@ def main(cfg):
 
         # Call diagnostics functions
         print("prepro")
-        (file_da_an_zm, file_mo_an) = zmnam_preproc(ifile)
+        (cube_da_an_zm, cube_mo_an) = zmnam_preproc(ifile)
         print("calc")
-        outfiles = zmnam_calc(file_da_an_zm, out_dir + '/', ifile_props)
+        outfiles = zmnam_calc(cube_da_an_zm, out_dir + '/', ifile_props)
         provenance_record = get_provenance_record(
             list(input_files.values())[0], ancestor_files=ifile)
         if write_plots:
             print("plot_files")
-            plot_files = zmnam_plot(file_mo_an, out_dir + '/', plot_dir +
+            plot_files = zmnam_plot(cube_mo_an, out_dir + '/', plot_dir +
                                     '/', ifile_props, fig_fmt, write_plots)
         else:
             plot_files = []
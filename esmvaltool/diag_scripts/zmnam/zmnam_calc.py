@@ -9,6 +9,8 @@ import numpy as np
 import netCDF4 as nc4
 from scipy import signal
 
+from zmnam_preproc import coord_attributes
+
 
 def butter_filter(data, freq, lowcut=None, order=2):
     """Function to perform time filtering."""
@@ -29,63 +31,68 @@ def butter_filter(data, freq, lowcut=None, order=2):
     return ysig
 
 
-def zmnam_calc(da_fname, outdir, src_props):
+def leading_eofs(anom):
+    """Compute the leading EOF of a batch of (time, space) anomalies.
+
+    The leading mode is obtained from the singular value decomposition of
+    the anomalies, without forming the covariance matrices.
+
+    Returns the leading eigenvectors (batch, space), the fraction of
+    variance they explain (batch) and the principal components
+    (batch, time).
+    """
+    lsvec, sval, rsvec = np.linalg.svd(anom, full_matrices=False)
+    eigenval_norm = sval[..., 0]**2 / np.sum(sval**2, axis=-1)
+    return rsvec[..., 0, :], eigenval_norm, lsvec[..., 0] * sval[..., 0:1]
+
+
+def zmnam_calc(cube_da, outdir, src_props):
     """Function to do EOF/PC decomposition of zg field."""
     deg_to_r = np.pi / 180.
     lat_weighting = True
     outfiles = []
 
     # Note: daily/monthly means have been
-    # already subtracted from daily/monthly files
+    # already subtracted from daily/monthly fields
 
-    # Open daily data
+    # Read daily data
 
-    in_file = nc4.Dataset(da_fname, "r")
-    time_dim = in_file.variables['time'][:]
-    time_lnam = getattr(in_file.variables['time'], 'long_name', '')
-    time_snam = getattr(in_file.variables['time'], 'standard_name', '')
-    time_uni = in_file.variables['time'].units
-    time_cal = in_file.variables['time'].calendar
-    time = np.array(time_dim[:], dtype='d')
+    time_att = coord_attributes(cube_da, 'time')
+    time_lnam = time_att['long_name']
+    time_snam = time_att['standard_name']
+    time_uni = time_att['units']
+    time_cal = time_att['calendar']
+    time = np.array(cube_da.coord('time').points, dtype='d')
+    time_dim = time
     # startdate = nc4.num2date(time[0], time_uni, time_cal)
-    date = nc4.num2date(time, in_file.variables['time'].units,
-                        in_file.variables['time'].calendar)
-
-    lev = np.array(in_file.variables['plev'][:], dtype='d')
-    lev_lnam = getattr(in_file.variables['plev'], 'long_name', '')
-    lev_snam = getattr(in_file.variables['plev'], 'standard_name', '')
-    lev_uni = in_file.variables['plev'].units
-    lev_pos = in_file.variables['plev'].positive
-    lev_axi = in_file.variables['plev'].axis
+    date = nc4.num2date(time, time_uni, time_cal)
 
-    lat = np.array(in_file.variables['lat'][:], dtype='d')
-    # lat_nam = in_file.variables['lat'].long_name
-    lat_uni = in_file.variables['lat'].units
-    lat_axi = in_file.variables['lat'].axis
+    lev = np.array(cube_da.coord('air_pressure').points, dtype='d')
+    lev_att = coord_attributes(cube_da, 'air_pressure')
+    lev_lnam = lev_att['long_name']
+    lev_snam = lev_att['standard_name']
+    lev_uni = lev_att['units']
+    lev_pos = lev_att['positive']
+    lev_axi = lev_att['axis']
 
-    lon = np.array(in_file.variables['lon'][:], dtype='d')
-    # lon_nam = in_file.variables['lon'].long_name
-    lon_uni = in_file.variables['lon'].units
-    lon_axi = in_file.variables['lon'].axis
+    lat = np.array(cube_da.coord('latitude').points, dtype='d')
+    lat_att = coord_attributes(cube_da, 'latitude')
+    lat_uni = lat_att['units']
+    lat_axi = lat_att['axis']
 
-    zg_da = np.squeeze(np.array(in_file.variables['zg'][:], dtype='d'))
+    lon = np.atleast_1d(np.array(cube_da.coord('longitude').points,
+                                 dtype='d'))
+    lon_att = coord_attributes(cube_da, 'longitude')
+    lon_uni = lon_att['units']
+    lon_axi = lon_att['axis']
 
-    in_file.close()
-
-    n_tim = len(time_dim)
-    print('end infile close')
+    zg_da = np.array(np.ma.filled(cube_da.data, np.nan), dtype='d')
 
     # Start zmNAM index calculation
 
     # Lowpass filter
     zg_da_lp = butter_filter(zg_da, 1, lowcut=1. / 90, order=2)
 
-    # Outputs: stored by level
-    # EOFs, eigenvalues, daily and monthly PCs
-    eofs = np.zeros((len(lev), len(lat)), dtype='d')
-    eigs = np.zeros(len(lev), dtype='d')
-    pcs_da = np.zeros((n_tim, len(lev)), dtype='d')
-
     # Calendar-independent monthly mean
     sta_mon = []  # first day of the month
     mid_mon = []  # 15th of the month
@@ -113,67 +120,42 @@ def zmnam_calc(da_fname, outdir, src_props):
 
         idate += 1
 
-    pcs_mo = np.zeros((len(date[mid_mon]), len(lev)), dtype='d')
-
-    # Perform analysis by level
-    for i_lev in np.arange(len(lev)):
-        # Latitude weighting
-        if lat_weighting is True:
-            for j_lat in np.arange(len(lat)):
-                zg_da_lp[:, i_lev, j_lat] *= np.sqrt(
-                    abs(np.cos(lat[j_lat] * deg_to_r)))
-
-        zg_da_lp_an = zg_da_lp[:, i_lev, :] - np.mean(
-            zg_da_lp[:, i_lev, :], axis=0)
-        cov = np.dot(zg_da_lp_an.T, zg_da_lp_an) / (n_tim - 1)
-
-        # Compute eigenvectors and eigenvalues
-        eigenval, eigenvec = np.linalg.eig(cov)
-
-        sum_eigenval = np.sum(eigenval)
-
-        eigenval_norm = eigenval[:] / sum_eigenval
-
-        # Largest eigenvalue
-        max_eigenval = eigenval_norm.argmax()
-
-        # PC calculation
-        pc = np.dot(zg_da_lp_an[:, :], eigenvec)
-
-        # Latitude de-weighting
-        if lat_weighting is True:
-            for i_lat in np.arange(len(lat)):
-                eigenvec[i_lat, :] /= np.sqrt(
-                    abs(np.cos(lat[i_lat] * deg_to_r)))
-
-        # Retain leading standardized PC & EOF
-        lead_pc_mean = np.mean(pc[:, max_eigenval], axis=0)
-        lead_pc_std = np.std(pc[:, max_eigenval], ddof=1, axis=0)
-        lead_pc = (pc[:, max_eigenval] - lead_pc_mean) / lead_pc_std
-        lead_eof = eigenvec[:, max_eigenval]
-
-        max_lat = max(range(len(lat)), key=lambda x: lat[x])
-        min_lat = min(range(len(lat)), key=lambda x: lat[x])
-
-        if lead_eof[max_lat] > lead_eof[min_lat]:
-            lead_pc *= -1
-            lead_eof *= -1
-
-        lead_pc_mo = np.zeros(len(date[mid_mon]), dtype='d')
-        time_mo = np.zeros(len(date[mid_mon]), dtype='d')
-
-        # print(lead_pc)
-
-        for k_mo in range(len(date[mid_mon])):
-            lead_pc_mo[k_mo] = np.mean(
-                lead_pc[sta_mon[k_mo]:end_mon[k_mo] + 1])
-            time_mo[k_mo] = time[mid_mon[k_mo]]
-
-        # Store PC/EOF for this level (no time dependent)
-        eigs[i_lev] = eigenval_norm[max_eigenval]
-        eofs[i_lev, :] = lead_eof
-        pcs_da[:, i_lev] = lead_pc
-        pcs_mo[:, i_lev] = lead_pc_mo
+    # Perform analysis for all levels at once
+    # Latitude weighting
+    if lat_weighting is True:
+        lat_weights = np.sqrt(abs(np.cos(lat * deg_to_r)))
+    else:
+        lat_weights = np.ones(len(lat))
+    zg_da_lp *= lat_weights
+
+    zg_da_lp_an = zg_da_lp - np.mean(zg_da_lp, axis=0)
+
+    # Compute leading eigenvectors, eigenvalues and PCs (by level)
+    lead_eof, eigs, pc = leading_eofs(np.moveaxis(zg_da_lp_an, 1, 0))
+
+    # Latitude de-weighting
+    lead_eof /= lat_weights
+
+    # Retain leading standardized PC & EOF
+    lead_pc_mean = np.mean(pc, axis=1, keepdims=True)
+    lead_pc_std = np.std(pc, ddof=1, axis=1, keepdims=True)
+    lead_pc = (pc - lead_pc_mean) / lead_pc_std
+
+    max_lat = max(range(len(lat)), key=lambda x: lat[x])
+    min_lat = min(range(len(lat)), key=lambda x: lat[x])
+
+    flip = lead_eof[:, max_lat] > lead_eof[:, min_lat]
+    lead_pc[flip] *= -1
+    lead_eof[flip] *= -1
+
+    # Store PC/EOF by level (no time dependent)
+    eofs = lead_eof
+    pcs_da = lead_pc.T
+    pcs_mo = np.array([
+        np.mean(pcs_da[sta_mon[k_mo]:end_mon[k_mo] + 1], axis=0)
+        for k_mo in range(len(date[mid_mon]))
+    ]).reshape((len(date[mid_mon]), len(lev)))
+    time_mo = time[mid_mon]
 
     # Save output files
 
@@ -13,8 +13,10 @@ import netCDF4 as nc4
 import cartopy.crs as ccrs
 from cartopy.util import add_cyclic_point
 
+from zmnam_preproc import coord_attributes
 
-def zmnam_plot(file_gh_mo, datafolder, figfolder, src_props,
+
+def zmnam_plot(cube_gh_mo, datafolder, figfolder, src_props,
                fig_fmt, write_plots):
     """Plotting of timeseries and maps for zmnam diagnostics."""
     plot_files = []
@@ -44,45 +46,32 @@ def zmnam_plot(file_gh_mo, datafolder, figfolder, src_props,
     pc_mo = np.array(in_file.variables['PC_mo'][:], dtype='d')
     in_file.close()
 
-    # Open monthly gh field
-    file_name = file_gh_mo
-    # print(datafolder + file_name)
-    in_file = nc4.Dataset(file_name, "r")
-    dims = list(in_file.dimensions.keys())[::-1]  # py3
-    print('mo full dims', dims)
-
-    # Double check on lat/lon names, possibly redundant
-    if 'latitude' in dims:
-        latn = 'latitude'
-    if 'lat' in dims:
-        latn = 'lat'
-    if 'longitude' in dims:
-        lonn = 'longitude'
-    if 'lon' in dims:
-        lonn = 'lon'
-    lat = np.array(in_file.variables[latn][:])
-    lon = np.array(in_file.variables[lonn][:])
-
-    zg_mo = np.array(in_file.variables['zg'][:])
+    # Monthly gh field
+    zg_mo = np.ma.filled(cube_gh_mo.data, np.nan)
 
-    # Record attributes for output netCDFs
-    time_lnam = getattr(in_file.variables['time'], 'long_name', '')
-    time_snam = getattr(in_file.variables['time'], 'standard_name', '')
-    time_uni = in_file.variables['time'].units
-    time_cal = in_file.variables['time'].calendar
-    lev_lnam = getattr(in_file.variables['plev'], 'long_name', '')
-    lev_snam = getattr(in_file.variables['plev'], 'standard_name', '')
-    lev_uni = in_file.variables['plev'].units
-    lev_pos = in_file.variables['plev'].positive
-    lev_axi = in_file.variables['plev'].axis
-
-    lat_uni = in_file.variables[latn].units
-    lat_axi = in_file.variables[latn].axis
-
-    lon_uni = in_file.variables[lonn].units
-    lon_axi = in_file.variables[lonn].axis
+    lat = cube_gh_mo.coord('latitude').points
+    lon = cube_gh_mo.coord('longitude').points
 
-    in_file.close()
+    # Record attributes for output netCDFs
+    time_att = coord_attributes(cube_gh_mo, 'time')
+    time_lnam = time_att['long_name']
+    time_snam = time_att['standard_name']
+    time_uni = time_att['units']
+    time_cal = time_att['calendar']
+    lev_att = coord_attributes(cube_gh_mo, 'air_pressure')
+    lev_lnam = lev_att['long_name']
+    lev_snam = lev_att['standard_name']
+    lev_uni = lev_att['units']
+    lev_pos = lev_att['positive']
+    lev_axi = lev_att['axis']
+
+    lat_att = coord_attributes(cube_gh_mo, 'latitude')
+    lat_uni = lat_att['units']
+    lat_axi = lat_att['axis']
+
+    lon_att = coord_attributes(cube_gh_mo, 'longitude')
+    lon_uni = lon_att['units']
+    lon_axi = lon_att['axis']
 
     # Save dates for timeseries
     date_list = []
@@ -91,8 +80,10 @@ def zmnam_plot(file_gh_mo, datafolder, figfolder, src_props,
         mmdate = nc4.num2date(time_mo, time_mo_uni, time_mo_cal)[i_date].month
         date_list.append(str(yydate) + '-' + str(mmdate))
 
-    # Prepare array for outputting regression maps (lev/lat/lon)
-    regr_arr = np.zeros((len(lev), len(lat), len(lon)), dtype='f')
+    # Regression of 3D zg field onto monthly PC, for all levels at once
+    # Following BT09, the maps are Z_m^l*PC_m^l/|PC_m^l|^2
+    regr_arr = np.einsum('tl,tlyx->lyx',
+                         pc_mo / np.sum(pc_mo**2, axis=0), zg_mo)
 
     for i_lev in np.arange(len(lev)):
 
@@ -146,18 +137,7 @@ def zmnam_plot(file_gh_mo, datafolder, figfolder, src_props,
 
         plt.close('all')
 
-        # Regression of 3D zg field onto monthly PC
-        slope = np.zeros((len(lat), len(lon)), dtype='d')
-
-        for j_lat in np.arange(len(lat)):
-
-            for k_lon in np.arange(len(lon)):
-
-                # Following BT09, the maps are Z_m^l*PC_m^l/|PC_m^l|^2
-                slope[j_lat, k_lon] = np.dot(zg_mo[:, i_lev, j_lat, k_lon],
-                                             (pc_mo[:, i_lev]) /
-                                             np.dot(pc_mo[:, i_lev],
-                                                    pc_mo[:, i_lev]))
+        slope = regr_arr[i_lev]
 
         # Plots of regression maps
         plt.figure()
@@ -223,9 +203,6 @@ def zmnam_plot(file_gh_mo, datafolder, figfolder, src_props,
 
         plt.close('all')
 
-        # Save regression results in array
-        regr_arr[i_lev, :, :] = slope
-
     # Save 3D regression results in output netCDF
     file_out = nc4.Dataset(datafolder + '_'.join(src_props) + '_regr_map.nc',
                            mode='w', format='NETCDF3_CLASSIC')
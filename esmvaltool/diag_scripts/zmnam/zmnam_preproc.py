@@ -3,33 +3,195 @@ Zonal-mean annular mode preproc routine.
 
 Author: Federico Serva (ISAC-CNR & ISMAR-CNR, Italy)
 Copernicus C3S 34a lot 2 (MAGIC)
+
+The preprocessing is done in memory, replacing the chain of CDO operators
+(delete, fillmiss, trend/subtrend, ydaymean/sub, zonmean, monmean/ymonmean
+and sub) previously used. The operators act on the lazy (dask) data of the
+input cube and are evaluated together, without temporary files.
 """
 
-import cdo as cd
+import dask.array as da
+import iris
+import iris.util
+import numpy as np
+
+# CF units of horizontal coordinates, which iris loads as degrees
+CF_UNITS = {'latitude': 'degrees_north', 'longitude': 'degrees_east'}
+
+
+def coord_attributes(cube, name):
+    """Get the netCDF attributes of a coordinate of a cube."""
+    coord = cube.coord(name)
+    units = str(coord.units)
+    if coord.name() in CF_UNITS and units == 'degrees':
+        units = CF_UNITS[coord.name()]
+    return {
+        'long_name': coord.long_name or '',
+        'standard_name': coord.standard_name or '',
+        'units': units,
+        'calendar': coord.units.calendar,
+        'positive': coord.attributes.get('positive', 'down'),
+        'axis': iris.util.guess_coord_axis(coord),
+    }
+
+
+def _nearest_valid(valid, axis):
+    """Find the nearest valid points before and after each point.
+
+    Returns the indices along `axis`, -1 and the axis length where there
+    is no valid point before and after respectively.
+    """
+    length = valid.shape[axis]
+    shape = [1] * valid.ndim
+    shape[axis] = length
+    index = np.arange(length).reshape(shape)
+    before = np.maximum.accumulate(np.where(valid, index, -1), axis=axis)
+    after = np.flip(np.minimum.accumulate(
+        np.flip(np.where(valid, index, length), axis=axis), axis=axis),
+                    axis=axis)
+    return index, before, after
+
+
+def _interpolate(data, valid, axis):
+    """Linearly interpolate between the nearest valid points along an axis.
+
+    Where there is a valid point on one side only, its value is used.
+    """
+    index, before, after = _nearest_valid(valid, axis)
+    length = valid.shape[axis]
+    has_before = before >= 0
+    has_after = after < length
+    value_before = np.take_along_axis(data, np.clip(before, 0, length - 1),
+                                      axis=axis)
+    value_after = np.take_along_axis(data, np.clip(after, 0, length - 1),
+                                     axis=axis)
+    both = has_before & has_after
+    distance = np.where(both, after - before, 1)
+    estimate = np.where(
+        both,
+        (value_before * (after - index) + value_after * (index - before)) /
+        distance, np.where(has_before, value_before, value_after))
+    return estimate, has_before | has_after
+
+
+def fillmiss(data):
+    """Fill missing values of (..., lat, lon) fields (fillmiss).
+
+    Each missing value is replaced by the average of the linear
+    interpolations between the nearest valid points along its (cyclic)
+    longitude circle and along its meridian.
+    """
+    valid = ~np.ma.getmaskarray(data)
+    if valid.all():
+        return data
+    values = np.ma.getdata(data)
+    nlon = values.shape[-1]
+
+    # Longitudes are cyclic, interpolate on three copies of the circle
+    estimate_lon, found_lon = _interpolate(np.tile(values, 3),
+                                           np.tile(valid, 3), -1)
+    estimate_lon = estimate_lon[..., nlon:2 * nlon]
+    found_lon = found_lon[..., nlon:2 * nlon]
+    estimate_lat, found_lat = _interpolate(values, valid, -2)
+
+    count = found_lon.astype(int) + found_lat
+    filled = (np.where(found_lon, estimate_lon, 0.) +
+              np.where(found_lat, estimate_lat, 0.)) / np.maximum(count, 1)
+    return np.ma.masked_array(np.where(valid, values, filled),
+                              mask=~valid & (count == 0))
+
+
+def subtrend(data, time):
+    """Subtract the linear trend in time at each point (trend/subtrend).
+
+    Arguments:
+    - data: lazy data with time as first dimension;
+    - time: the time of each time step.
+    """
+    time = np.asarray(time, dtype=np.float64)
+    time = (time - time.mean()).reshape((-1, ) + (1, ) * (data.ndim - 1))
+    slope = da.sum(data * time, axis=0) / np.sum(time**2)
+    return data - da.mean(data, axis=0) - slope * time
+
+
+def _month_bounds(dates):
+    """Get the first and last + 1 time step of each month."""
+    months = np.array([date.year * 12 + date.month for date in dates])
+    starts = np.flatnonzero(np.diff(months, prepend=months[0] - 1))
+    return list(zip(starts, np.append(starts[1:], len(dates))))
+
+
+def monmean(cube, dates):
+    """Compute monthly means of a cube with lazy data (monmean)."""
+    bounds = _month_bounds(dates)
+    data = cube.lazy_data()
+    monthly = cube[[start for start, _ in bounds]].copy(
+        data=da.stack([data[start:end].mean(axis=0)
+                       for start, end in bounds]))
+    time = cube.coord('time')
+    monthly.coord('time').points = [
+        np.mean(time.points[start:end]) for start, end in bounds
+    ]
+    if time.has_bounds():
+        monthly.coord('time').bounds = [[
+            time.bounds[start, 0], time.bounds[end - 1, 1]
+        ] for start, end in bounds]
+    return monthly
+
+
+def subtract_climatology(data, keys):
+    """Subtract the mean over all time steps with the same key.
+
+    This is the subtraction of the multi-year daily (ydaymean) or monthly
+    (ymonmean) means, with the day or month of each time step as key.
+    """
+    _, inverse = np.unique(keys, return_inverse=True)
+    climatology = np.ma.stack([
+        np.ma.mean(data[inverse == key], axis=0)
+        for key in range(inverse.max() + 1)
+    ])
+    return data - climatology[inverse]
+
+
+def _dates(cube):
+    """Get the dates of the time steps of a cube."""
+    time = cube.coord('time')
+    return time.units.num2date(time.points)
 
 
 def zmnam_preproc(ifile):
-    """Preprocessing of the input dataset files."""
-    cdo = cd.Cdo()
+    """Preprocessing of the input dataset files.
+
+    Returns the daily zonal mean anomalies and the monthly mean
+    anomalies of the detrended field, as iris cubes.
+    """
+    cube = iris.load_cube(ifile)
+
     # Delete leap day, if any.
-    full_da_nl = cdo.delete('month=2,day=29', input=ifile)
+    dates = _dates(cube)
+    cube = cube[np.array(
+        [not (date.month == 2 and date.day == 29) for date in dates])]
+    dates = _dates(cube)
 
-    # Fill missing values with bilinear method.
-    full_da_nl_nn = cdo.fillmiss(input=full_da_nl)
+    # Fill missing values, whole (lat, lon) fields at a time. As in CDO,
+    # the data are processed in double precision.
+    data = cube.lazy_data().astype(np.float64)
+    data = data.rechunk({data.ndim - 2: -1, data.ndim - 1: -1})
+    data = da.map_blocks(fillmiss, data, dtype=data.dtype)
 
-    # Detrend with memory-efficient method.
-    full_da_nl_a, full_da_nl_b = cdo.trend(input=full_da_nl_nn)
-    full_da_nl_detr = cdo.subtrend(input=full_da_nl_nn + ' ' +
-                                   full_da_nl_a + ' ' + full_da_nl_b)
+    # Detrend.
+    cube = cube.copy(data=subtrend(data, cube.coord('time').points))
 
-    # Compute anomalies from the daily/monthly means.
-    gh_da_dm = cdo.ydaymean(input=full_da_nl_detr)
-    gh_da_an = cdo.sub(input=full_da_nl_detr + ' ' + gh_da_dm)
-    gh_da_an_zm = cdo.zonmean(input=gh_da_an)
+    # Zonal means and monthly means, evaluated in a single pass.
+    gh_da_zm = cube.collapsed('longitude', iris.analysis.MEAN)
+    gh_mo = monmean(cube, dates)
+    gh_da_zm.data, gh_mo.data = da.compute(gh_da_zm.lazy_data(),
+                                           gh_mo.lazy_data())
 
-    # Compute monthly mean anomalies.
-    gh_mo = cdo.monmean(input=full_da_nl_detr)
-    gh_mo_mm = cdo.ymonmean(input=gh_mo)
-    gh_mo_an = cdo.sub(input=gh_mo + ' ' + gh_mo_mm)
+    # Compute anomalies from the daily/monthly means.
+    gh_da_zm.data = subtract_climatology(
+        gh_da_zm.data, [date.month * 100 + date.day for date in dates])
+    gh_mo.data = subtract_climatology(
+        gh_mo.data, [date.month for date in _dates(gh_mo)])
 
-    return (gh_da_an_zm, gh_mo_an)
+    return (gh_da_zm, gh_mo)
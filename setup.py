@@ -38,6 +38,7 @@ REQUIREMENTS = {
         'netCDF4',
         'numpy',
         'pandas',
+        'psutil',
         'pyproj>=2.1'
         'pyyaml',
         'scikit-learn',
@@ -180,3 +180,33 @@ def test_cmorize_obs_woa_data(tmp_path):
     output_path = os.path.join(log_dir, os.listdir(log_dir)[0], 'Tier2', 'WOA')
     check_output_exists(output_path)
     check_conversion(output_path)
+
+
+def test_cmorize_obs_woa_data_parallel(tmp_path):
+    """Test for example run of cmorize_obs command using worker processes."""
+
+    config_user_file = write_config_user_file(tmp_path)
+    os.makedirs(os.path.join(tmp_path, 'raw_stuff'))
+    data_path = os.path.join(tmp_path, 'raw_stuff', 'Tier2', 'WOA')
+    os.makedirs(data_path)
+    put_dummy_data(data_path)
+    with keep_cwd():
+        with arguments(
+                'cmorize_obs',
+                '-c',
+                config_user_file,
+                '-o',
+                'WOA',
+                '-j',
+                '2',
+        ):
+            run()
+
+    log_dir = os.path.join(tmp_path, 'output_dir')
+    log_file = os.path.join(log_dir,
+                            os.listdir(log_dir)[0], 'run', 'WOA',
+                            'cmorize_log.txt')
+    check_log_file(log_file, no_data=False)
+    output_path = os.path.join(log_dir, os.listdir(log_dir)[0], 'Tier2', 'WOA')
+    check_output_exists(output_path)
+    check_conversion(output_path)
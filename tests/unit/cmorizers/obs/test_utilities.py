@@ -1,9 +1,11 @@
 """Tests for the module :mod:`esmvaltool.cmorizers.obs.utilities`."""
 
+import os
 from unittest.mock import Mock
 
 import dask.array as da
 import iris
+import netCDF4
 import numpy as np
 import pytest
 from cf_units import Unit
@@ -308,3 +310,118 @@ def test_read_cmor_config():
     assert 'thetao' in cfg['variables']
     assert 'Omon' in cfg['cmor_table'].tables
     assert 'thetao' in cfg['cmor_table'].tables['Omon']
+
+
+def test_manifest(tmp_path):
+    """Test recording and checking of CMORization jobs."""
+    in_file = tmp_path / 'raw_2000.nc'
+    in_file.write_text('raw data')
+    out_dir = tmp_path / 'out'
+    out_dir.mkdir()
+    out_file = out_dir / 'OBS_tas_2000.nc'
+    job_cfg = {'variable': {'short_name': 'tas', 'mip': 'Amon'}}
+
+    manifest = utils.Manifest(out_dir)
+    assert not manifest.is_up_to_date('tas_2000', [in_file], job_cfg)
+    out_file.write_text('cmorized data')
+    manifest.record('tas_2000', [in_file], job_cfg, [out_file])
+    manifest.save()
+
+    manifest = utils.Manifest(out_dir)
+    assert manifest.is_up_to_date('tas_2000', [in_file], job_cfg)
+    other_cfg = {'variable': {'short_name': 'tas', 'mip': 'day'}}
+    assert not manifest.is_up_to_date('tas_2000', [in_file], other_cfg)
+    assert not manifest.is_up_to_date('tas_2000', [], job_cfg)
+
+    # Touching the input file does not change its content
+    mtime = in_file.stat().st_mtime
+    os.utime(in_file, (mtime + 10., mtime + 10.))
+    assert manifest.is_up_to_date('tas_2000', [in_file], job_cfg)
+    in_file.write_text('new data')
+    assert not manifest.is_up_to_date('tas_2000', [in_file], job_cfg)
+
+    out_file.unlink()
+    in_file.write_text('raw data')
+    assert not manifest.is_up_to_date('tas_2000', [in_file], job_cfg)
+
+
+def _square(value):
+    """Job function for :func:`utils.run_jobs` tests."""
+    if value < 0:
+        raise ValueError("negative value")
+    return value**2
+
+
+@pytest.mark.parametrize('n_workers', [1, 2])
+def test_run_jobs(n_workers):
+    """Test running jobs."""
+    jobs = {str(i): (i, ) for i in range(4)}
+    recorded = {}
+    results = utils.run_jobs(_square, jobs, n_workers,
+                             on_success=recorded.__setitem__)
+    assert results == {'0': 0, '1': 1, '2': 4, '3': 9}
+    assert recorded == results
+
+
+@pytest.mark.parametrize('n_workers', [1, 2])
+def test_run_jobs_failure(n_workers):
+    """Test that a failing job does not stop the others."""
+    jobs = {'a': (-1, ), 'b': (2, ), 'c': (3, )}
+    recorded = {}
+    with pytest.raises(RuntimeError) as exc:
+        utils.run_jobs(_square, jobs, n_workers, memory_per_job=0.,
+                       on_success=recorded.__setitem__)
+    assert 'Failed to CMORize 1 of 3 jobs: a' in str(exc.value)
+    assert recorded == {'b': 4, 'c': 9}
+
+
+def test_save_variable_options(tmp_path):
+    """Test saving lazy data with compression and chunking options."""
+    cube = _create_sample_cube()
+    cube.var_name = 'thetao'
+    cube.data = da.from_array(cube.data, chunks=(1, 3, 2, 2))
+    attrs = {
+        'project_id': 'OBS',
+        'dataset_id': 'TEST',
+        'modeling_realm': 'reanaly',
+        'version': '1',
+        'mip': 'Omon',
+    }
+    save_options = {
+        'zlib': True,
+        'complevel': 4,
+        'chunksizes': {'time': 2, 'depth': 1},
+    }
+    path = utils.save_variable(cube, 'thetao', str(tmp_path), attrs,
+                               save_options=save_options)
+    assert path == str(tmp_path / 'OBS_TEST_reanaly_1_Omon_thetao_'
+                       '195001-195002.nc')
+    assert cube.has_lazy_data()
+    assert cube.lazy_data().chunks[0] == (2, )
+    with netCDF4.Dataset(path) as dataset:
+        variable = dataset.variables['thetao']
+        assert variable.chunking() == [2, 1, 2, 2]
+        assert variable.filters()['zlib']
+        assert variable.filters()['complevel'] == 4
+        np.testing.assert_allclose(variable[1, 1, 1, 1], 22.)
+
+
+def test_save_variable_chunksizes_missing_coord(tmp_path):
+    """Test chunking options for coordinates that the cube lacks."""
+    cube = _create_sample_cube()[0, 0]
+    cube.remove_coord('time')
+    cube.remove_coord('depth')
+    cube.var_name = 'sftlf'
+    attrs = {
+        'project_id': 'OBS',
+        'dataset_id': 'TEST',
+        'modeling_realm': 'reanaly',
+        'version': '1',
+        'mip': 'fx',
+    }
+    save_options = {'chunksizes': {'time': 31, 'depth': 1}}
+    path = utils.save_variable(cube, 'sftlf', str(tmp_path), attrs,
+                               save_options=save_options)
+    assert path == str(tmp_path / 'OBS_TEST_reanaly_1_fx_sftlf.nc')
+    with netCDF4.Dataset(path) as dataset:
+        assert dataset.variables['sftlf'].chunking() == [2, 2]
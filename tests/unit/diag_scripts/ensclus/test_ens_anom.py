@@ -0,0 +1,64 @@
+"""Tests for the ensemble anomalies of the EnsClus diagnostic."""
+import importlib
+import os
+
+import numpy as np
+import pytest
+from scipy import stats
+
+import esmvaltool.diag_scripts
+
+
+@pytest.fixture
+def ens_anom(monkeypatch):
+    """Import the module, which uses the EnsClus directory as path."""
+    monkeypatch.syspath_prepend(
+        os.path.join(os.path.dirname(esmvaltool.diag_scripts.__file__),
+                     'ensclus'))
+    return importlib.import_module('ens_anom')
+
+
+def linregress(var):
+    """Compute the trend, its error and p-value for each point with scipy."""
+    nt, ny, nx = var.shape
+    result = np.full((3, ny, nx), np.nan)
+    for j in range(ny):
+        for i in range(nx):
+            valid = np.isfinite(var[:, j, i])
+            if valid.sum() > 1:
+                fit = stats.linregress(np.arange(nt)[valid], var[valid, j, i])
+                result[:, j, i] = fit.slope, fit.stderr, fit.pvalue
+    if nt < 3:
+        result[1:] = np.nan
+    return result
+
+
+@pytest.mark.parametrize('shape', [(20, 3, 4), (2, 2, 2)])
+def test_linear_trend(ens_anom, shape):
+    """Test the trend against scipy.stats.linregress."""
+    var = np.random.RandomState(0).normal(size=shape)
+    var += 0.1 * np.arange(shape[0])[:, np.newaxis, np.newaxis]
+    expected = linregress(var)
+    np.testing.assert_allclose(ens_anom.linear_trend(var), expected[0])
+    np.testing.assert_allclose(ens_anom.linear_trend(var, full=True),
+                               expected,
+                               atol=1e-12)
+
+
+def test_linear_trend_nan(ens_anom):
+    """Test the trend with missing values."""
+    var = np.random.RandomState(1).normal(size=(10, 2, 3))
+    var[[1, 4], 0, 0] = np.nan
+    var[1:, 1, 2] = np.nan
+    expected = linregress(var)
+    np.testing.assert_allclose(ens_anom.linear_trend(var, full=True),
+                               expected,
+                               atol=1e-12)
+
+
+def test_linear_trend_axis(ens_anom):
+    """Test the trend along another axis."""
+    var = np.random.RandomState(2).normal(size=(3, 8, 4))
+    np.testing.assert_allclose(
+        ens_anom.linear_trend(var, axis=1),
+        ens_anom.linear_trend(np.moveaxis(var, 1, 0)))
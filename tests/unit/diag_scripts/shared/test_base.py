@@ -0,0 +1,146 @@
+"""Tests for the module :mod:`esmvaltool.diag_scripts.shared._base`."""
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+import yaml
+
+from esmvaltool.diag_scripts.shared import _base
+
+
+def _record(number):
+    """Create a dummy provenance record."""
+    return {
+        'caption': "Plot number {}.".format(number),
+        'ancestors': ['/path/to/input_file_{}.nc'.format(number)],
+    }
+
+
+def _log_records(run_dir, numbers):
+    """Log provenance records, one logger context for each record."""
+    for number in numbers:
+        with _base.ProvenanceLogger({'run_dir': run_dir}) as logger:
+            logger.log('/path/to/output_{}.nc'.format(number),
+                       _record(number))
+
+
+def test_provenance_logger_without_journal(tmp_path):
+    """Test that each context rewrites the provenance file."""
+    _log_records(str(tmp_path), range(3))
+    assert not (tmp_path / 'diagnostic_provenance_journal.yml').exists()
+    table = yaml.safe_load(
+        (tmp_path / 'diagnostic_provenance.yml').read_text())
+    assert table == {
+        '/path/to/output_{}.nc'.format(i): _record(i)
+        for i in range(3)
+    }
+
+
+def test_provenance_logger_with_journal(tmp_path):
+    """Test that records are appended to the journal and merged."""
+    journal = tmp_path / 'diagnostic_provenance_journal.yml'
+    journal.write_text('')
+    _log_records(str(tmp_path), range(3))
+    assert not (tmp_path / 'diagnostic_provenance.yml').exists()
+    assert len(list(yaml.safe_load_all(journal.read_text()))) == 3
+
+    _base._merge_provenance_journal(str(tmp_path))
+    assert not journal.exists()
+    table = yaml.safe_load(
+        (tmp_path / 'diagnostic_provenance.yml').read_text())
+    assert table == {
+        '/path/to/output_{}.nc'.format(i): _record(i)
+        for i in range(3)
+    }
+
+
+def test_provenance_journal_duplicate_log(tmp_path):
+    """Test that duplicate records are detected when logging."""
+    (tmp_path / 'diagnostic_provenance_journal.yml').write_text('')
+    _log_records(str(tmp_path), [1])
+    with pytest.raises(KeyError):
+        _log_records(str(tmp_path), [1])
+    _base._merge_provenance_journal(str(tmp_path))
+
+
+def _log_records_in_process(run_dir, numbers):
+    """Append provenance records to the journal like another process."""
+    records = {
+        '/path/to/output_{}.nc'.format(number): _record(number)
+        for number in numbers
+    }
+    with open(_base._get_provenance_journal(run_dir), 'a') as file:
+        file.write(yaml.safe_dump(records, explicit_start=True))
+
+
+def test_provenance_journal_duplicate(tmp_path):
+    """Test that duplicate records are detected when merging."""
+    (tmp_path / 'diagnostic_provenance_journal.yml').write_text('')
+    _log_records(str(tmp_path), [1])
+    _log_records_in_process(str(tmp_path), [1])
+    with pytest.raises(KeyError):
+        _base._merge_provenance_journal(str(tmp_path))
+
+
+def test_provenance_journal_duplicate_ignored(tmp_path):
+    """Test that duplicate records are kept once if requested."""
+    (tmp_path / 'diagnostic_provenance_journal.yml').write_text('')
+    _log_records(str(tmp_path), [1, 2])
+    _log_records_in_process(str(tmp_path), [1])
+    _base._merge_provenance_journal(str(tmp_path), raise_duplicates=False)
+    table = yaml.safe_load(
+        (tmp_path / 'diagnostic_provenance.yml').read_text())
+    assert table == {
+        '/path/to/output_{}.nc'.format(i): _record(i)
+        for i in [1, 2]
+    }
+
+
+def _write_settings(tmp_path):
+    """Write the settings file of a diagnostic script."""
+    cfg = {
+        'input_files': [],
+        'log_level': 'info',
+        'plot_dir': str(tmp_path / 'plots'),
+        'run_dir': str(tmp_path / 'run'),
+        'script': 'test',
+        'work_dir': str(tmp_path / 'work'),
+        'write_netcdf': True,
+        'write_plots': True,
+    }
+    settings = tmp_path / 'settings.yml'
+    settings.write_text(yaml.safe_dump(cfg))
+    return str(settings)
+
+
+def test_run_diagnostic_failure(tmp_path, monkeypatch):
+    """Test that duplicates do not hide the error of a failed script."""
+    monkeypatch.setattr('sys.argv', ['diagnostic.py',
+                                     _write_settings(tmp_path)])
+    with pytest.raises(ValueError, match='Script failed'):
+        with _base.run_diagnostic() as cfg:
+            _log_records(cfg['run_dir'], [1, 2])
+            _log_records_in_process(cfg['run_dir'], [1])
+            raise ValueError("Script failed")
+    table = yaml.safe_load(
+        (tmp_path / 'run' / 'diagnostic_provenance.yml').read_text())
+    assert sorted(table) == ['/path/to/output_{}.nc'.format(i)
+                             for i in [1, 2]]
+
+
+def test_provenance_journal_parallel(tmp_path):
+    """Test that parallel processes can log to the same journal."""
+    (tmp_path / 'diagnostic_provenance_journal.yml').write_text('')
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(_log_records, str(tmp_path),
+                            range(i, 100, 4)) for i in range(4)
+        ]
+        for future in futures:
+            future.result()
+    _base._merge_provenance_journal(str(tmp_path))
+    table = yaml.safe_load(
+        (tmp_path / 'diagnostic_provenance.yml').read_text())
+    assert table == {
+        '/path/to/output_{}.nc'.format(i): _record(i)
+        for i in range(100)
+    }
@@ -0,0 +1,71 @@
+"""Tests for the module :mod:`esmvaltool.diag_scripts.shared._supermeans`."""
+import iris
+import numpy as np
+import pytest
+from cf_units import Unit
+
+from esmvaltool.diag_scripts.shared import _supermeans
+
+TIME_UNITS = Unit('days since 1999-12-01', calendar='360_day')
+
+
+def _monthly_cube(n_years=3):
+    """Create a cube with monthly data for full climate years."""
+    bounds = np.arange(12 * n_years + 1) * 30.0
+    bounds = np.stack([bounds[:-1], bounds[1:]], axis=-1)
+    time = iris.coords.DimCoord(bounds.mean(axis=-1),
+                                bounds=bounds,
+                                standard_name='time',
+                                var_name='time',
+                                units=TIME_UNITS)
+    lat = iris.coords.DimCoord([-45.0, 45.0],
+                               standard_name='latitude',
+                               units='degrees')
+    data = np.random.RandomState(0).rand(12 * n_years, 2)
+    return iris.cube.Cube(data,
+                          standard_name='air_temperature',
+                          units='K',
+                          dim_coords_and_dims=[(time, 0), (lat, 1)])
+
+
+@pytest.mark.parametrize('period,supermeans_period', [
+    ('month', 'month'),
+    ('season', 'season'),
+    (None, 'ann'),
+])
+def test_supermeans(period, supermeans_period):
+    """Test that the supermeans equal those of ``periodic_mean``."""
+    cube = _monthly_cube()
+    expected = _supermeans.periodic_mean(cube.copy(), period=period)
+    result = _supermeans.supermeans(cube.copy())[supermeans_period]
+    np.testing.assert_allclose(result.data, expected.data)
+    assert result.coord('time') == expected.coord('time')
+    assert result.cell_methods == expected.cell_methods
+    assert ([coord.name() for coord in result.coords()] ==
+            [coord.name() for coord in expected.coords()])
+
+
+def test_save_supermeans(tmp_path):
+    """Test that the supermeans of all cubes are cached."""
+    cube = _monthly_cube()
+    stash_cube = cube.copy()
+    stash_cube.standard_name = None
+    stash_cube.attributes['STASH'] = 'm01s03i236'
+    fixed_cube = cube[0].copy()
+    fixed_cube.remove_coord('time')
+    fixed_cube.rename('land_area_fraction')
+    cubes_path = str(tmp_path / 'cubeList.nc')
+    iris.save([cube, stash_cube, fixed_cube], cubes_path)
+
+    cache_path = _supermeans.save_supermeans(cubes_path)
+    assert cache_path == str(tmp_path / 'cubeList_supermeans.nc')
+    cached = iris.load(cache_path)
+    assert sorted((cube.name(), cube.attributes['supermean_period'])
+                  for cube in cached) == [
+                      ('air_temperature', 'ann'),
+                      ('air_temperature', 'month'),
+                      ('air_temperature', 'season'),
+                      ('m01s03i236', 'ann'),
+                      ('m01s03i236', 'month'),
+                      ('m01s03i236', 'season'),
+                  ]
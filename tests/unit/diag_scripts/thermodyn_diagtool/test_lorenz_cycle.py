@@ -0,0 +1,118 @@
+"""Tests for the in-memory pipeline of the Lorenz Energy Cycle.
+
+The coefficients and LEC outputs computed from the multi-year input files
+are compared with those of the per-year file-based computations.
+"""
+import shutil
+
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+from esmvaltool.diag_scripts.thermodyn_diagtool import fourier_coefficients
+
+YEARS = ['2000', '2001']
+TIME = np.array([0.0, 1.0, 2.0, 3.0, 365.0, 366.0, 367.0, 368.0])
+PLEV = np.array([90000.0, 70000.0, 50000.0, 30000.0, 10000.0])
+LAT = np.linspace(78.75, -78.75, 8)
+LON = np.arange(0.0, 360.0, 22.5)
+TADIAG = ['ta', 'ua', 'va', 'wap']
+
+
+def write_inputs(path, time_slice=slice(None)):
+    """Write synthetic t,u,v,w and near-surface temperature files."""
+    rng = np.random.RandomState(0)
+    shape = (len(TIME), len(PLEV), len(LAT), len(LON))
+    fields = {
+        'ta': 250.0 + 10.0 * rng.rand(*shape),
+        'ua': 10.0 * rng.randn(*shape),
+        'va': 5.0 * rng.randn(*shape),
+        'wap': 0.1 * rng.randn(*shape),
+    }
+    # Levels below the surface are set to 0 and filled from tas
+    fields['ta'][:, 0, 2:4, 3:9] = 0.0
+    fields['ta'][:, 1, 3, 5:7] = 0.0
+    tas = 270.0 + 10.0 * rng.rand(len(TIME), len(LAT), len(LON))
+    infiles = [str(path / 'energy.nc'), str(path / 'tas.nc')]
+    for filename, names in zip(infiles, [TADIAG, ['tas']]):
+        with Dataset(filename, 'w') as dataset:
+            dataset.createDimension('time', None)
+            var = dataset.createVariable('time', 'f8', ('time', ))
+            var.units = 'days since 2000-01-01'
+            var.calendar = '365_day'
+            var[:] = TIME[time_slice]
+            dims = ('time', )
+            coords = [('lat', LAT, 'degrees_north'),
+                      ('lon', LON, 'degrees_east')]
+            if names == TADIAG:
+                coords.insert(0, ('plev', PLEV, 'Pa'))
+            for name, points, units in coords:
+                dataset.createDimension(name, len(points))
+                var = dataset.createVariable(name, 'f8', (name, ))
+                var.units = units
+                var[:] = points
+                dims += (name, )
+            for name in names:
+                data = fields[name] if name in fields else tas
+                var = dataset.createVariable(name, 'f4', dims)
+                var[:] = data[time_slice]
+    return infiles
+
+
+@pytest.mark.parametrize('year', YEARS)
+def test_fourier_coeff_year(tmp_path, year):
+    """Test the coefficients of a year against the per-year files."""
+    infiles = write_inputs(tmp_path)
+    coeffs = fourier_coefficients.fourier_coeff_year(*infiles, year)
+
+    yeardir = tmp_path / year
+    yeardir.mkdir()
+    t_sl = slice(0, 4) if year == YEARS[0] else slice(4, 8)
+    year_files = write_inputs(yeardir, t_sl)
+    ncfile = str(yeardir / 'fourier_coeff.nc')
+    fourier_coefficients.fourier_coeff(str(yeardir / 'ta_filled.nc'),
+                                       ncfile, *year_files)
+    with Dataset(ncfile) as dataset:
+        for name in TADIAG + ['plev', 'lat', 'time', 'wave']:
+            np.testing.assert_array_equal(coeffs[name],
+                                          dataset.variables[name][:])
+
+
+def run_lec(path, infiles, pipeline):
+    """Compute the LEC for all years, with or without the pipeline."""
+    lorenz_cycle = pytest.importorskip(
+        'esmvaltool.diag_scripts.thermodyn_diagtool.lorenz_cycle')
+    wdir = path / ('pipeline' if pipeline else 'files')
+    ldir = wdir / 'LEC_results'
+    ldir.mkdir(parents=True)
+    if pipeline:
+        lect = lorenz_cycle.lec_years('MODEL', str(wdir), str(ldir), infiles,
+                                      YEARS, 3, 1)
+    else:
+        lect = lorenz_cycle._lec_years_files(lorenz_cycle.Cdo(), 'MODEL',
+                                             str(wdir), str(ldir), infiles,
+                                             YEARS, 3)
+    return lect, wdir, ldir
+
+
+def test_lec_years(tmp_path):
+    """Test the pipeline against the file-based LEC computations."""
+    pytest.importorskip('cdo')
+    if shutil.which('cdo') is None:
+        pytest.skip("CDO is not available")
+    infiles = write_inputs(tmp_path)
+    lect, wdir, ldir = run_lec(tmp_path, infiles, pipeline=True)
+    ref_lect, ref_wdir, ref_ldir = run_lec(tmp_path, infiles, pipeline=False)
+
+    np.testing.assert_allclose(lect, ref_lect, rtol=1e-12)
+    for year in YEARS:
+        for name in ['ek', 'ape', 'a2k', 'ae2az', 'ke2kz']:
+            filename = '{}_tmap_MODEL_{}.nc'.format(name, year)
+            with Dataset(str(wdir / filename)) as dataset, \
+                    Dataset(str(ref_wdir / filename)) as reference:
+                np.testing.assert_allclose(dataset.variables[name][:],
+                                           reference.variables[name][:],
+                                           rtol=1e-12)
+        filename = 'MODEL_{}_lec_table.txt'.format(year)
+        assert ((ldir / filename).read_text() ==
+                (ref_ldir / filename).read_text())
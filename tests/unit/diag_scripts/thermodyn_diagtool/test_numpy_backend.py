@@ -0,0 +1,393 @@
+"""Tests for :mod:`esmvaltool.diag_scripts.thermodyn_diagtool.numpy_backend`.
+
+The operators are compared with expected values on small synthetic fields
+and, where CDO is available, with the output of the CDO operators they
+replace.
+"""
+import shutil
+
+import iris
+import numpy as np
+import pytest
+from cf_units import Unit
+
+from esmvaltool.diag_scripts.thermodyn_diagtool import numpy_backend as nbe
+
+MONTH_DAYS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+N_YEARS = 2
+# Fraction of the globe covered by one grid cell of each latitude band
+CELL_FRACTION = np.array([0.25, 0.5, 0.25]) / 4
+
+
+def field(data, var_name='rsdt', units='W m-2'):
+    """Create a monthly (time, lat, lon) field on a 3x4 global grid."""
+    edges = np.concatenate([[0], np.cumsum(np.tile(MONTH_DAYS, N_YEARS))])
+    time = iris.coords.DimCoord(0.5 * (edges[:-1] + edges[1:]),
+                                bounds=np.stack([edges[:-1], edges[1:]], -1),
+                                standard_name='time',
+                                var_name='time',
+                                units=Unit('days since 2000-01-01',
+                                           calendar='365_day'))
+    lat = iris.coords.DimCoord([-60.0, 0.0, 60.0],
+                               bounds=[[-90.0, -30.0], [-30.0, 30.0],
+                                       [30.0, 90.0]],
+                               standard_name='latitude',
+                               var_name='lat',
+                               units='degrees_north')
+    lon = iris.coords.DimCoord([45.0, 135.0, 225.0, 315.0],
+                               bounds=[[0.0, 90.0], [90.0, 180.0],
+                                       [180.0, 270.0], [270.0, 360.0]],
+                               standard_name='longitude',
+                               var_name='lon',
+                               units='degrees_east')
+    data = np.ma.masked_array(
+        np.broadcast_to(data, (12 * N_YEARS, 3, 4)).astype(np.float64))
+    return iris.cube.Cube(data,
+                          var_name=var_name,
+                          units=units,
+                          dim_coords_and_dims=[(time, 0), (lat, 1),
+                                               (lon, 2)])
+
+
+def random_field(seed=0, var_name='rsdt', masked=True):
+    """Create a field with random values and one missing value."""
+    data = np.random.RandomState(seed).uniform(-2.0, 2.0, (12 * N_YEARS, 3, 4))
+    cube = field(data.round(1), var_name=var_name)
+    if masked:
+        cube.data[3, 1, 2] = np.ma.masked
+    return cube
+
+
+def yearly_means(data):
+    """Compute yearly means of monthly data weighted by days per month."""
+    weights = np.tile(MONTH_DAYS, N_YEARS)[:, np.newaxis, np.newaxis]
+    weights = weights * ~np.ma.getmaskarray(data)
+    shape = (N_YEARS, 12) + data.shape[1:]
+    return (np.sum((np.ma.filled(data, 0.0) * weights).reshape(shape), 1) /
+            np.sum(weights.reshape(shape), 1))
+
+
+def global_means(data):
+    """Compute area weighted means of (..., lat, lon) data."""
+    weights = CELL_FRACTION[:, np.newaxis] * ~np.ma.getmaskarray(data)
+    return (np.sum(np.ma.filled(data, 0.0) * weights, axis=(-2, -1)) /
+            np.sum(weights, axis=(-2, -1)))
+
+
+def test_area_weights():
+    """Test the grid cell areas on the unit sphere."""
+    weights = nbe.area_weights(field(1.0))
+    np.testing.assert_allclose(weights, np.pi * 4 * CELL_FRACTION[:, None] *
+                               np.ones((3, 4)))
+    np.testing.assert_allclose(weights.sum(), 4 * np.pi)
+
+
+def test_fldmean():
+    """Test the area weighted mean, ignoring missing values."""
+    cube = field(np.array([1.0, 2.0, 3.0])[:, np.newaxis])
+    weights = nbe.area_weights(cube)
+    result = nbe.realise(nbe.fldmean(cube.lazy_data(), weights))
+    np.testing.assert_allclose(result, 2.0)
+
+    cube.data[0, 0] = np.ma.masked
+    cube.data[1] = np.ma.masked
+    result = nbe.realise(nbe.fldmean(cube.lazy_data(), weights))
+    np.testing.assert_allclose(result[0], (0.5 * 2.0 + 0.25 * 3.0) / 0.75)
+    assert result.mask[1]
+    np.testing.assert_allclose(result[2:], 2.0)
+
+
+def test_timmean():
+    """Test the time mean, ignoring missing values."""
+    cube = random_field()
+    result = nbe.realise(nbe.timmean(cube.lazy_data()))
+    np.testing.assert_allclose(result, np.ma.mean(cube.data, axis=0))
+
+
+def test_yearmonmean():
+    """Test yearly means weighted by the number of days per month."""
+    cube = field(np.tile(np.arange(1.0, 13.0), N_YEARS)[:, None, None])
+    yearly = nbe.yearmonmean(cube)
+    expected = np.sum(MONTH_DAYS * np.arange(1.0, 13.0)) / 365.0
+    np.testing.assert_allclose(nbe.realise(yearly.lazy_data()), expected)
+    time = yearly.coord('time')
+    np.testing.assert_allclose(time.bounds, [[0.0, 365.0], [365.0, 730.0]])
+
+    cube = random_field()
+    result = nbe.realise(nbe.yearmonmean(cube).lazy_data())
+    np.testing.assert_allclose(result, yearly_means(cube.data))
+
+
+@pytest.mark.parametrize('operator,expected', [
+    (nbe.eqc, [0.0, 1.0, 0.0]),
+    (nbe.gtc, [0.0, 0.0, 1.0]),
+    (nbe.ltc, [1.0, 0.0, 0.0]),
+])
+def test_comparisons(operator, expected):
+    """Test comparisons with a constant."""
+    data = field(np.array([-1.0, 0.0, 1.0])[:, np.newaxis]).lazy_data()
+    result = nbe.realise(operator(data, 0.0))
+    np.testing.assert_array_equal(result, np.broadcast_to(
+        np.array(expected)[:, np.newaxis], result.shape))
+
+
+def test_setrtomiss():
+    """Test that a closed range is set to missing values."""
+    data = field(np.array([-1.0, 0.0, 1.0])[:, np.newaxis]).lazy_data()
+    result = nbe.realise(nbe.setrtomiss(data, -1000, 0))
+    np.testing.assert_array_equal(np.ma.getmaskarray(result)[0, :, 0],
+                                  [True, True, False])
+    np.testing.assert_array_equal(result[0, 2], 1.0)
+
+
+def test_setctomiss():
+    """Test that a constant is set to missing values."""
+    data = field(np.array([-1.0, 0.0, 1.0])[:, np.newaxis]).lazy_data()
+    result = nbe.realise(nbe.setctomiss(data, 0))
+    np.testing.assert_array_equal(np.ma.getmaskarray(result)[0, :, 0],
+                                  [False, True, False])
+
+
+def test_div_reci():
+    """Test that division by zero leads to missing values."""
+    data = field(np.array([-2.0, 0.0, 4.0])[:, np.newaxis]).lazy_data()
+    result = nbe.realise(nbe.reci(data))
+    np.testing.assert_array_equal(np.ma.getmaskarray(result)[0, :, 0],
+                                  [False, True, False])
+    np.testing.assert_allclose(result[0, [0, 2], 0], [-0.5, 0.25])
+    result = nbe.realise(nbe.div(2.0 * data, data))
+    np.testing.assert_allclose(result[0, [0, 2], 0], 2.0)
+    assert result.mask[0, 1, 0]
+
+
+def test_apply_save_load(tmp_path):
+    """Test combining fields and their round trip through a file."""
+    flx1 = random_field(1, var_name='rsdt', masked=False)
+    flx2 = random_field(2, var_name='rsut', masked=False)
+    result = nbe.to_float32(nbe.apply(lambda a, b: a - b, flx1, flx2))
+    assert result.var_name == 'rsdt'
+    assert result.dtype == np.float32
+    filename = str(tmp_path / 'toab.nc')
+    nbe.save(result, 'toab', filename)
+    loaded = nbe.load(filename)
+    assert loaded.var_name == 'toab'
+    assert loaded.dtype == np.float64
+    np.testing.assert_allclose(loaded.data,
+                               (flx1.data - flx2.data).astype(np.float32))
+
+
+def cdo_or_skip():
+    """Get a CDO instance or skip the test if CDO is not available."""
+    cdo = pytest.importorskip('cdo')
+    if shutil.which('cdo') is None:
+        pytest.skip("CDO is not available")
+    return cdo.Cdo()
+
+
+def run_cdo(tmp_path, operator, args, cubes):
+    """Apply a CDO operator to fields saved to files."""
+    filenames = []
+    for i, cube in enumerate(cubes):
+        filenames.append(str(tmp_path / 'in{}.nc'.format(i)))
+        iris.save(cube, filenames[-1])
+    output = str(tmp_path / 'out.nc')
+    getattr(cdo_or_skip(), operator)(*args,
+                                     input=' '.join(filenames),
+                                     output=output)
+    return np.ma.squeeze(iris.load_cube(output).data)
+
+
+@pytest.mark.parametrize('operator,args,function', [
+    ('fldmean', [],
+     lambda cube: nbe.fldmean(cube.lazy_data(), nbe.area_weights(cube))),
+    ('timmean', [], lambda cube: nbe.timmean(cube.lazy_data())),
+    ('yearmonmean', [], lambda cube: nbe.yearmonmean(cube).lazy_data()),
+    ('eqc', ['0'], lambda cube: nbe.eqc(cube.lazy_data(), 0.0)),
+    ('gtc', ['0'], lambda cube: nbe.gtc(cube.lazy_data(), 0.0)),
+    ('ltc', ['0'], lambda cube: nbe.ltc(cube.lazy_data(), 0.0)),
+    ('setrtomiss', ['-1000,0'],
+     lambda cube: nbe.setrtomiss(cube.lazy_data(), -1000, 0)),
+    ('setctomiss', ['0'], lambda cube: nbe.setctomiss(cube.lazy_data(), 0)),
+    ('reci', [], lambda cube: nbe.reci(cube.lazy_data())),
+])
+def test_cdo_operators(tmp_path, operator, args, function):
+    """Compare the operators with CDO."""
+    cube = random_field()
+    expected = run_cdo(tmp_path, operator, args, [cube])
+    result = np.ma.squeeze(nbe.realise(function(cube)))
+    np.testing.assert_array_equal(np.ma.getmaskarray(result),
+                                  np.ma.getmaskarray(expected))
+    np.testing.assert_allclose(result.compressed(), expected.compressed(),
+                               rtol=1e-6)
+
+
+def test_cdo_div(tmp_path):
+    """Compare the division with CDO."""
+    num = random_field(1, masked=False)
+    den = random_field(2)
+    expected = run_cdo(tmp_path, 'div', [], [num, den])
+    result = nbe.realise(nbe.div(num.lazy_data(), den.lazy_data()))
+    np.testing.assert_array_equal(np.ma.getmaskarray(result),
+                                  np.ma.getmaskarray(expected))
+    np.testing.assert_allclose(result.compressed(), expected.compressed(),
+                               rtol=1e-6)
+
+
+def computations_or_skip():
+    """Import the computations module, which requires the CDO bindings."""
+    pytest.importorskip('cdo')
+    from esmvaltool.diag_scripts.thermodyn_diagtool import computations
+    return computations
+
+
+def save_fields(path, fields):
+    """Save fields to files and describe them as input data."""
+    input_data = []
+    for short_name, cube in fields.items():
+        filename = str(path / '{}.nc'.format(short_name))
+        cube = cube.copy()
+        cube.var_name = short_name
+        iris.save(cube, filename)
+        input_data.append({
+            'short_name': short_name,
+            'dataset': 'MODEL',
+            'filename': filename,
+        })
+    return input_data
+
+
+def flux_fields(names):
+    """Create positive random fields for the given variables."""
+    return {
+        name: field(
+            np.random.RandomState(seed).uniform(0.0, 400.0,
+                                                (12 * N_YEARS, 3, 4)))
+        for seed, name in enumerate(names)
+    }
+
+
+BUDGET_FLUXES = [
+    'hfls', 'hfss', 'rlds', 'rlus', 'rlut', 'rsds', 'rsdt', 'rsus', 'rsut'
+]
+
+
+def run_budgets(path, input_data, backend):
+    """Run the energy budgets in a new working directory."""
+    computations = computations_or_skip()
+    wdir = path / backend
+    wdir.mkdir()
+    return computations.budgets('MODEL', str(wdir), str(wdir / 'aux.nc'),
+                                input_data, backend=backend)
+
+
+def test_budgets(tmp_path):
+    """Test the energy budgets chain of the numpy backend."""
+    fluxes = flux_fields(BUDGET_FLUXES)
+    flx = {name: cube.data for name, cube in fluxes.items()}
+    input_data = save_fields(tmp_path, fluxes)
+    _, eb_gmean, eb_file, toab_ymm_file = run_budgets(tmp_path, input_data,
+                                                      'numpy')
+
+    toab = (flx['rsdt'] - flx['rsut'] - flx['rlut']).astype(np.float32)
+    surb = (flx['rsds'] + flx['rlds'] - flx['rsus'] - flx['rlus'] -
+            flx['hfls'] - flx['hfss']).astype(np.float32)
+    atmb = toab - surb
+    for expected, gmean, filename in zip([toab, atmb, surb], eb_gmean,
+                                         eb_file):
+        np.testing.assert_allclose(iris.load_cube(filename).data, expected,
+                                   rtol=1e-6)
+        np.testing.assert_allclose(np.ravel(gmean),
+                                   global_means(yearly_means(expected)),
+                                   rtol=1e-5)
+    np.testing.assert_allclose(iris.load_cube(toab_ymm_file).data,
+                               yearly_means(toab),
+                               rtol=1e-5)
+
+    # Compare with the CDO backend
+    cdo_or_skip()
+    _, cdo_gmean, cdo_file, cdo_ymm_file = run_budgets(tmp_path, input_data,
+                                                       'cdo')
+    np.testing.assert_allclose(np.ravel(eb_gmean), np.ravel(cdo_gmean),
+                               rtol=1e-5)
+    for filename, reference in zip(eb_file + [toab_ymm_file],
+                                   cdo_file + [cdo_ymm_file]):
+        np.testing.assert_allclose(
+            np.ma.squeeze(iris.load_cube(filename).data),
+            np.ma.squeeze(iris.load_cube(reference).data),
+            rtol=1e-5)
+
+
+def run_wmbudg(path, input_data, backend):
+    """Run the water mass and latent energy budgets."""
+    computations = computations_or_skip()
+    wdir = path / backend
+    wdir.mkdir()
+    return computations.wmbudg('MODEL', str(wdir), str(wdir / 'aux.nc'),
+                               input_data,
+                               [str(path / 'evap.nc'),
+                                str(path / 'prr.nc')],
+                               backend=backend)
+
+
+def test_wmbudg(tmp_path):
+    """Test the water mass and latent energy budgets of the numpy backend."""
+    fluxes = flux_fields(['hfls', 'pr', 'prsn', 'prr'])
+    fluxes['evap'] = fluxes['hfls'].copy(fluxes['hfls'].data / 2.5e6)
+    for name in ['pr', 'prsn', 'prr']:
+        fluxes[name].data = fluxes[name].data * 1e-7
+    flx = {name: cube.data for name, cube in fluxes.items()}
+    input_data = save_fields(tmp_path, fluxes)
+    # The water mass budget keeps the name of the evaporation variable
+    evap = fluxes['evap'].copy()
+    evap.var_name = 'hfls'
+    iris.save(evap, str(tmp_path / 'evap.nc'))
+    varlist, fileout = run_wmbudg(tmp_path, input_data, 'numpy')
+
+    computations = computations_or_skip()
+    wmb = (flx['evap'] - flx['pr']).astype(np.float32)
+    latent = (flx['hfls'] - (computations.LC_SUB * flx['prsn'] +
+                             computations.L_C * flx['prr'])).astype(
+                                 np.float32)
+    for expected, gmean, filename in zip([wmb, latent], varlist, fileout):
+        np.testing.assert_allclose(iris.load_cube(filename).data,
+                                   expected,
+                                   rtol=1e-5)
+        np.testing.assert_allclose(np.ravel(gmean),
+                                   global_means(yearly_means(expected)),
+                                   rtol=1e-5)
+
+    # Compare with the CDO backend
+    cdo_or_skip()
+    cdo_varlist, cdo_fileout = run_wmbudg(tmp_path, input_data, 'cdo')
+    np.testing.assert_allclose(np.ravel(varlist), np.ravel(cdo_varlist),
+                               rtol=1e-5)
+    for filename, reference in zip(fileout, cdo_fileout):
+        np.testing.assert_allclose(iris.load_cube(filename).data,
+                                   iris.load_cube(reference).data,
+                                   rtol=1e-5)
+
+
+def test_landoc_budg(tmp_path):
+    """Test the budgets over land and oceans of the numpy backend."""
+    computations = computations_or_skip()
+    budget = random_field(masked=False)
+    budget.var_name = 'toab'
+    infile = str(tmp_path / 'toab.nc')
+    iris.save(budget, infile)
+    sftlf = field(np.array([[0.0, 100.0, 0.0, 100.0]]), var_name='sftlf',
+                  units='%')[0]
+    sftlf.remove_coord('time')
+    mask = str(tmp_path / 'sftlf.nc')
+    iris.save(sftlf, mask)
+    result = computations.landoc_budg('MODEL', str(tmp_path), infile, mask,
+                                      'toab', backend='numpy')
+
+    ocean = np.where(sftlf.data == 0.0, budget.data, 0.0)
+    land = np.ma.masked_equal(budget.data - ocean, 0.0)
+    np.testing.assert_allclose(result[0], np.mean(global_means(ocean)))
+    np.testing.assert_allclose(result[1], np.mean(global_means(land)))
+
+    cdo_or_skip()
+    reference = computations.landoc_budg('MODEL', str(tmp_path), infile, mask,
+                                         'toab', backend='cdo')
+    np.testing.assert_allclose(result, reference, rtol=1e-5)